@@ -0,0 +1,42 @@
+"""
+Compare two benchmark result files, e.g. of the previous and the current release.
+
+Usage: python benchmarks/compare.py OLD.json NEW.json [--threshold 1.2]
+
+Prints the mean duration of each benchmark in both files and their ratio.
+Exits with status 1 if any benchmark got slower by more than the threshold.
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("old", type=Path)
+    parser.add_argument("new", type=Path)
+    parser.add_argument("--threshold", type=float, default=1.2)
+    args = parser.parse_args()
+
+    old = json.loads(args.old.read_text())["benchmarks"]
+    new = json.loads(args.new.read_text())["benchmarks"]
+    regressions = 0
+    print(f"{'benchmark':<45} {'old [ms]':>10} {'new [ms]':>10} {'ratio':>7}")
+    for name in sorted(old.keys() & new.keys()):
+        old_mean, new_mean = old[name]["mean"], new[name]["mean"]
+        ratio = new_mean / old_mean
+        flag = ""
+        if ratio > args.threshold:
+            regressions += 1
+            flag = "  slower"
+        print(
+            f"{name:<45} {old_mean * 1000:>10.1f} {new_mean * 1000:>10.1f} "
+            f"{ratio:>7.2f}{flag}"
+        )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
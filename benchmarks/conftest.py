@@ -0,0 +1,149 @@
+"""
+Fixtures of the benchmark suite.
+
+Run with pytest benchmarks, optionally with:
+  --bench-db postgres   run against PostgreSQL in a testcontainer, instead of SQLite
+  --bench-json PATH     write the results to PATH (default benchmarks/results.json)
+  --bench-rounds N      number of timed rounds per benchmark
+  --bench-rows N        number of rows of the bulk insert and query benchmarks
+"""
+
+import datetime
+import json
+import platform
+import statistics
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import pytest
+import sqlalchemy
+from sqlalchemy import Engine, MetaData, create_engine
+
+import src.omop_cdm.regular.cdm54 as cdm54
+from src.omop_cdm.constants import CDM_SCHEMA, VOCAB_SCHEMA
+from src.omop_cdm.ddl import create_all_deferred
+from tests.conftest import SQLITE_SCHEMA_MAP, pg_db_engine, temp_schemas  # noqa: F401
+
+POSTGRES_SCHEMA_MAP = {VOCAB_SCHEMA: "bench_vocab", CDM_SCHEMA: "bench_cdm"}
+DEFAULT_RESULTS_PATH = Path(__file__).parent / "results.json"
+
+# Results of all benchmarks of the session, by benchmark name
+RESULTS: dict[str, dict[str, Any]] = {}
+
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    group = parser.getgroup("benchmarks")
+    group.addoption("--bench-db", choices=["sqlite", "postgres"], default="sqlite")
+    group.addoption("--bench-json", type=Path, default=DEFAULT_RESULTS_PATH)
+    group.addoption("--bench-rounds", type=int, default=3)
+    group.addoption("--bench-rows", type=int, default=10_000)
+
+
+def pytest_sessionfinish(session: pytest.Session) -> None:
+    if not RESULTS:
+        return
+    config = session.config
+    from src.omop_cdm import __version__
+
+    output = {
+        "metadata": {
+            "omop_cdm": __version__,
+            "sqlalchemy": sqlalchemy.__version__,
+            "python": platform.python_version(),
+            "database": config.getoption("--bench-db"),
+            "rows": config.getoption("--bench-rows"),
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        },
+        "benchmarks": dict(sorted(RESULTS.items())),
+    }
+    path = config.getoption("--bench-json")
+    path.write_text(json.dumps(output, indent=2) + "\n")
+
+
+class Benchmark:
+    """Time a function over multiple rounds and store the results."""
+
+    def __init__(self, rounds: int):
+        self.rounds = rounds
+
+    def __call__(
+        self,
+        name: str,
+        func: Callable[[], Any],
+        setup: Optional[Callable[[], Any]] = None,
+    ) -> Any:
+        """
+        Run setup (not timed) and func for each round, return the last result.
+
+        The minimum, mean and maximum duration in seconds are stored under
+        the given name.
+        """
+        durations = []
+        result = None
+        for _ in range(self.rounds):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            result = func()
+            durations.append(time.perf_counter() - start)
+        RESULTS[name] = {
+            "rounds": self.rounds,
+            "min": min(durations),
+            "mean": statistics.mean(durations),
+            "max": max(durations),
+        }
+        return result
+
+
+@pytest.fixture(scope="session")
+def bench(request: pytest.FixtureRequest) -> Benchmark:
+    return Benchmark(request.config.getoption("--bench-rounds"))
+
+
+@pytest.fixture(scope="session")
+def bench_rows(request: pytest.FixtureRequest) -> int:
+    return request.config.getoption("--bench-rows")
+
+
+@pytest.fixture(scope="session")
+def bench_engine(
+    request: pytest.FixtureRequest, tmp_path_factory: pytest.TempPathFactory
+) -> Engine:
+    """Empty database, PostgreSQL or SQLite depending on --bench-db."""
+    if request.config.getoption("--bench-db") == "postgres":
+        engine = request.getfixturevalue("pg_db_engine").execution_options(
+            schema_translate_map=POSTGRES_SCHEMA_MAP
+        )
+        with temp_schemas(engine, set(POSTGRES_SCHEMA_MAP.values())):
+            yield engine
+    else:
+        path = tmp_path_factory.mktemp("bench") / "cdm.sqlite"
+        engine = create_engine(f"sqlite:///{path}")
+        yield engine.execution_options(schema_translate_map=SQLITE_SCHEMA_MAP)
+        engine.dispose()
+
+
+@pytest.fixture(scope="module")
+def cdm54_engine(bench_engine: Engine) -> Engine:
+    """
+    Database with the tables of the regular CDM 5.4.
+
+    The tables are created with their indexes, but without foreign keys,
+    so data can be inserted in any order. They are dropped afterwards.
+    """
+    metadata: MetaData = cdm54.Base.metadata
+    with bench_engine.begin() as conn:
+        foreign_keys = [
+            fk
+            for table in metadata.tables.values()
+            for fk in table.foreign_key_constraints
+        ]
+        deferred = create_all_deferred(conn, metadata, foreign_keys=foreign_keys)
+        for index in deferred.indexes:
+            index.create(conn)
+    yield bench_engine
+    with bench_engine.begin() as conn:
+        # No foreign keys exist, so the order doesn't matter
+        for table in metadata.tables.values():
+            table.drop(conn)
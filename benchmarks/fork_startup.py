@@ -0,0 +1,66 @@
+"""
+Benchmark the startup time of forked workers, with and without configure().
+
+Each worker runs its first ORM query (a person with its conditions) on an
+in-memory SQLite database, and reports how long that took. The workers
+are forked first from a parent that only imported the CDM, and then from
+a parent that called omop_cdm.util.configure.
+
+Usage: python benchmarks/fork_startup.py [--workers N]
+"""
+
+import argparse
+import multiprocessing
+import statistics
+import time
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session, selectinload
+
+from omop_cdm.constants import CDM_SCHEMA, VOCAB_SCHEMA
+from omop_cdm.regular import cdm54
+from omop_cdm.util import configure
+
+
+def first_query(_) -> float:
+    start = time.perf_counter()
+    engine = create_engine("sqlite://").execution_options(
+        schema_translate_map={CDM_SCHEMA: None, VOCAB_SCHEMA: None}
+    )
+    cdm54.Person.__table__.create(engine)
+    cdm54.ConditionOccurrence.__table__.create(engine)
+    with Session(engine) as session:
+        statement = select(cdm54.Person).options(
+            selectinload(cdm54.Person.condition_occurrences)
+        )
+        session.scalars(statement).all()
+    return time.perf_counter() - start
+
+
+def run_workers(workers: int) -> list[float]:
+    with multiprocessing.get_context("fork").Pool(workers) as pool:
+        return pool.map(first_query, range(workers))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    # Define the tables (which are imported lazily) before forking
+    _ = cdm54.Base
+    cold = run_workers(args.workers)
+    start = time.perf_counter()
+    configure(cdm54.Base, dialect=create_engine("sqlite://").dialect)
+    configure_time = time.perf_counter() - start
+    warm = run_workers(args.workers)
+
+    cold_mean, warm_mean = statistics.mean(cold), statistics.mean(warm)
+    print(f"configure() in parent:        {configure_time * 1000:8.1f} ms (once)")
+    print(f"first query per worker, cold: {cold_mean * 1000:8.1f} ms")
+    print(f"first query per worker, warm: {warm_mean * 1000:8.1f} ms")
+    print(f"saved per worker:             {(cold_mean - warm_mean) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import datetime
+from typing import Callable
+
+import pytest
+from sqlalchemy import Engine, delete, insert
+
+import src.omop_cdm.regular.cdm54 as cdm54
+
+START_DATE = datetime.date(2020, 1, 1)
+
+
+def condition_occurrences(n: int) -> list[dict]:
+    return [
+        {
+            "condition_occurrence_id": i,
+            "person_id": i % 1000,
+            "condition_concept_id": i % 500,
+            "condition_start_date": START_DATE + datetime.timedelta(days=i % 1000),
+            "condition_type_concept_id": 32817,
+        }
+        for i in range(n)
+    ]
+
+
+def drug_exposures(n: int) -> list[dict]:
+    return [
+        {
+            "drug_exposure_id": i,
+            "person_id": i % 1000,
+            "drug_concept_id": i % 500,
+            "drug_exposure_start_date": START_DATE + datetime.timedelta(days=i % 1000),
+            "drug_exposure_end_date": START_DATE + datetime.timedelta(days=i % 1000),
+            "drug_type_concept_id": 32817,
+            "quantity": i % 30,
+        }
+        for i in range(n)
+    ]
+
+
+def measurements(n: int) -> list[dict]:
+    return [
+        {
+            "measurement_id": i,
+            "person_id": i % 1000,
+            "measurement_concept_id": i % 500,
+            "measurement_date": START_DATE + datetime.timedelta(days=i % 1000),
+            "measurement_type_concept_id": 32817,
+            "value_as_number": i / 7,
+            "unit_concept_id": 8840,
+        }
+        for i in range(n)
+    ]
+
+
+@pytest.mark.parametrize(
+    ("table_class", "make_rows"),
+    [
+        (cdm54.ConditionOccurrence, condition_occurrences),
+        (cdm54.DrugExposure, drug_exposures),
+        (cdm54.Measurement, measurements),
+    ],
+)
+def test_bulk_insert(
+    bench, cdm54_engine: Engine, bench_rows: int, table_class, make_rows: Callable
+):
+    table = table_class.__table__
+    rows = make_rows(bench_rows)
+
+    def clear():
+        with cdm54_engine.begin() as conn:
+            conn.execute(delete(table))
+
+    def insert_rows():
+        with cdm54_engine.begin() as conn:
+            conn.execute(insert(table), rows)
+
+    bench(f"bulk_insert[{table.name}]", insert_rows, setup=clear)
+    clear()
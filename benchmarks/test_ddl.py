@@ -0,0 +1,22 @@
+import importlib
+
+import pytest
+from sqlalchemy import Engine
+
+from tests.conftest import create_all_tables
+
+
+# SQLite can't drop the FKs of the cycles between the vocabulary tables
+@pytest.mark.filterwarnings("ignore:Can't sort tables for DROP")
+@pytest.mark.parametrize("version", ["cdm531", "cdm54", "cdm600"])
+def test_create_and_drop_all(bench, bench_engine: Engine, version: str):
+    metadata = importlib.import_module(f"src.omop_cdm.regular.{version}").Base.metadata
+
+    def create_all():
+        create_all_tables(bench_engine, metadata)
+
+    def drop_all():
+        metadata.drop_all(bench_engine)
+
+    bench(f"ddl.create_all[{version}]", create_all, setup=drop_all)
+    bench(f"ddl.drop_all[{version}]", drop_all, setup=create_all)
@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+SRC_DIR = Path(__file__).parents[1] / "src"
+
+
+def import_times(*modules: str) -> dict[str, int]:
+    """
+    Import the modules in a new interpreter, return the cumulative import
+    time of each module in microseconds.
+    """
+    env = {**os.environ, "PYTHONPATH": str(SRC_DIR)}
+    code = "; ".join(f"import {module}" for module in modules)
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+    # Lines are formatted as "import time: self [us] | cumulative | module"
+    cumulative = {
+        parts[2].strip(): int(parts[1])
+        for parts in (line.split("|") for line in stderr.splitlines())
+        if len(parts) == 3 and parts[1].strip().isdigit()
+    }
+    return {module: cumulative[module] for module in modules}
+
+
+@pytest.mark.parametrize("module", ["omop_cdm.constants", "omop_cdm.regular.cdm54"])
+def test_import_time(bench, module: str):
+    # SQLAlchemy is imported afterwards in the same process, as a baseline
+    # that is independent of the speed of the machine.
+    times = bench(f"import[{module}]", lambda: import_times(module, "sqlalchemy"))
+    # The module doesn't import SQLAlchemy, so it should take a fraction
+    # of the time.
+    assert times[module] < times["sqlalchemy"] / 10
@@ -0,0 +1,113 @@
+import datetime
+
+import pytest
+from sqlalchemy import Engine, insert, select
+from sqlalchemy.orm import Session, selectinload
+
+import src.omop_cdm.regular.cdm54 as cdm54
+from src.omop_cdm.timelines import load_person_timelines
+from tests.omop_cdm.records import VALID_END_DATE, VALID_START_DATE
+
+# Number of persons or concepts looked up per benchmark
+LOOKUPS = 100
+CONCEPTS = 1_000
+
+
+@pytest.fixture(scope="module")
+def populated_engine(cdm54_engine: Engine, bench_rows: int) -> Engine:
+    """CDM with concepts, and bench_rows conditions for bench_rows / 10 persons."""
+    persons = max(bench_rows // 10, LOOKUPS)
+    start = datetime.date(2020, 1, 1)
+    with cdm54_engine.begin() as conn:
+        conn.execute(
+            insert(cdm54.Concept),
+            [
+                {
+                    "concept_id": i,
+                    "concept_name": f"Concept {i}",
+                    "domain_id": "Condition",
+                    "vocabulary_id": "SNOMED",
+                    "concept_class_id": "Clinical Finding",
+                    "standard_concept": "S",
+                    "concept_code": str(i),
+                    "valid_start_date": VALID_START_DATE,
+                    "valid_end_date": VALID_END_DATE,
+                }
+                for i in range(CONCEPTS)
+            ],
+        )
+        conn.execute(
+            insert(cdm54.Person),
+            [
+                {
+                    "person_id": i,
+                    "gender_concept_id": i % 2,
+                    "year_of_birth": 1950 + i % 50,
+                    "race_concept_id": 0,
+                    "ethnicity_concept_id": 0,
+                    "person_source_value": f"P{i}",
+                }
+                for i in range(persons)
+            ],
+        )
+        conn.execute(
+            insert(cdm54.ConditionOccurrence),
+            [
+                {
+                    "condition_occurrence_id": i,
+                    "person_id": i % persons,
+                    "condition_concept_id": i % CONCEPTS,
+                    "condition_start_date": start + datetime.timedelta(days=i % 1000),
+                    "condition_type_concept_id": 1,
+                }
+                for i in range(bench_rows)
+            ],
+        )
+    return cdm54_engine
+
+
+def test_person_by_source_value(bench, populated_engine: Engine):
+    def query():
+        with Session(populated_engine) as session:
+            for i in range(LOOKUPS):
+                statement = select(cdm54.Person).filter_by(person_source_value=f"P{i}")
+                session.scalars(statement).one()
+
+    bench("query.person_by_source_value", query)
+
+
+def test_concept_by_code(bench, populated_engine: Engine):
+    def query():
+        with Session(populated_engine) as session:
+            for i in range(LOOKUPS):
+                statement = select(cdm54.Concept).filter_by(
+                    vocabulary_id="SNOMED", concept_code=str(i)
+                )
+                session.scalars(statement).one()
+
+    bench("query.concept_by_code", query)
+
+
+def test_persons_with_conditions(bench, populated_engine: Engine):
+    def query():
+        with Session(populated_engine) as session:
+            statement = (
+                select(cdm54.Person)
+                .where(cdm54.Person.person_id < LOOKUPS)
+                .options(selectinload(cdm54.Person.condition_occurrences))
+            )
+            persons = session.scalars(statement).all()
+            for person in persons:
+                for condition in person.condition_occurrences:
+                    _ = condition.condition_concept.concept_name
+            return len(persons)
+
+    assert bench("query.persons_with_conditions", query) == LOOKUPS
+
+
+def test_load_person_timelines(bench, populated_engine: Engine):
+    def query():
+        with Session(populated_engine) as session:
+            return len(load_person_timelines(session, range(LOOKUPS), cdm54.Person))
+
+    assert bench("query.load_person_timelines", query) == LOOKUPS
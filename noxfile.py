@@ -22,6 +22,13 @@ def tests(session: nox.Session):
     session.run("pytest", "--cov-report", "term-missing", "--cov=src")
 
 
+@nox.session(reuse_venv=True)
+def benchmarks(session: nox.Session):
+    """Run the benchmark suite, pass e.g. -- --bench-db postgres."""
+    session.run("poetry", "install", external=True)
+    session.run("pytest", "benchmarks", *session.posargs)
+
+
 @nox.session(reuse_venv=True, name="format")
 def format_all(session: nox.Session):
     """Format codebase with ruff."""
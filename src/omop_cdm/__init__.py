@@ -1,7 +1,16 @@
 """OMOP CDM SQLAlchemy model."""
 
-import importlib.metadata
+from typing import Any
 
 from omop_cdm.constants import NAMING_CONVENTION
 
-__version__ = importlib.metadata.version("omop-cdm")
+
+def __getattr__(name: str) -> Any:
+    # Reading the package metadata is slow, so only done when needed
+    if name == "__version__":
+        import importlib.metadata
+
+        global __version__
+        __version__ = importlib.metadata.version("omop-cdm")
+        return __version__
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
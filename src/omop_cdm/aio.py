@@ -0,0 +1,80 @@
+"""Common CDM queries for asyncio applications."""
+
+from collections.abc import Iterable
+from typing import Any, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.interfaces import ORMOption
+
+from omop_cdm.concept_cache import IN_CLAUSE_SIZE
+
+
+async def get_person_by_source_value(
+    session: AsyncSession,
+    person_source_value: str,
+    *options: ORMOption,
+    person_class: Optional[type[Any]] = None,
+) -> Optional[Any]:
+    """
+    Return the person with the given person_source_value, if it exists.
+
+    Relationships are not loaded implicitly by an AsyncSession. Either
+    pass loader options, e.g. selectinload(Person.condition_occurrences),
+    or await them via the awaitable_attrs of the regular Bases, e.g.
+    await person.awaitable_attrs.condition_occurrences. The person class
+    defaults to the Person of the regular CDM 5.4.
+    """
+    if person_class is None:
+        from omop_cdm.regular.cdm54 import Person as person_class
+
+    statement = (
+        select(person_class)
+        .where(person_class.person_source_value == person_source_value)
+        .options(*options)
+    )
+    return (await session.scalars(statement)).one_or_none()
+
+
+async def get_concept_by_code(
+    session: AsyncSession,
+    vocabulary_id: str,
+    concept_code: str,
+    concept_class: Optional[type[Any]] = None,
+) -> Optional[Any]:
+    """
+    Return the concept with the given code in a vocabulary, if it exists.
+
+    The concept class defaults to the Concept of the regular CDM 5.4.
+    """
+    if concept_class is None:
+        from omop_cdm.regular.cdm54 import Concept as concept_class
+
+    statement = select(concept_class).where(
+        concept_class.vocabulary_id == vocabulary_id,
+        concept_class.concept_code == concept_code,
+    )
+    return (await session.scalars(statement)).one_or_none()
+
+
+async def get_concepts(
+    session: AsyncSession,
+    concept_ids: Iterable[int],
+    concept_class: Optional[type[Any]] = None,
+) -> dict[int, Any]:
+    """
+    Return the concepts of multiple concept_ids, by concept_id.
+
+    The concepts are retrieved in a single query (per IN_CLAUSE_SIZE
+    concept_ids). Concept_ids that don't exist are absent from the result.
+    """
+    if concept_class is None:
+        from omop_cdm.regular.cdm54 import Concept as concept_class
+
+    concept_ids = sorted(set(concept_ids))
+    concepts = {}
+    for i in range(0, len(concept_ids), IN_CLAUSE_SIZE):
+        chunk = concept_ids[i : i + IN_CLAUSE_SIZE]
+        statement = select(concept_class).where(concept_class.concept_id.in_(chunk))
+        concepts.update((c.concept_id, c) for c in await session.scalars(statement))
+    return concepts
@@ -0,0 +1,263 @@
+"""Compact in-memory index of the concept_ancestor table."""
+
+import mmap
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterable, Iterator, Sequence
+from pathlib import Path
+from typing import Any, Optional, Union
+
+from sqlalchemy import Connection, Engine, select
+
+from omop_cdm.util import connect
+
+# A row of concept_ancestor: (ancestor_concept_id, descendant_concept_id,
+# min_levels_of_separation, max_levels_of_separation)
+AncestorRow = tuple[int, int, int, int]
+
+# Type codes of the arrays: concept_ids are 32-bit integers in the CDM,
+# separation levels easily fit into 16 bits.
+_ID_TYPE = "i"
+_LEVEL_TYPE = "h"
+_OFFSET_TYPE = "q"
+
+_FILE_MAGIC = b"OMOPCAI1"
+_HEADER = struct.Struct("<8s8s4q")
+_ALIGNMENT = 8
+
+
+class _Csr:
+    """
+    Compressed sparse row representation of a concept hierarchy.
+
+    The values of keys[i] are stored in values[offsets[i]:offsets[i + 1]],
+    sorted ascending, with their separation levels at the same positions
+    in min_levels and max_levels.
+    """
+
+    def __init__(
+        self,
+        keys: Sequence[int],
+        offsets: Sequence[int],
+        values: Sequence[int],
+        min_levels: Sequence[int],
+        max_levels: Sequence[int],
+    ):
+        self.keys = keys
+        self.offsets = offsets
+        self.values = values
+        self.min_levels = min_levels
+        self.max_levels = max_levels
+
+    @property
+    def arrays(self) -> list[Sequence[int]]:
+        return [self.keys, self.offsets, self.values, self.min_levels, self.max_levels]
+
+    @classmethod
+    def from_sorted(cls, pairs: Iterable[AncestorRow]) -> "_Csr":
+        """Build from rows of (key, value, min_level, max_level) sorted by key."""
+        keys, offsets = array(_ID_TYPE), array(_OFFSET_TYPE, [0])
+        values, min_levels, max_levels = (
+            array(_ID_TYPE),
+            array(_LEVEL_TYPE),
+            array(_LEVEL_TYPE),
+        )
+        for key, value, min_level, max_level in pairs:
+            if not keys or keys[-1] != key:
+                if keys:
+                    offsets.append(len(values))
+                keys.append(key)
+            values.append(value)
+            min_levels.append(min_level)
+            max_levels.append(max_level)
+        if keys:
+            offsets.append(len(values))
+        return cls(keys, offsets, values, min_levels, max_levels)
+
+    def span(self, key: int) -> tuple[int, int]:
+        i = bisect_left(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key:
+            return 0, 0
+        return self.offsets[i], self.offsets[i + 1]
+
+    def related(self, keys: Iterable[int], max_levels: Optional[int]) -> set[int]:
+        result: set[int] = set()
+        for key in keys:
+            start, end = self.span(key)
+            if max_levels is None:
+                result.update(self.values[start:end])
+            else:
+                levels = self.min_levels
+                result.update(
+                    self.values[i] for i in range(start, end) if levels[i] <= max_levels
+                )
+        return result
+
+
+class ConceptAncestorIndex:
+    """
+    Index of all ancestor/descendant relations from concept_ancestor.
+
+    The relations are stored in compact sorted integer arrays (in both
+    directions), so that the descendants or ancestors of a concept can be
+    found with a binary search instead of a database query.
+
+    The index can be saved to a file. Loading it memory-maps the file, so
+    that multiple processes loading the same file share a single copy in
+    memory.
+    """
+
+    def __init__(
+        self, by_ancestor: _Csr, by_descendant: _Csr, mapped: Optional[mmap.mmap] = None
+    ):
+        self._by_ancestor = by_ancestor
+        self._by_descendant = by_descendant
+        self._mmap = mapped
+
+    def __len__(self) -> int:
+        return len(self._by_ancestor.values)
+
+    def __enter__(self) -> "ConceptAncestorIndex":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[AncestorRow]) -> "ConceptAncestorIndex":
+        """
+        Build the index from concept_ancestor rows.
+
+        The rows are sorted in memory, so for a full vocabulary use
+        from_database instead.
+        """
+        rows = list(rows)
+        by_ancestor = _Csr.from_sorted(sorted(rows))
+        by_descendant = _Csr.from_sorted(
+            sorted((d, a, mn, mx) for a, d, mn, mx in rows)
+        )
+        return cls(by_ancestor, by_descendant)
+
+    @classmethod
+    def from_database(
+        cls, bind: Union[Engine, Connection], concept_ancestor_class: type[Any]
+    ) -> "ConceptAncestorIndex":
+        """
+        Build the index from the concept_ancestor table.
+
+        The table is streamed twice, sorted by the database in either
+        direction, so only the resulting arrays are kept in memory.
+        """
+        ca = concept_ancestor_class
+        levels = (ca.min_levels_of_separation, ca.max_levels_of_separation)
+        by_ancestor_query = select(
+            ca.ancestor_concept_id, ca.descendant_concept_id, *levels
+        ).order_by(ca.ancestor_concept_id, ca.descendant_concept_id)
+        by_descendant_query = select(
+            ca.descendant_concept_id, ca.ancestor_concept_id, *levels
+        ).order_by(ca.descendant_concept_id, ca.ancestor_concept_id)
+        by_ancestor = _Csr.from_sorted(_stream_rows(bind, by_ancestor_query))
+        by_descendant = _Csr.from_sorted(_stream_rows(bind, by_descendant_query))
+        return cls(by_ancestor, by_descendant)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "ConceptAncestorIndex":
+        """Load an index saved with save(), via a read-only memory map."""
+        with Path(path).open("rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, byteorder, *sizes = _HEADER.unpack_from(mapped)
+        if magic != _FILE_MAGIC:
+            mapped.close()
+            raise ValueError(f"{path} is not a concept ancestor index file")
+        if byteorder.rstrip(b"\0").decode() != sys.byteorder:
+            mapped.close()
+            raise ValueError(
+                f"{path} was created on a platform with a different byte order"
+            )
+
+        view = memoryview(mapped)
+        position = _HEADER.size
+        csrs = []
+        for n_keys, n_values in (sizes[:2], sizes[2:]):
+            arrays = []
+            for type_code, length in zip(
+                _csr_type_codes(), (n_keys, n_keys + 1, n_values, n_values, n_values)
+            ):
+                position = _align(position)
+                size = length * array(type_code).itemsize
+                arrays.append(view[position : position + size].cast(type_code))
+                position += size
+            csrs.append(_Csr(*arrays))
+        return cls(*csrs, mapped=mapped)
+
+    def save(self, path: Union[str, Path]) -> None:
+        """Save the index to a file, which can be loaded with load()."""
+        header = _HEADER.pack(
+            _FILE_MAGIC,
+            sys.byteorder.encode(),
+            len(self._by_ancestor.keys),
+            len(self._by_ancestor.values),
+            len(self._by_descendant.keys),
+            len(self._by_descendant.values),
+        )
+        with Path(path).open("wb") as f:
+            f.write(header)
+            for csr in (self._by_ancestor, self._by_descendant):
+                for values in csr.arrays:
+                    f.write(b"\0" * (_align(f.tell()) - f.tell()))
+                    f.write(memoryview(values).cast("B"))
+
+    def close(self) -> None:
+        """Release the memory map, if the index was loaded from a file."""
+        if self._mmap is not None:
+            for csr in (self._by_ancestor, self._by_descendant):
+                for values in csr.arrays:
+                    values.release()
+            self._mmap.close()
+            self._mmap = None
+
+    def descendants(
+        self, concept_ids: Iterable[int], max_levels: Optional[int] = None
+    ) -> set[int]:
+        """
+        Return all descendants of the given concepts.
+
+        As concept_ancestor relates each standard concept to itself, the
+        concepts themselves are normally included. If max_levels is given,
+        only descendants with a min_levels_of_separation of at most
+        max_levels are returned.
+        """
+        return self._by_ancestor.related(concept_ids, max_levels)
+
+    def ancestors(
+        self, concept_ids: Iterable[int], max_levels: Optional[int] = None
+    ) -> set[int]:
+        """Return all ancestors of the given concepts, see descendants()."""
+        return self._by_descendant.related(concept_ids, max_levels)
+
+    def separation(
+        self, ancestor_id: int, descendant_id: int
+    ) -> Optional[tuple[int, int]]:
+        """Return the min and max levels of separation between two concepts."""
+        csr = self._by_ancestor
+        start, end = csr.span(ancestor_id)
+        i = bisect_left(csr.values, descendant_id, start, end)
+        if i == end or csr.values[i] != descendant_id:
+            return None
+        return csr.min_levels[i], csr.max_levels[i]
+
+
+def _csr_type_codes() -> tuple[str, ...]:
+    return _ID_TYPE, _OFFSET_TYPE, _ID_TYPE, _LEVEL_TYPE, _LEVEL_TYPE
+
+
+def _align(position: int) -> int:
+    return -(-position // _ALIGNMENT) * _ALIGNMENT
+
+
+def _stream_rows(bind: Union[Engine, Connection], statement) -> Iterator[AncestorRow]:
+    with connect(bind) as conn:
+        for row in conn.execute(statement.execution_options(yield_per=100_000)):
+            yield tuple(row)
@@ -0,0 +1,142 @@
+"""Load vocabulary files downloaded from Athena into PostgreSQL."""
+
+import logging
+import time
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Optional
+
+from sqlalchemy import Connection, Date, MetaData, Table
+
+from omop_cdm.constants import VOCAB_SCHEMA
+from omop_cdm.util import copy_from_stdin, copy_statement
+
+logger = logging.getLogger(__name__)
+
+# Athena files are tab-separated, without quoting, and contain dates
+# formatted as YYYYMMDD.
+ATHENA_DELIMITER = "\t"
+ATHENA_FILE_SUFFIX = ".csv"
+
+
+@dataclass(frozen=True)
+class LoadProgress:
+    """Number of rows loaded into a table so far."""
+
+    table: str
+    rows: int
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+ProgressCallback = Callable[[LoadProgress], None]
+
+
+def find_vocabulary_table(metadata: MetaData, path: Path) -> Table:
+    """Return the vocabulary table matching an Athena file, e.g. CONCEPT.csv."""
+    name = path.stem.lower()
+    for table in metadata.tables.values():
+        if table.name == name and table.schema == VOCAB_SCHEMA:
+            return table
+    raise ValueError(f"No vocabulary table found for file {path.name}")
+
+
+def load_athena_vocabulary(
+    conn: Connection,
+    metadata: MetaData,
+    directory: Path,
+    chunk_size: int = 100_000,
+    progress: Optional[ProgressCallback] = None,
+) -> dict[str, int]:
+    """
+    Load all Athena vocabulary files in a directory.
+
+    Each file is loaded into the vocabulary table of the same name
+    (e.g. CONCEPT.csv into concept). Files for which the MetaData has no
+    vocabulary table are skipped. As the vocabulary tables refer to each
+    other, the foreign keys should be absent during the load, see
+    omop_cdm.ddl.create_all_deferred.
+
+    Returns the number of loaded rows per table.
+    """
+    row_counts = {}
+    for path in sorted(Path(directory).glob(f"*{ATHENA_FILE_SUFFIX}")):
+        try:
+            table = find_vocabulary_table(metadata, path)
+        except ValueError:
+            logger.warning("Skipping %s, no matching vocabulary table", path.name)
+            continue
+        row_counts[table.name] = load_athena_file(
+            conn, table, path, chunk_size, progress
+        )
+    return row_counts
+
+
+def load_athena_file(
+    conn: Connection,
+    table: Table,
+    path: Path,
+    chunk_size: int = 100_000,
+    progress: Optional[ProgressCallback] = None,
+) -> int:
+    """
+    Load a single Athena file into a table via COPY FROM STDIN.
+
+    The file is streamed in chunks of chunk_size rows, so memory usage
+    stays constant regardless of the file size. The schema of the table
+    is resolved via the schema_translate_map of the connection.
+
+    Returns the number of loaded rows.
+    """
+    with Path(path).open(encoding="utf-8", newline="") as f:
+        columns = f.readline().rstrip("\r\n").lower().split(ATHENA_DELIMITER)
+        unknown = set(columns) - set(table.columns.keys())
+        if unknown:
+            raise ValueError(
+                f"Columns {sorted(unknown)} of {path.name} not in table {table.name}"
+            )
+        date_positions = [
+            i for i, c in enumerate(columns) if isinstance(table.columns[c].type, Date)
+        ]
+        copy_sql = copy_statement(conn, table, columns, "FORMAT text, NULL ''")
+
+        start = time.perf_counter()
+        rows = 0
+        for chunk in _chunks(f, chunk_size):
+            data = "".join(_convert_line(line, date_positions) for line in chunk)
+            copy_from_stdin(conn, copy_sql, data)
+            rows += len(chunk)
+            status = LoadProgress(
+                table=table.name, rows=rows, seconds=time.perf_counter() - start
+            )
+            logger.info(
+                "%s: %d rows (%.0f rows/s)",
+                status.table,
+                status.rows,
+                status.rows_per_second,
+            )
+            if progress is not None:
+                progress(status)
+    return rows
+
+
+def _chunks(lines: Iterable[str], size: int) -> Iterator[list[str]]:
+    iterator = iter(lines)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _convert_line(line: str, date_positions: list[int]) -> str:
+    """Convert an Athena line to the PostgreSQL COPY text format."""
+    # Backslashes are escape characters in the COPY text format
+    values = line.rstrip("\r\n").replace("\\", "\\\\").split(ATHENA_DELIMITER)
+    for i in date_positions:
+        value = values[i]
+        if len(value) == 8:
+            values[i] = f"{value[:4]}-{value[4:6]}-{value[6:]}"
+    return ATHENA_DELIMITER.join(values) + "\n"
@@ -0,0 +1,180 @@
+"""In-memory cache for concept lookups."""
+
+from collections import OrderedDict
+from collections.abc import Iterable, Iterator
+from typing import Any, Optional, Union
+
+from sqlalchemy import Connection, Engine, Select, select
+from sqlalchemy.orm import Session
+
+# Maximum number of values in a single IN clause
+IN_CLAUSE_SIZE = 10_000
+
+# Cached value of a concept_id or code that doesn't exist
+_MISSING = object()
+
+
+class ConceptCache:
+    """
+    Least recently used cache of concepts.
+
+    Concepts can be looked up by concept_id, or by vocabulary_id and
+    concept_code. Concepts that are not cached yet are retrieved from the
+    database via the provided concept class, which can be the Concept
+    class of any regular CDM, or a dynamic concept table bound to a
+    custom Base.
+
+    Lookups of concept_ids and codes that don't exist are cached as well,
+    in the same LRU, so they count towards max_size (and len) too. The
+    cached concepts are detached from any session, so only their column
+    attributes are available. The cache is not thread-safe.
+    """
+
+    def __init__(
+        self,
+        bind: Union[Engine, Connection],
+        concept_class: type[Any],
+        max_size: Optional[int] = 100_000,
+    ):
+        self.bind = bind
+        self.concept_class = concept_class
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        # Concepts by concept_id, and _MISSING by concept_id or by
+        # (vocabulary_id, concept_code) for lookups that found nothing
+        self._concepts: OrderedDict[Union[int, tuple[str, str]], Any] = OrderedDict()
+        self._ids_by_code: dict[tuple[str, str], int] = {}
+
+    def __len__(self) -> int:
+        return len(self._concepts)
+
+    def __contains__(self, concept_id: int) -> bool:
+        return self._concepts.get(concept_id, _MISSING) is not _MISSING
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, concept_id: int) -> Optional[Any]:
+        """Return the concept with the given concept_id, if it exists."""
+        return self.get_many([concept_id]).get(concept_id)
+
+    def get_many(self, concept_ids: Iterable[int]) -> dict[int, Any]:
+        """
+        Return the concepts of multiple concept_ids.
+
+        All concepts that are not cached are retrieved in a single query
+        (per IN_CLAUSE_SIZE concept_ids). Concept_ids that don't exist are
+        absent from the result, and are not queried again while cached.
+        """
+        found = {}
+        missing = set()
+        for concept_id in concept_ids:
+            concept = self._lookup(concept_id)
+            if concept is None:
+                missing.add(concept_id)
+            elif concept is not _MISSING:
+                found[concept_id] = concept
+        if missing:
+            id_column = self.concept_class.concept_id
+            missing_ids = sorted(missing)
+            for i in range(0, len(missing_ids), IN_CLAUSE_SIZE):
+                chunk = missing_ids[i : i + IN_CLAUSE_SIZE]
+                for concept in self._fetch(
+                    select(self.concept_class).where(id_column.in_(chunk))
+                ):
+                    found[concept.concept_id] = concept
+                for concept_id in chunk:
+                    if concept_id not in found:
+                        self._add_missing(concept_id)
+        return found
+
+    def get_by_code(self, vocabulary_id: str, concept_code: str) -> Optional[Any]:
+        """Return the concept with the given code in a vocabulary, if it exists."""
+        code = (vocabulary_id, concept_code)
+        concept_id = self._ids_by_code.get(code)
+        if concept_id is not None:
+            return self.get(concept_id)
+        if self._lookup(code) is _MISSING:
+            return None
+        statement = select(self.concept_class).where(
+            self.concept_class.vocabulary_id == vocabulary_id,
+            self.concept_class.concept_code == concept_code,
+        )
+        concepts = self._fetch(statement)
+        if not concepts:
+            self._add_missing(code)
+            return None
+        return concepts[0]
+
+    def warm(
+        self,
+        vocabulary_ids: Optional[Iterable[str]] = None,
+        domain_ids: Optional[Iterable[str]] = None,
+    ) -> int:
+        """
+        Preload all concepts of the given vocabularies and/or domains.
+
+        Returns the number of loaded concepts, which replace cached
+        lookups that found nothing. If more concepts are loaded
+        than fit in the cache, only the last loaded ones are kept.
+        """
+        statement = select(self.concept_class)
+        if vocabulary_ids is not None:
+            statement = statement.where(
+                self.concept_class.vocabulary_id.in_(list(vocabulary_ids))
+            )
+        if domain_ids is not None:
+            statement = statement.where(
+                self.concept_class.domain_id.in_(list(domain_ids))
+            )
+        return sum(1 for _ in self._stream(statement))
+
+    def clear(self) -> None:
+        """Remove all concepts from the cache and reset the counters."""
+        self._concepts.clear()
+        self._ids_by_code.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key: Union[int, tuple[str, str]]) -> Optional[Any]:
+        """Return the cached concept or _MISSING, or None if not cached."""
+        concept = self._concepts.get(key)
+        if concept is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._concepts.move_to_end(key)
+        return concept
+
+    def _fetch(self, statement: Select) -> list[Any]:
+        return list(self._stream(statement))
+
+    def _stream(self, statement: Select) -> Iterator[Any]:
+        with Session(self.bind) as session:
+            options = {"yield_per": IN_CLAUSE_SIZE}
+            for concept in session.scalars(statement.execution_options(**options)):
+                self._add(concept)
+                yield concept
+
+    def _add(self, concept: Any) -> None:
+        self._concepts[concept.concept_id] = concept
+        self._concepts.move_to_end(concept.concept_id)
+        code = (concept.vocabulary_id, concept.concept_code)
+        self._ids_by_code[code] = concept.concept_id
+        self._concepts.pop(code, None)
+        self._evict()
+
+    def _add_missing(self, key: Union[int, tuple[str, str]]) -> None:
+        self._concepts[key] = _MISSING
+        self._concepts.move_to_end(key)
+        self._evict()
+
+    def _evict(self) -> None:
+        if self.max_size is not None and len(self._concepts) > self.max_size:
+            _, evicted = self._concepts.popitem(last=False)
+            if evicted is not _MISSING:
+                code = (evicted.vocabulary_id, evicted.concept_code)
+                self._ids_by_code.pop(code, None)
@@ -0,0 +1,314 @@
+"""Deferred creation of indexes and foreign keys, e.g. for bulk loads."""
+
+import logging
+import threading
+import time
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from sqlalchemy import (
+    Connection,
+    Dialect,
+    Engine,
+    ForeignKeyConstraint,
+    Index,
+    MetaData,
+    Table,
+    inspect,
+)
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.schema import (
+    AddConstraint,
+    CreateIndex,
+    CreateTable,
+    ExecutableDDLElement,
+    sort_tables,
+)
+from sqlalchemy.sql.compiler import DDLCompiler
+
+from omop_cdm.util import get_translated_schema
+
+logger = logging.getLogger(__name__)
+
+# Table lock modes (as named by PostgreSQL) that are acquired by the
+# deferred DDL statements, with the modes each of them conflicts with.
+# Statements holding conflicting locks on the same table are never run
+# at the same time by DeferredSchema.build_parallel.
+ROW_SHARE = "ROW SHARE"
+SHARE_UPDATE_EXCLUSIVE = "SHARE UPDATE EXCLUSIVE"
+SHARE = "SHARE"
+SHARE_ROW_EXCLUSIVE = "SHARE ROW EXCLUSIVE"
+
+LOCK_CONFLICTS = {
+    ROW_SHARE: set(),
+    SHARE_UPDATE_EXCLUSIVE: {SHARE_UPDATE_EXCLUSIVE, SHARE, SHARE_ROW_EXCLUSIVE},
+    SHARE: {SHARE_UPDATE_EXCLUSIVE, SHARE_ROW_EXCLUSIVE},
+    SHARE_ROW_EXCLUSIVE: {SHARE_UPDATE_EXCLUSIVE, SHARE, SHARE_ROW_EXCLUSIVE},
+}
+
+
+class AddConstraintNotValid(AddConstraint):
+    """
+    Add a constraint without checking the existing rows.
+
+    Only supported by PostgreSQL. The constraint must be validated
+    afterwards with ValidateConstraint.
+    """
+
+
+@compiles(AddConstraintNotValid, "postgresql")
+def _compile_add_constraint_not_valid(
+    element: AddConstraintNotValid, compiler: DDLCompiler, **kw: Any
+) -> str:
+    return f"{compiler.visit_add_constraint(element, **kw)} NOT VALID"
+
+
+class ValidateConstraint(ExecutableDDLElement):
+    """Validate a constraint that was added with AddConstraintNotValid."""
+
+    def __init__(self, element: ForeignKeyConstraint):
+        self.element = element
+
+
+@compiles(ValidateConstraint)
+def _compile_validate_constraint(
+    element: ValidateConstraint, compiler: DDLCompiler, **kw: Any
+) -> str:
+    constraint = element.element
+    return (
+        f"ALTER TABLE {compiler.preparer.format_table(constraint.table)} "
+        f"VALIDATE CONSTRAINT {compiler.preparer.format_constraint(constraint)}"
+    )
+
+
+@dataclass(frozen=True)
+class DdlTiming:
+    """Execution time of a single DDL statement."""
+
+    statement: str
+    seconds: float
+
+
+@dataclass(eq=False)
+class _DdlTask:
+    statement: ExecutableDDLElement
+    # Lock mode per table (full name) held while the statement runs
+    locks: dict[str, str] = field(default_factory=dict)
+
+    def conflicts_with(self, other: "_DdlTask") -> bool:
+        return any(
+            mode in LOCK_CONFLICTS[other.locks[table]]
+            for table, mode in self.locks.items()
+            if table in other.locks
+        )
+
+
+class DeferredSchema:
+    """
+    Indexes and foreign key constraints of CDM tables, to be built later.
+
+    Inserting large amounts of data is considerably faster when the
+    target tables don't have any indexes or foreign keys yet. This class
+    keeps track of these, so they can be added in a single pass once
+    the data has been loaded. The constraint and index names are taken
+    from the MetaData naming convention, so make sure the MetaData uses
+    omop_cdm.constants.NAMING_CONVENTION.
+
+    Instances are usually obtained via create_all_deferred, but as the
+    content is fully derived from the MetaData, one can also be created
+    directly (e.g. in a separate process after loading the data).
+    """
+
+    def __init__(
+        self,
+        metadata: MetaData,
+        tables: Optional[Iterable[Table]] = None,
+        foreign_keys: Optional[Iterable[ForeignKeyConstraint]] = None,
+    ):
+        self.metadata = metadata
+        if tables is None:
+            tables = metadata.tables.values()
+        self.tables: list[Table] = sorted(tables, key=lambda t: t.fullname)
+        # Only a subset of the foreign keys is deferred, if provided.
+        # The other foreign keys are created together with the tables.
+        self._deferred_fks = None if foreign_keys is None else set(foreign_keys)
+
+    @property
+    def indexes(self) -> list[Index]:
+        return [
+            ix
+            for table in self.tables
+            for ix in sorted(table.indexes, key=lambda ix: str(ix.name))
+        ]
+
+    @property
+    def foreign_keys(self) -> list[ForeignKeyConstraint]:
+        return [
+            fk
+            for table in self.tables
+            for fk in sorted(
+                table.foreign_key_constraints, key=lambda fk: tuple(fk.column_keys)
+            )
+            if self.is_deferred(fk)
+        ]
+
+    def is_deferred(self, fk: ForeignKeyConstraint) -> bool:
+        return self._deferred_fks is None or fk in self._deferred_fks
+
+    def statements(self, dialect: Dialect) -> list[ExecutableDDLElement]:
+        """
+        Return the DDL statements that add the indexes and foreign keys.
+
+        Foreign keys can only be added afterwards if the dialect supports
+        ALTER TABLE. For other dialects (e.g. SQLite) they are omitted.
+        """
+        statements: list[ExecutableDDLElement] = [
+            CreateIndex(ix) for ix in self.indexes
+        ]
+        if dialect.supports_alter:
+            statements.extend(
+                AddConstraint(fk, isolate_from_table=False) for fk in self.foreign_keys
+            )
+        return statements
+
+    def build(self, conn: Connection) -> None:
+        """Create all deferred indexes and foreign keys."""
+        for statement in self.statements(conn.dialect):
+            conn.execute(statement)
+
+    def build_parallel(self, engine: Engine, workers: int = 4) -> list[DdlTiming]:
+        """
+        Create all deferred indexes and foreign keys concurrently.
+
+        The statements are divided over a number of worker connections.
+        Statements that would block each other, because they lock the
+        same table in conflicting modes, are not run at the same time.
+        On PostgreSQL, foreign keys are first added as NOT VALID and then
+        validated separately. Validation only needs a weak lock on the
+        referenced table, so the many foreign keys that refer to e.g. the
+        concept table can still be validated in parallel.
+
+        Each statement runs in its own transaction. Returns the execution
+        time of every statement.
+        """
+        serial, parallel = _plan_parallel_build(self, engine.dialect)
+        timings = []
+        with engine.connect() as conn:
+            for statement in serial:
+                timings.append(_execute_timed(conn, statement))
+        timings.extend(_run_concurrently(engine, parallel, workers))
+        return timings
+
+
+def create_all_deferred(
+    conn: Connection,
+    metadata: MetaData,
+    tables: Optional[Iterable[Table]] = None,
+    checkfirst: bool = True,
+    foreign_keys: Optional[Iterable[ForeignKeyConstraint]] = None,
+) -> DeferredSchema:
+    """
+    Create tables without their indexes and foreign key constraints.
+
+    Works like MetaData.create_all, except that only the columns and
+    primary keys are created. Returns a DeferredSchema, which can be used
+    to build the indexes and foreign keys after the data has been loaded.
+
+    If foreign_keys is provided, only those foreign keys are deferred and
+    all others are created together with the tables. They must not
+    contain any cycles, see omop_cdm.loader.plan_load_order.
+    """
+    deferred = DeferredSchema(metadata, tables, foreign_keys)
+    inspector = inspect(conn)
+    ordered_tables = sort_tables(
+        deferred.tables, skip_fn=lambda fk: deferred.is_deferred(fk.constraint)
+    )
+    for table in ordered_tables:
+        schema = get_translated_schema(conn, table.schema)
+        if checkfirst and inspector.has_table(table.name, schema=schema):
+            continue
+        inline_fks = [
+            fk for fk in table.foreign_key_constraints if not deferred.is_deferred(fk)
+        ]
+        conn.execute(CreateTable(table, include_foreign_key_constraints=inline_fks))
+    return deferred
+
+
+def _plan_parallel_build(
+    deferred: DeferredSchema, dialect: Dialect
+) -> tuple[list[ExecutableDDLElement], list[_DdlTask]]:
+    """Split the deferred DDL into serial statements and concurrent tasks."""
+    serial: list[ExecutableDDLElement] = []
+    tasks = [
+        _DdlTask(CreateIndex(ix), {ix.table.fullname: SHARE}) for ix in deferred.indexes
+    ]
+    if not dialect.supports_alter:
+        return serial, tasks
+    for fk in deferred.foreign_keys:
+        table = fk.table.fullname
+        referred = fk.referred_table.fullname
+        if dialect.name == "postgresql":
+            # Adding a NOT VALID constraint only changes the catalog,
+            # so these are quick to run one by one.
+            serial.append(AddConstraintNotValid(fk, isolate_from_table=False))
+            locks = {referred: ROW_SHARE, table: SHARE_UPDATE_EXCLUSIVE}
+            tasks.append(_DdlTask(ValidateConstraint(fk), locks))
+        else:
+            locks = {referred: SHARE_ROW_EXCLUSIVE, table: SHARE_ROW_EXCLUSIVE}
+            tasks.append(_DdlTask(AddConstraint(fk, isolate_from_table=False), locks))
+    return serial, tasks
+
+
+def _execute_timed(conn: Connection, statement: ExecutableDDLElement) -> DdlTiming:
+    sql = str(statement.compile(dialect=conn.dialect)).strip()
+    start = time.perf_counter()
+    with conn.begin():
+        conn.execute(statement)
+    timing = DdlTiming(statement=sql, seconds=time.perf_counter() - start)
+    logger.info("%.3fs: %s", timing.seconds, timing.statement)
+    return timing
+
+
+def _run_concurrently(
+    engine: Engine, tasks: list[_DdlTask], workers: int
+) -> list[DdlTiming]:
+    pending = list(tasks)
+    running: list[_DdlTask] = []
+    timings: list[DdlTiming] = []
+    errors: list[BaseException] = []
+    condition = threading.Condition()
+
+    def take_task() -> Optional[_DdlTask]:
+        with condition:
+            while pending and not errors:
+                for task in pending:
+                    if not any(task.conflicts_with(other) for other in running):
+                        pending.remove(task)
+                        running.append(task)
+                        return task
+                condition.wait()
+            return None
+
+    def work() -> None:
+        with engine.connect() as conn:
+            while (task := take_task()) is not None:
+                try:
+                    timing = _execute_timed(conn, task.statement)
+                except BaseException as e:
+                    with condition:
+                        errors.append(e)
+                    raise
+                finally:
+                    with condition:
+                        running.remove(task)
+                        condition.notify_all()
+                with condition:
+                    timings.append(timing)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(work) for _ in range(workers)]
+    for future in futures:
+        future.result()
+    return timings
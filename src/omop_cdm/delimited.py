@@ -0,0 +1,247 @@
+"""Export CDM tables to (compressed) tab- or comma-separated files."""
+
+import csv
+import gzip
+import io
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, BinaryIO, Optional, Union
+
+from sqlalchemy import Connection, Date, DateTime, Engine, Table, select
+from sqlalchemy.orm import DeclarativeBase
+
+from omop_cdm.util import connect, copy_to_stdout, get_translated_schema
+
+COMPRESSION_SUFFIXES = {None: "", "gzip": ".gz", "zstd": ".zst"}
+
+# strftime directives supported by DelimitedFormat, with their equivalent
+# in the PostgreSQL to_char function.
+_TO_CHAR_PATTERNS = {
+    "%Y": "YYYY",
+    "%m": "MM",
+    "%d": "DD",
+    "%H": "HH24",
+    "%M": "MI",
+    "%S": "SS",
+    "%f": "US",
+    "%%": "%",
+}
+
+
+def _to_char_pattern(strftime_format: str) -> str:
+    """Convert a strftime format to a PostgreSQL to_char pattern."""
+    parts = []
+    for directive, literal in re.findall(r"(%.)|([^%]+)", strftime_format):
+        if directive:
+            if directive not in _TO_CHAR_PATTERNS:
+                raise ValueError(f"Unsupported date format directive {directive}")
+            parts.append(_TO_CHAR_PATTERNS[directive])
+        else:
+            # Double quoted text is copied as-is by to_char
+            escaped = literal.replace("\\", "\\\\").replace('"', '\\"')
+            parts.append(f'"{escaped}"'.replace("'", "''"))
+    return "".join(parts)
+
+
+@dataclass(frozen=True)
+class DelimitedFormat:
+    """
+    Layout of exported files.
+
+    Each file starts with a header of the (lowercase) column names. Values
+    are only quoted when they contain the delimiter, a quote or a line
+    break. NULLs are written as empty values, and empty strings as "" to
+    tell them apart, like PostgreSQL's COPY. Dates and datetimes are
+    formatted with the strftime formats, which may only contain the
+    directives %Y, %m, %d, %H, %M, %S and %f.
+    """
+
+    delimiter: str = "\t"
+    date_format: str = "%Y-%m-%d"
+    datetime_format: str = "%Y-%m-%d %H:%M:%S"
+
+    def __post_init__(self):
+        # Fail early for formats that cannot be used on PostgreSQL
+        _to_char_pattern(self.date_format)
+        _to_char_pattern(self.datetime_format)
+
+    @property
+    def suffix(self) -> str:
+        return ".tsv" if self.delimiter == "\t" else ".csv"
+
+
+# Tab-separated files with ISO dates, as read by the OHDSI tools
+OHDSI_TSV = DelimitedFormat()
+OHDSI_CSV = DelimitedFormat(delimiter=",")
+
+
+def export_table(
+    bind: Union[Engine, Connection],
+    table_class: type[Any],
+    directory: Union[str, Path],
+    file_format: DelimitedFormat = OHDSI_TSV,
+    compression: Optional[str] = "gzip",
+    batch_size: int = 10_000,
+) -> int:
+    """
+    Export a table to a file named after the table, e.g. person.tsv.gz.
+
+    The compression is "gzip", "zstd" (requires the zstandard package) or
+    None. Memory usage doesn't depend on the size of the table: on
+    PostgreSQL, the file is written while the output of COPY TO STDOUT is
+    received. Other databases are read via a server-side cursor (if
+    supported by the database), in batches of batch_size rows.
+
+    Returns the number of exported rows.
+    """
+    table = table_class.__table__
+    suffix = file_format.suffix + COMPRESSION_SUFFIXES[compression]
+    path = Path(directory) / f"{table.name}{suffix}"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with connect(bind) as conn, _open(path, compression) as file:
+        if conn.dialect.name == "postgresql":
+            return copy_to_stdout(conn, _copy_sql(conn, table, file_format), file)
+        return _write_rows(conn, table, file_format, file, batch_size)
+
+
+def export_cdm(
+    bind: Union[Engine, Connection],
+    base: type[DeclarativeBase],
+    directory: Union[str, Path],
+    file_format: DelimitedFormat = OHDSI_TSV,
+    compression: Optional[str] = "gzip",
+    batch_size: int = 10_000,
+    tables: Optional[list[str]] = None,
+    workers: int = 4,
+) -> dict[str, int]:
+    """
+    Export all tables of a Base (or only the given tables) to a directory.
+
+    With an Engine, the number of workers tables are exported at the same
+    time, each over its own connection. With a Connection, the tables are
+    exported one by one. See export_table. Returns the number of exported
+    rows per table.
+    """
+    classes = {
+        mapper.local_table.name: mapper.class_
+        for mapper in base.registry.mappers
+        if tables is None or mapper.local_table.name in tables
+    }
+    names = sorted(classes)
+
+    def export(name: str) -> int:
+        return export_table(
+            bind, classes[name], directory, file_format, compression, batch_size
+        )
+
+    if not isinstance(bind, Engine) or workers <= 1:
+        return {name: export(name) for name in names}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(zip(names, executor.map(export, names)))
+
+
+def _open(path: Path, compression: Optional[str]) -> BinaryIO:
+    if compression is None:
+        return path.open("wb")
+    if compression == "gzip":
+        # Level 6 (the zlib default) is a lot faster than gzip's default
+        # of 9, and the files are barely larger
+        return gzip.open(path, "wb", compresslevel=6)
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError(
+                "zstd compression requires zstandard: pip install omop-cdm[zstd]"
+            ) from e
+        return zstandard.ZstdCompressor().stream_writer(path.open("wb"))
+    raise ValueError(f"Unknown compression {compression!r}")
+
+
+def _write_rows(
+    conn: Connection,
+    table: Table,
+    file_format: DelimitedFormat,
+    file: BinaryIO,
+    batch_size: int,
+) -> int:
+    columns = list(table.columns)
+    formats = [_strftime_format(column.type, file_format) for column in columns]
+    formatted = [(i, f) for i, f in enumerate(formats) if f is not None]
+    text = io.TextIOWrapper(file, encoding="utf-8", newline="")
+    writer = csv.writer(text, delimiter=file_format.delimiter, lineterminator="\n")
+    writer.writerow(column.name for column in columns)
+    rows = 0
+    statement = select(*columns).execution_options(yield_per=batch_size)
+    for partition in conn.execute(statement).partitions():
+        if formatted:
+            partition = [_format_row(row, formatted) for row in partition]
+        if any("" in row for row in partition):
+            # The csv module writes empty strings like NULLs
+            for row in partition:
+                if "" in row:
+                    text.write(_format_line(row, file_format.delimiter))
+                else:
+                    writer.writerow(row)
+        else:
+            writer.writerows(partition)
+        rows += len(partition)
+    # Detach the wrapper, so the file is closed by its own context manager
+    text.flush()
+    text.detach()
+    return rows
+
+
+def _format_row(row: Any, formatted: list[tuple[int, str]]) -> list[Any]:
+    values = list(row)
+    for i, strftime_format in formatted:
+        value = values[i]
+        if value is not None:
+            values[i] = value.strftime(strftime_format)
+    return values
+
+
+def _format_line(row: Any, delimiter: str) -> str:
+    """Format a row like csv.writer, but with empty strings quoted."""
+    values = []
+    for value in row:
+        if value is None:
+            values.append("")
+            continue
+        value = str(value)
+        if value == "" or any(c in value for c in (delimiter, '"', "\r", "\n")):
+            value = '"' + value.replace('"', '""') + '"'
+        values.append(value)
+    return delimiter.join(values) + "\n"
+
+
+def _copy_sql(conn: Connection, table: Table, file_format: DelimitedFormat) -> str:
+    preparer = conn.dialect.identifier_preparer
+    expressions = []
+    for column in table.columns:
+        name = preparer.quote(column.name)
+        strftime_format = _strftime_format(column.type, file_format)
+        if strftime_format is None:
+            expressions.append(name)
+        else:
+            pattern = _to_char_pattern(strftime_format)
+            expressions.append(f"to_char({name}, '{pattern}') AS {name}")
+    schema = get_translated_schema(conn, table.schema)
+    source = preparer.quote(table.name)
+    if schema is not None:
+        source = f"{preparer.quote_schema(schema)}.{source}"
+    delimiter = file_format.delimiter.replace("'", "''")
+    return (
+        f"COPY (SELECT {', '.join(expressions)} FROM {source}) TO STDOUT "
+        f"WITH (FORMAT csv, HEADER, DELIMITER '{delimiter}', NULL '')"
+    )
+
+
+def _strftime_format(column_type: Any, file_format: DelimitedFormat) -> Optional[str]:
+    if isinstance(column_type, DateTime):
+        return file_format.datetime_format
+    if isinstance(column_type, Date):
+        return file_format.date_format
+    return None
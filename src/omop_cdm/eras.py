@@ -0,0 +1,477 @@
+"""Build the era tables from clinical events."""
+
+import datetime
+from collections.abc import Iterable, Iterator, Sequence
+from typing import Any, Optional
+
+from sqlalchemy import (
+    Column,
+    Connection,
+    Date,
+    DateTime,
+    Dialect,
+    Engine,
+    Integer,
+    MetaData,
+    Select,
+    String,
+    Subquery,
+    Table,
+    Text,
+    and_,
+    case,
+    cast,
+    delete,
+    func,
+    insert,
+    literal,
+    or_,
+    select,
+    union,
+)
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.orm import DeclarativeBase
+
+from omop_cdm.constants import CDM_SCHEMA, NAMING_CONVENTION
+from omop_cdm.intervals import (
+    PYTHON,
+    SQL,
+    TableBuilder,
+    add_days,
+    collapse_events,
+    days_between,
+    merge_events,
+    resolve_method,
+)
+from omop_cdm.util import get_table_class
+
+__all__ = [
+    "CONDITION_ERA_GAP_DAYS",
+    "DOSE_ERA_GAP_DAYS",
+    "DRUG_ERA_GAP_DAYS",
+    "INGREDIENT",
+    "NO_MATCHING_CONCEPT_ID",
+    "PYTHON",
+    "SQL",
+    "add_days",
+    "build_condition_eras",
+    "build_dose_eras",
+    "build_drug_eras",
+    "changed_person_ids",
+    "days_between",
+    "era_state",
+    "metadata",
+    "update_eras",
+]
+
+# Persistence windows of the OHDSI era definitions
+CONDITION_ERA_GAP_DAYS = 30
+DRUG_ERA_GAP_DAYS = 30
+DOSE_ERA_GAP_DAYS = 30
+
+NO_MATCHING_CONCEPT_ID = 0
+INGREDIENT = "Ingredient"
+
+# Fingerprints of the source events of each person at the last era
+# update, see update_eras.
+metadata = MetaData(naming_convention=NAMING_CONVENTION)
+era_state = Table(
+    "era_state",
+    metadata,
+    Column("era_table", String(50), primary_key=True),
+    Column("person_id", Integer, primary_key=True),
+    Column("fingerprint", String(255), nullable=False),
+    schema=CDM_SCHEMA,
+)
+
+
+def build_condition_eras(
+    conn: Connection,
+    base: type[DeclarativeBase],
+    gap_days: int = CONDITION_ERA_GAP_DAYS,
+    method: Optional[str] = None,
+    person_ids: Optional[Iterable[int]] = None,
+    partitions: int = 1,
+) -> int:
+    """
+    Fill condition_era from condition_occurrence.
+
+    Condition occurrences of a person with the same condition_concept_id
+    are combined into one era if they are at most gap_days apart. An
+    occurrence without an end date lasts one day. Occurrences without a
+    mapped concept (condition_concept_id 0) are skipped.
+
+    The existing eras are replaced, either all of them, or only those of
+    the given person_ids. With method SQL the eras are computed by the
+    database, using window functions. With method PYTHON the occurrences
+    are streamed in sorted order and merged in Python. By default, SQL is
+    used on PostgreSQL and PYTHON otherwise.
+
+    The persons are processed in the given number of partitions (by
+    person_id modulo partitions), to limit the size of each statement.
+
+    The changes are made in the transaction of the connection, which is
+    not committed. Returns the number of created eras.
+    """
+    occurrence = get_table_class(base, "condition_occurrence")
+    events = select(
+        occurrence.person_id,
+        occurrence.condition_concept_id,
+        add_days(occurrence.condition_start_date, 0).label("start_date"),
+        func.coalesce(
+            add_days(occurrence.condition_end_date, 0),
+            add_days(occurrence.condition_start_date, 1),
+        ).label("end_date"),
+    ).where(occurrence.condition_concept_id != NO_MATCHING_CONCEPT_ID)
+
+    def collapse(events: Subquery) -> Select:
+        return collapse_events(events, ["condition_concept_id"], gap_days)
+
+    def merge(events: Iterable[tuple]) -> Iterator[tuple]:
+        for key, start, end, count in merge_events(events, gap_days):
+            yield *key, start, end, count
+
+    builder = TableBuilder(
+        get_table_class(base, "condition_era"),
+        [
+            "condition_era_id",
+            "person_id",
+            "condition_concept_id",
+            "condition_era_start_date",
+            "condition_era_end_date",
+            "condition_occurrence_count",
+        ],
+        events,
+        collapse,
+        merge,
+    )
+    return builder.build(conn, resolve_method(conn, method), person_ids, partitions)
+
+
+def build_drug_eras(
+    conn: Connection,
+    base: type[DeclarativeBase],
+    gap_days: int = DRUG_ERA_GAP_DAYS,
+    method: Optional[str] = None,
+    person_ids: Optional[Iterable[int]] = None,
+    partitions: int = 1,
+) -> int:
+    """
+    Fill drug_era from drug_exposure.
+
+    Drug exposures are rolled up to their ingredients via concept_ancestor
+    (standard concepts with concept_class_id "Ingredient"). The end of an
+    exposure is its drug_exposure_end_date, or otherwise the start date
+    plus days_supply, or one day. Overlapping exposures of an ingredient
+    are combined first, after which exposures at most gap_days apart are
+    combined into an era. The gap_days column of an era is the number of
+    days within the era without exposure.
+
+    See build_condition_eras for the other arguments.
+    """
+    exposure = get_table_class(base, "drug_exposure")
+    concept = get_table_class(base, "concept")
+    concept_ancestor = get_table_class(base, "concept_ancestor")
+    events = (
+        select(
+            exposure.person_id,
+            concept.concept_id.label("drug_concept_id"),
+            add_days(exposure.drug_exposure_start_date, 0).label("start_date"),
+            func.coalesce(
+                add_days(exposure.drug_exposure_end_date, 0),
+                add_days(exposure.drug_exposure_start_date, exposure.days_supply),
+                add_days(exposure.drug_exposure_start_date, 1),
+            ).label("end_date"),
+        )
+        .join(
+            concept_ancestor,
+            concept_ancestor.descendant_concept_id == exposure.drug_concept_id,
+        )
+        .join(
+            concept,
+            and_(
+                concept.concept_id == concept_ancestor.ancestor_concept_id,
+                concept.concept_class_id == INGREDIENT,
+                concept.standard_concept == "S",
+            ),
+        )
+        .where(exposure.drug_concept_id != NO_MATCHING_CONCEPT_ID)
+    )
+    keys = ["drug_concept_id"]
+
+    def collapse(events: Subquery) -> Select:
+        exposures = collapse_events(events, keys, 0).subquery()
+        eras = collapse_events(
+            exposures,
+            keys,
+            gap_days,
+            lambda c: [
+                func.sum(c.event_count).label("event_count"),
+                func.sum(days_between(c.start_date, c.end_date)).label("exposed"),
+            ],
+        ).subquery()
+        return select(
+            *(c for c in eras.c if c.key != "exposed"),
+            days_between(eras.c.start_date, eras.c.end_date) - eras.c.exposed,
+        )
+
+    def merge(events: Iterable[tuple]) -> Iterator[tuple]:
+        exposures = (
+            (key, start, end, count, (end - start).days)
+            for key, start, end, count in merge_events(events, 0)
+        )
+        for key, start, end, count, exposed in merge_events(exposures, gap_days):
+            yield *key, start, end, count, (end - start).days - exposed
+
+    builder = TableBuilder(
+        get_table_class(base, "drug_era"),
+        [
+            "drug_era_id",
+            "person_id",
+            "drug_concept_id",
+            "drug_era_start_date",
+            "drug_era_end_date",
+            "drug_exposure_count",
+            "gap_days",
+        ],
+        events,
+        collapse,
+        merge,
+    )
+    return builder.build(conn, resolve_method(conn, method), person_ids, partitions)
+
+
+def build_dose_eras(
+    conn: Connection,
+    base: type[DeclarativeBase],
+    gap_days: int = DOSE_ERA_GAP_DAYS,
+    method: Optional[str] = None,
+    person_ids: Optional[Iterable[int]] = None,
+    partitions: int = 1,
+) -> int:
+    """
+    Fill dose_era from drug_exposure and drug_strength.
+
+    The daily dose of an ingredient in a drug exposure is its strength
+    times quantity divided by days_supply. The strength is the
+    amount_value of drug_strength, or otherwise its numerator_value, with
+    the corresponding unit. Exposures without a quantity, days_supply or
+    valid drug_strength are skipped. Exposures of an ingredient with the
+    same dose and unit are combined into an era if they are at most
+    gap_days apart.
+
+    See build_condition_eras for the other arguments.
+    """
+    exposure = get_table_class(base, "drug_exposure")
+    drug_strength = get_table_class(base, "drug_strength")
+    has_amount = drug_strength.amount_value.is_not(None)
+    strength = case(
+        (has_amount, drug_strength.amount_value), else_=drug_strength.numerator_value
+    )
+    unit_concept_id = case(
+        (has_amount, drug_strength.amount_unit_concept_id),
+        else_=drug_strength.numerator_unit_concept_id,
+    )
+    events = (
+        select(
+            exposure.person_id,
+            drug_strength.ingredient_concept_id.label("drug_concept_id"),
+            unit_concept_id.label("unit_concept_id"),
+            (strength * exposure.quantity / exposure.days_supply).label("dose_value"),
+            add_days(exposure.drug_exposure_start_date, 0).label("start_date"),
+            func.coalesce(
+                add_days(exposure.drug_exposure_end_date, 0),
+                add_days(exposure.drug_exposure_start_date, exposure.days_supply),
+            ).label("end_date"),
+        )
+        .join(drug_strength, drug_strength.drug_concept_id == exposure.drug_concept_id)
+        .where(
+            drug_strength.invalid_reason.is_(None),
+            strength.is_not(None),
+            unit_concept_id.is_not(None),
+            exposure.quantity.is_not(None),
+            exposure.days_supply > 0,
+        )
+    )
+    keys = ["drug_concept_id", "unit_concept_id", "dose_value"]
+
+    def collapse(events: Subquery) -> Select:
+        return collapse_events(events, keys, gap_days, lambda c: [])
+
+    def merge(events: Iterable[tuple]) -> Iterator[tuple]:
+        for key, start, end, _ in merge_events(events, gap_days):
+            yield *key, start, end
+
+    builder = TableBuilder(
+        get_table_class(base, "dose_era"),
+        [
+            "dose_era_id",
+            "person_id",
+            "drug_concept_id",
+            "unit_concept_id",
+            "dose_value",
+            "dose_era_start_date",
+            "dose_era_end_date",
+        ],
+        events,
+        collapse,
+        merge,
+    )
+    return builder.build(conn, resolve_method(conn, method), person_ids, partitions)
+
+
+def update_eras(
+    engine: Engine,
+    base: type[DeclarativeBase],
+    era_table: str,
+    batch_size: int = 1_000,
+    person_ids: Optional[Iterable[int]] = None,
+    **build_options: Any,
+) -> int:
+    """
+    Rebuild the eras of only those persons whose source events changed.
+
+    era_table is condition_era, drug_era or dose_era. The source events
+    (condition_occurrence or drug_exposure) of each person are summarized
+    in a fingerprint, which is stored in the era_state table (created in
+    the CDM schema if needed). Persons whose fingerprint differs from the
+    stored one, including new persons and persons without any events
+    left, get their eras rebuilt and their fingerprint updated. Each batch
+    of batch_size persons is processed in its own transaction.
+
+    The fingerprints are computed and compared by the database, which
+    still aggregates all source events. If the caller already knows
+    which persons changed (e.g. from the batch that was loaded), pass
+    their person_ids to only rebuild, and aggregate the events of, those
+    persons.
+
+    The first run rebuilds the eras of all persons. Changes to the
+    vocabulary (e.g. concept_ancestor) are not tracked, these require a
+    full rebuild with the build function of the era table. The
+    build_options are passed to that function, e.g. gap_days.
+
+    Returns the number of persons whose eras were rebuilt.
+    """
+    build = _ERA_BUILDERS[era_table][1]
+    era_state.create(engine, checkfirst=True)
+    if person_ids is None:
+        with engine.connect() as conn:
+            changed = changed_person_ids(conn, base, era_table)
+    else:
+        changed = sorted(set(person_ids))
+    for i in range(0, len(changed), batch_size):
+        batch = changed[i : i + batch_size]
+        with engine.begin() as conn:
+            build(conn, base, person_ids=batch, **build_options)
+            conn.execute(
+                delete(era_state).where(
+                    era_state.c.era_table == era_table,
+                    era_state.c.person_id.in_(batch),
+                )
+            )
+            fingerprints = _fingerprints(conn.dialect, base, era_table, batch)
+            fingerprints = fingerprints.subquery()
+            conn.execute(
+                insert(era_state).from_select(
+                    ["era_table", "person_id", "fingerprint"],
+                    select(
+                        literal(era_table, String),
+                        fingerprints.c.person_id,
+                        fingerprints.c.fingerprint,
+                    ),
+                )
+            )
+    return len(changed)
+
+
+def changed_person_ids(
+    conn: Connection, base: type[DeclarativeBase], era_table: str
+) -> list[int]:
+    """
+    Return the persons whose source events of an era table have changed.
+
+    See update_eras. On PostgreSQL, the fingerprint of a person is an MD5
+    hash of the id, concept_id, dates and other columns used to build the
+    eras of all their events, so any change to these is detected. Other
+    databases use the number of events, and the sums (and for dates also
+    the maximum) of these columns, which miss changes that cancel out,
+    such as swapping the concepts of two events of a person.
+    """
+    current = _fingerprints(conn.dialect, base, era_table).cte("fingerprints")
+    state = select(era_state).where(era_state.c.era_table == era_table).cte("stored")
+    new_or_changed = (
+        select(current.c.person_id)
+        .outerjoin(state, state.c.person_id == current.c.person_id)
+        .where(
+            or_(
+                state.c.fingerprint.is_(None),
+                state.c.fingerprint != current.c.fingerprint,
+            )
+        )
+    )
+    without_events = (
+        select(state.c.person_id)
+        .outerjoin(current, current.c.person_id == state.c.person_id)
+        .where(current.c.person_id.is_(None))
+    )
+    return sorted(conn.scalars(union(new_or_changed, without_events)))
+
+
+def _fingerprints(
+    dialect: Dialect,
+    base: type[DeclarativeBase],
+    era_table: str,
+    person_ids: Optional[Sequence[int]] = None,
+) -> Select:
+    """Select the fingerprint of the source events of each person."""
+    source_table = _ERA_BUILDERS[era_table][0]
+    source = get_table_class(base, source_table)
+    columns = [getattr(source, name) for name in _TRACKED_COLUMNS[source_table]]
+    if dialect.name == "postgresql":
+        # The text of all events, in order of their id (the first column)
+        event = func.concat_ws(
+            "|", *(func.coalesce(cast(column, Text), "") for column in columns)
+        )
+        fingerprint = func.md5(
+            func.string_agg(event, aggregate_order_by(",", columns[0]))
+        )
+    else:
+        epoch = literal(datetime.date(1970, 1, 1), Date)
+        aggregates = [func.count()]
+        for column in columns:
+            if isinstance(column.type, (Date, DateTime)):
+                column = days_between(epoch, column)
+                aggregates.append(func.coalesce(func.max(column), 0))
+            aggregates.append(func.coalesce(func.sum(column), 0))
+        fingerprint = cast(aggregates[0], String)
+        for aggregate in aggregates[1:]:
+            fingerprint = fingerprint + "|" + cast(aggregate, String)
+    statement = select(source.person_id, fingerprint.label("fingerprint"))
+    if person_ids is not None:
+        statement = statement.where(source.person_id.in_(person_ids))
+    return statement.group_by(source.person_id)
+
+
+# Source table and build function of each era table
+_ERA_BUILDERS = {
+    "condition_era": ("condition_occurrence", build_condition_eras),
+    "drug_era": ("drug_exposure", build_drug_eras),
+    "dose_era": ("drug_exposure", build_dose_eras),
+}
+# Columns of the source tables that are used to build the eras
+_TRACKED_COLUMNS = {
+    "condition_occurrence": [
+        "condition_occurrence_id",
+        "condition_concept_id",
+        "condition_start_date",
+        "condition_end_date",
+    ],
+    "drug_exposure": [
+        "drug_exposure_id",
+        "drug_concept_id",
+        "drug_exposure_start_date",
+        "drug_exposure_end_date",
+        "quantity",
+        "days_supply",
+    ],
+}
@@ -0,0 +1,300 @@
+"""Per-table metrics of the SQL statements executed by an engine."""
+
+import re
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from collections.abc import Iterable, Sequence
+from typing import Any, Optional, Union
+
+from sqlalchemy import Engine, Index, Table, TextClause, event
+from sqlalchemy.engine import Compiled, Connection, ExecutionContext
+from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.sql import visitors
+from sqlalchemy.sql.ddl import ExecutableDDLElement
+
+from omop_cdm.constants import CDM_SCHEMA, VOCAB_SCHEMA
+
+# Upper bounds of the histogram buckets, as in Prometheus. Values above
+# the last bound are counted in the +Inf bucket.
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)
+ROW_BUCKETS = (1, 10, 100, 1_000, 10_000, 100_000, 1_000_000)
+
+# Table label of statements that don't refer to any CDM table
+OTHER = "other"
+
+_SCHEMAS = (CDM_SCHEMA, VOCAB_SCHEMA)
+_OPERATIONS = {"select", "insert", "update", "delete"}
+_START_KEY = "omop_cdm_statement_start"
+
+
+class Histogram:
+    """Counts of observed values per bucket, with their sum."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum: float = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        """Return the (upper bound, cumulative count) of each bucket."""
+        bounds = [_format_number(bound) for bound in self.buckets] + ["+Inf"]
+        totals = []
+        total = 0
+        for count in self.counts:
+            total += count
+            totals.append(total)
+        return list(zip(bounds, totals))
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "buckets": dict(self.cumulative()),
+        }
+
+
+class QueryMetrics:
+    """
+    Latency, rows and number of SQL statements per CDM table and operation.
+
+    Attach the metrics to one or more engines to record every statement
+    they execute. A statement is attributed to each CDM table it refers
+    to, so a join of person and condition_occurrence is counted for both
+    tables. CDM tables are recognized by their placeholder schema
+    (CDM_SCHEMA or VOCAB_SCHEMA). Textual SQL is matched against the
+    table names of the optional Base; statements without CDM tables are
+    counted under OTHER.
+
+    The operation is "select", "insert", "update", "delete" or "ddl", or
+    OTHER for textual SQL starting with another keyword (e.g. VACUUM).
+    COPY statements are not recorded: these run directly on the DBAPI
+    cursor (see omop_cdm.util.copy_to_stdout), bypassing the events of
+    the engine. The number of rows is the rowcount of the DBAPI cursor,
+    which is only available for DML on most drivers, and also for queries
+    on psycopg.
+    """
+
+    def __init__(
+        self,
+        base: Optional[type[DeclarativeBase]] = None,
+        latency_buckets: Sequence[float] = LATENCY_BUCKETS,
+        row_buckets: Sequence[float] = ROW_BUCKETS,
+    ):
+        self.latency_buckets = latency_buckets
+        self.row_buckets = row_buckets
+        self._latency: dict[tuple[str, str], Histogram] = {}
+        self._rows: dict[tuple[str, str], Histogram] = {}
+        self._lock = threading.Lock()
+        self._compiled_tables: weakref.WeakKeyDictionary[Compiled, tuple[str, ...]]
+        self._compiled_tables = weakref.WeakKeyDictionary()
+        self._text_tables: dict[str, tuple[str, ...]] = {}
+        self._pattern: Optional[re.Pattern] = None
+        if base is not None:
+            names = sorted(
+                {t.name for t in base.metadata.tables.values() if t.schema in _SCHEMAS}
+            )
+            self._pattern = re.compile(
+                r"\b(" + "|".join(map(re.escape, names)) + r")\b", re.IGNORECASE
+            )
+
+    def attach(self, engine: Engine) -> "QueryMetrics":
+        """Record the statements executed by the engine."""
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(engine, "handle_error", self._handle_error)
+        return self
+
+    def detach(self, engine: Engine) -> None:
+        """Stop recording the statements executed by the engine."""
+        event.remove(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.remove(engine, "after_cursor_execute", self._after_cursor_execute)
+        event.remove(engine, "handle_error", self._handle_error)
+
+    def observe(
+        self,
+        tables: Iterable[str],
+        operation: str,
+        duration: float,
+        rows: Optional[int] = None,
+    ) -> None:
+        """Record a statement on the given tables."""
+        with self._lock:
+            for table in tables:
+                key = (table, operation)
+                latency = self._latency.get(key)
+                if latency is None:
+                    latency = self._latency[key] = Histogram(self.latency_buckets)
+                    self._rows[key] = Histogram(self.row_buckets)
+                latency.observe(duration)
+                if rows is not None:
+                    self._rows[key].observe(rows)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._latency.clear()
+            self._rows.clear()
+
+    def as_dict(self) -> dict[str, dict[str, dict[str, Any]]]:
+        """
+        Return the metrics by table and operation.
+
+        For example: {"person": {"select": {"statements": 2, "latency":
+        {...}, "rows": {...}}}}, with the histograms as returned by
+        Histogram.as_dict.
+        """
+        metrics: dict[str, dict[str, dict[str, Any]]] = {}
+        with self._lock:
+            for (table, operation), latency in sorted(self._latency.items()):
+                metrics.setdefault(table, {})[operation] = {
+                    "statements": latency.count,
+                    "latency": latency.as_dict(),
+                    "rows": self._rows[table, operation].as_dict(),
+                }
+        return metrics
+
+    def to_prometheus(self, prefix: str = "omop_cdm") -> str:
+        """Return the metrics in the Prometheus text exposition format."""
+        with self._lock:
+            keys = sorted(self._latency)
+            statements = [
+                f"{prefix}_statements_total{_labels(key)} {self._latency[key].count}"
+                for key in keys
+            ]
+            lines = [
+                f"# HELP {prefix}_statements_total SQL statements per CDM table.",
+                f"# TYPE {prefix}_statements_total counter",
+                *statements,
+            ]
+            for name, help_text, histograms in (
+                (
+                    "statement_duration_seconds",
+                    "Latency of SQL statements per CDM table.",
+                    self._latency,
+                ),
+                ("statement_rows", "Rows of SQL statements per CDM table.", self._rows),
+            ):
+                metric = f"{prefix}_{name}"
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} histogram")
+                for key in keys:
+                    histogram = histograms[key]
+                    for bound, count in histogram.cumulative():
+                        labels = _labels(key, le=bound)
+                        lines.append(f"{metric}_bucket{labels} {count}")
+                    labels = _labels(key)
+                    lines.append(
+                        f"{metric}_sum{labels} {_format_number(histogram.sum)}"
+                    )
+                    lines.append(f"{metric}_count{labels} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def _tables(self, statement: str, context: ExecutionContext) -> tuple[str, ...]:
+        compiled = context.compiled
+        if compiled is not None and not isinstance(compiled.statement, TextClause):
+            tables = self._compiled_tables.get(compiled)
+            if tables is None:
+                tables = self._compiled_tables[compiled] = _compiled_tables(compiled)
+            return tables
+        if self._pattern is None:
+            return (OTHER,)
+        tables = self._text_tables.get(statement)
+        if tables is None:
+            names = {match.lower() for match in self._pattern.findall(statement)}
+            tables = tuple(sorted(names)) or (OTHER,)
+            # Don't keep an unbounded number of statements with literal values
+            if len(self._text_tables) < 10_000:
+                self._text_tables[statement] = tables
+        return tables
+
+    def _before_cursor_execute(
+        self, conn: Connection, cursor, statement, parameters, context, executemany
+    ) -> None:
+        conn.info.setdefault(_START_KEY, []).append(time.perf_counter())
+
+    def _after_cursor_execute(
+        self,
+        conn: Connection,
+        cursor,
+        statement: str,
+        parameters,
+        context: ExecutionContext,
+        executemany: bool,
+    ) -> None:
+        duration = time.perf_counter() - conn.info[_START_KEY].pop()
+        rowcount = cursor.rowcount
+        self.observe(
+            self._tables(statement, context),
+            _operation(statement, context),
+            duration,
+            rowcount if rowcount is not None and rowcount >= 0 else None,
+        )
+
+    def _handle_error(self, exception_context) -> None:
+        conn = exception_context.connection
+        if conn is not None and conn.info.get(_START_KEY):
+            conn.info[_START_KEY].pop()
+
+
+def instrument(
+    engine: Engine, base: Optional[type[DeclarativeBase]] = None
+) -> QueryMetrics:
+    """Return new QueryMetrics attached to the engine."""
+    return QueryMetrics(base).attach(engine)
+
+
+def _compiled_tables(compiled: Compiled) -> tuple[str, ...]:
+    """Return the names of the CDM tables a compiled statement refers to."""
+    # ORM statements are converted into Core statements during compilation,
+    # e.g. relationship joins are only resolved in the latter
+    compile_state = getattr(compiled, "compile_state", None)
+    statement = compiled.statement
+    if compile_state is not None:
+        statement = compile_state.statement
+    if isinstance(statement, ExecutableDDLElement):
+        element = statement.element
+        candidates: Iterable[Any] = [
+            element.table if isinstance(element, Index) else element
+        ]
+    else:
+        candidates = visitors.iterate(statement)
+    names = {
+        element.name
+        for element in candidates
+        if isinstance(element, Table) and element.schema in _SCHEMAS
+    }
+    return tuple(sorted(names)) or (OTHER,)
+
+
+def _operation(statement: str, context: ExecutionContext) -> str:
+    if context.isddl:
+        return "ddl"
+    if context.isinsert:
+        return "insert"
+    if context.isupdate:
+        return "update"
+    if context.isdelete:
+        return "delete"
+    keyword = statement.lstrip().split(None, 1)[0].lower() if statement else ""
+    if keyword == "with":
+        return "select"
+    return keyword if keyword in _OPERATIONS else OTHER
+
+
+def _labels(key: tuple[str, str], le: Optional[str] = None) -> str:
+    table, operation = key
+    labels = f'table="{table}",operation="{operation}"'
+    if le is not None:
+        labels += f',le="{le}"'
+    return "{" + labels + "}"
+
+
+def _format_number(value: Union[int, float]) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
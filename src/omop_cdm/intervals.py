@@ -0,0 +1,302 @@
+"""
+Merge the events of each person into intervals, e.g. eras or periods.
+
+These are the building blocks of omop_cdm.eras and
+omop_cdm.observation_periods: events that start at most a number of days
+after the end of the previous events are merged ("gaps and islands"),
+either in SQL with window functions, or in Python over sorted events.
+"""
+
+import datetime
+from collections.abc import Iterable, Iterator, Sequence
+from dataclasses import dataclass
+from itertools import islice
+from typing import Any, Callable, Optional
+
+from sqlalchemy import (
+    Connection,
+    DateTime,
+    Integer,
+    Select,
+    Subquery,
+    bindparam,
+    case,
+    delete,
+    func,
+    insert,
+    select,
+)
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.compiler import SQLCompiler
+from sqlalchemy.sql.functions import FunctionElement
+
+# Build methods: a single INSERT ... SELECT statement executed by the
+# database, or merging the events in Python.
+SQL = "sql"
+PYTHON = "python"
+
+INSERT_BATCH_SIZE = 10_000
+
+
+class add_days(FunctionElement):
+    """
+    SQL expression adding a number of days to a date or timestamp.
+
+    The result is always a timestamp, so add_days(column, 0) can be used
+    to compare date and timestamp columns.
+    """
+
+    type = DateTime()
+    name = "add_days"
+    inherit_cache = True
+
+
+class days_between(FunctionElement):
+    """SQL expression for the number of whole days from a start to an end."""
+
+    type = Integer()
+    name = "days_between"
+    inherit_cache = True
+
+
+@compiles(add_days)
+def _compile_add_days(element: add_days, compiler: SQLCompiler, **kw: Any) -> str:
+    value, days = (compiler.process(arg, **kw) for arg in element.clauses)
+    return f"CAST({value} AS TIMESTAMP) + {days} * INTERVAL '1' DAY"
+
+
+@compiles(add_days, "postgresql")
+def _compile_add_days_postgresql(
+    element: add_days, compiler: SQLCompiler, **kw: Any
+) -> str:
+    value, days = (compiler.process(arg, **kw) for arg in element.clauses)
+    return f"CAST({value} AS TIMESTAMP) + make_interval(days => {days})"
+
+
+@compiles(add_days, "sqlite")
+def _compile_add_days_sqlite(
+    element: add_days, compiler: SQLCompiler, **kw: Any
+) -> str:
+    value, days = (compiler.process(arg, **kw) for arg in element.clauses)
+    return f"datetime({value}, ({days}) || ' days')"
+
+
+@compiles(days_between)
+def _compile_days_between(
+    element: days_between, compiler: SQLCompiler, **kw: Any
+) -> str:
+    start, end = (compiler.process(arg, **kw) for arg in element.clauses)
+    return (
+        f"CAST(EXTRACT(DAY FROM (CAST({end} AS TIMESTAMP) - "
+        f"CAST({start} AS TIMESTAMP))) AS INTEGER)"
+    )
+
+
+@compiles(days_between, "sqlite")
+def _compile_days_between_sqlite(
+    element: days_between, compiler: SQLCompiler, **kw: Any
+) -> str:
+    start, end = (compiler.process(arg, **kw) for arg in element.clauses)
+    return f"CAST(round(julianday({end}) - julianday({start})) AS INTEGER)"
+
+
+def resolve_method(conn: Connection, method: Optional[str]) -> str:
+    """Return the build method, by default SQL on PostgreSQL, else PYTHON."""
+    if method is None:
+        return SQL if conn.dialect.name == "postgresql" else PYTHON
+    if method not in (SQL, PYTHON):
+        raise ValueError(f"Unknown method {method!r}, expected {SQL} or {PYTHON}")
+    return method
+
+
+@dataclass(frozen=True)
+class TableBuilder:
+    """
+    Replaces the rows of a derived table (e.g. an era table) per person.
+
+    The events select the person_id, the keys of a row, and the start and
+    end date of each event. With method SQL, collapse turns these into a
+    Select of the new rows. With method PYTHON, merge turns sorted
+    ((person_id, *keys), start, end, 1) events into new rows. In both
+    cases, the new rows have the columns following the id column.
+    """
+
+    table_class: type[Any]
+    columns: list[str]
+    events: Select
+    collapse: Callable[[Subquery], Select]
+    merge: Callable[[Iterable[tuple]], Iterator[tuple]]
+
+    def build(
+        self,
+        conn: Connection,
+        method: str,
+        person_ids: Optional[Iterable[int]],
+        partitions: int,
+    ) -> int:
+        """Replace the rows of (a subset of) all persons, one partition at a time."""
+        return sum(
+            self.build_partition(conn, method, person_ids, partitions, partition)
+            for partition in range(partitions)
+        )
+
+    def build_partition(
+        self,
+        conn: Connection,
+        method: str,
+        person_ids: Optional[Iterable[int]],
+        partitions: int,
+        partition: int,
+        first_id: Optional[int] = None,
+    ) -> int:
+        """
+        Replace the rows of the persons with person_id % partitions == partition.
+
+        If first_id is given, the new rows get ids first_id + i * partitions
+        + partition, so that partitions can be built at the same time.
+        Otherwise the rows are numbered after the highest existing id.
+        """
+        events = self.events
+        old_rows = delete(self.table_class)
+        event_person_id = events.selected_columns[0]
+        if person_ids is not None:
+            person_ids = sorted(set(person_ids))
+            events = events.where(event_person_id.in_(person_ids))
+            old_rows = old_rows.where(self.table_class.person_id.in_(person_ids))
+        if partitions > 1:
+            events = events.where(event_person_id % partitions == partition)
+            old_rows = old_rows.where(
+                self.table_class.person_id % partitions == partition
+            )
+        conn.execute(old_rows)
+
+        id_step = 1
+        if first_id is None:
+            first_id = next_id(conn, self.table_class, self.columns[0])
+        else:
+            first_id, id_step = first_id + partition, partitions
+        if method == SQL:
+            new_rows = self.collapse(events.subquery())
+            return _insert_from_select(
+                conn, self.table_class, self.columns, new_rows, first_id, id_step
+            )
+        new_rows = self.merge(_stream_events(conn, events))
+        return _insert_rows(
+            conn, self.table_class, self.columns, new_rows, first_id, id_step
+        )
+
+
+def collapse_events(
+    events: Subquery,
+    keys: Sequence[str],
+    gap_days: int,
+    aggregates: Optional[Callable[[Any], list]] = None,
+) -> Select:
+    """
+    Select the eras of events, as (person_id, *keys, start, end, *aggregates).
+
+    An event starts a new era if it starts more than gap_days after the
+    end of all earlier events with the same person_id and keys. The
+    eras are numbered with a running sum over these era starts. By
+    default, the only aggregate is the number of events as event_count.
+    """
+    partition_by = [events.c.person_id, *(events.c[k] for k in keys)]
+    order_by = [events.c.start_date, events.c.end_date]
+    previous_end = func.max(add_days(events.c.end_date, gap_days)).over(
+        partition_by=partition_by, order_by=order_by, rows=(None, -1)
+    )
+    marked = select(
+        events,
+        case((events.c.start_date <= previous_end, 0), else_=1).label("is_start"),
+    ).subquery()
+
+    era_number = func.sum(marked.c.is_start).over(
+        partition_by=[marked.c.person_id, *(marked.c[k] for k in keys)],
+        order_by=[marked.c.start_date, marked.c.end_date],
+        rows=(None, 0),
+    )
+    numbered = select(marked, era_number.label("era_number")).subquery()
+    group_by = [numbered.c.person_id, *(numbered.c[k] for k in keys)]
+    if aggregates is None:
+        aggregates = lambda c: [func.count().label("event_count")]  # noqa: E731
+    return select(
+        *group_by,
+        func.min(numbered.c.start_date).label("start_date"),
+        func.max(numbered.c.end_date).label("end_date"),
+        *aggregates(numbered.c),
+    ).group_by(*group_by, numbered.c.era_number)
+
+
+def _stream_events(conn: Connection, events: Select) -> Iterator[tuple]:
+    """Stream sorted events as ((person_id, *keys), start, end, 1)."""
+    statement = events.order_by(*events.selected_columns)
+    rows = conn.execute(statement.execution_options(yield_per=INSERT_BATCH_SIZE))
+    for *key, start, end in rows:
+        yield tuple(key), start, end, 1
+
+
+def merge_events(events: Iterable[tuple], gap_days: int) -> Iterator[tuple]:
+    """
+    Merge sorted (key, start, end, *values) events that are gap_days apart.
+
+    The values of merged events are summed. Only the current era is kept
+    in memory.
+    """
+    gap = datetime.timedelta(days=gap_days)
+    current: Optional[list[Any]] = None
+    for key, start, end, *values in events:
+        if current is not None and key == current[0] and start <= current[2] + gap:
+            current[2] = max(current[2], end)
+            current[3:] = [a + b for a, b in zip(current[3:], values)]
+            continue
+        if current is not None:
+            yield tuple(current)
+        current = [key, start, end, *values]
+    if current is not None:
+        yield tuple(current)
+
+
+def next_id(conn: Connection, table_class: type[Any], id_column: str) -> int:
+    """Return the id following the highest id of a table."""
+    max_id = conn.scalar(select(func.max(getattr(table_class, id_column))))
+    return (max_id or 0) + 1
+
+
+def _insert_from_select(
+    conn: Connection,
+    table_class: type[Any],
+    columns: list[str],
+    rows: Select,
+    first_id: int,
+    id_step: int = 1,
+) -> int:
+    # The ids of derived tables are not generated by the database
+    rows = rows.subquery()
+    row_number = func.row_number().over(order_by=list(rows.c))
+    new_id = (row_number - 1) * bindparam("id_step", id_step, Integer) + bindparam(
+        "first_id", first_id, Integer
+    )
+    statement = insert(table_class).from_select(columns, select(new_id, *rows.c))
+    return conn.execute(statement).rowcount
+
+
+def _insert_rows(
+    conn: Connection,
+    table_class: type[Any],
+    columns: list[str],
+    rows: Iterable[tuple[Any, ...]],
+    first_id: int,
+    id_step: int = 1,
+) -> int:
+    rows = iter(rows)
+    count = 0
+    while batch := list(islice(rows, INSERT_BATCH_SIZE)):
+        conn.execute(
+            insert(table_class),
+            [
+                dict(zip(columns, (first_id + (count + i) * id_step, *row)))
+                for i, row in enumerate(batch)
+            ],
+        )
+        count += len(batch)
+    return count
@@ -0,0 +1,32 @@
+"""Lazy module attributes (PEP 562), to keep importing packages cheap."""
+
+import importlib
+from collections.abc import Iterable
+from typing import Any, Callable
+
+
+def lazy_attributes(
+    module_globals: dict[str, Any], source: str, names: Iterable[str]
+) -> tuple[Callable[[str], Any], Callable[[], list[str]]]:
+    """
+    Return the __getattr__ and __dir__ functions of a package with lazy attributes.
+
+    The given names are imported from the source module when one of them
+    is first accessed, e.g. omop_cdm.regular.cdm54.Person imports
+    omop_cdm.regular.cdm54.tables. After that, all names are regular
+    attributes of the package.
+    """
+    names = frozenset(names)
+    module_name = module_globals["__name__"]
+
+    def __getattr__(name: str) -> Any:
+        if name not in names:
+            raise AttributeError(f"module {module_name!r} has no attribute {name!r}")
+        module = importlib.import_module(source)
+        module_globals.update((n, getattr(module, n)) for n in names)
+        return module_globals[name]
+
+    def __dir__() -> list[str]:
+        return sorted(names.union(module_globals))
+
+    return __getattr__, __dir__
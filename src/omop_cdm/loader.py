@@ -0,0 +1,155 @@
+"""Load CDM tables in the order of their foreign key dependencies."""
+
+import logging
+import time
+from collections.abc import Iterable, Mapping
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from itertools import islice
+from typing import Any, Callable, Union
+
+from sqlalchemy import Connection, Engine, ForeignKeyConstraint, MetaData, Table, insert
+from sqlalchemy.schema import sort_tables_and_constraints
+
+logger = logging.getLogger(__name__)
+
+# A table is loaded either from an iterable of rows (mappings of column
+# name to value), or by a function that loads the table itself (e.g. via
+# COPY) and returns the number of loaded rows.
+RowSource = Iterable[Mapping[str, Any]]
+LoadFunction = Callable[[Connection, Table], int]
+TableSource = Union[RowSource, LoadFunction]
+
+
+@dataclass(frozen=True)
+class LoadPlan:
+    """
+    Order in which tables can be loaded without violating foreign keys.
+
+    The tables of each level only refer to tables of earlier levels, so
+    the tables within a level can be loaded at the same time. Foreign
+    keys that cannot be satisfied by any load order (self-references,
+    such as relationship.reverse_relationship_id, and cycles, such as
+    concept <-> domain) are listed separately. These should be absent
+    during the load, and added once all data is present.
+    """
+
+    levels: list[list[Table]]
+    deferred_foreign_keys: list[ForeignKeyConstraint]
+
+
+def plan_load_order(tables: Iterable[Table]) -> LoadPlan:
+    """
+    Sort tables topologically by their foreign keys.
+
+    Foreign keys to tables outside of the provided tables are ignored,
+    as these are assumed to be loaded already.
+    """
+    tables = sorted(tables, key=lambda t: t.fullname)
+    table_set = set(tables)
+    fks = [
+        fk
+        for table in tables
+        for fk in sorted(
+            table.foreign_key_constraints, key=lambda fk: tuple(fk.column_keys)
+        )
+        if fk.referred_table in table_set
+    ]
+    # The last entry returned by SQLAlchemy contains all foreign keys that
+    # are part of a cycle, without a table.
+    cyclic = {
+        fk
+        for table, table_fks in sort_tables_and_constraints(tables)
+        if table is None
+        for fk in table_fks
+    }
+
+    # Only defer as few foreign keys of a cycle as needed to break it
+    dependencies: dict[Table, set[Table]] = {t: set() for t in tables}
+    deferred = []
+    for fk in sorted(fks, key=lambda fk: fk in cyclic):
+        table, referred = fk.table, fk.referred_table
+        if table is referred or (
+            fk in cyclic and _depends_on(referred, table, dependencies)
+        ):
+            deferred.append(fk)
+        else:
+            dependencies[table].add(referred)
+
+    levels = []
+    loaded: set[Table] = set()
+    while len(loaded) < len(tables):
+        level = [t for t in tables if t not in loaded and dependencies[t] <= loaded]
+        levels.append(level)
+        loaded.update(level)
+    return LoadPlan(levels=levels, deferred_foreign_keys=deferred)
+
+
+def load_tables(
+    engine: Engine,
+    metadata: MetaData,
+    sources: Mapping[str, TableSource],
+    workers: int = 4,
+    chunk_size: int = 10_000,
+) -> dict[str, int]:
+    """
+    Load data into multiple tables, in order of their dependencies.
+
+    The sources are provided per table name (e.g. "person"). Tables that
+    don't depend on each other are loaded in parallel, each on its own
+    connection and in its own transaction. The foreign keys listed in
+    plan_load_order(...).deferred_foreign_keys must not exist yet, e.g.
+    by creating the tables with omop_cdm.ddl.create_all_deferred.
+
+    Returns the number of loaded rows per table.
+    """
+    tables_by_name = {t.name: t for t in metadata.tables.values()}
+    unknown = set(sources) - set(tables_by_name)
+    if unknown:
+        raise ValueError(f"Unknown tables: {sorted(unknown)}")
+    plan = plan_load_order(tables_by_name[name] for name in sources)
+
+    row_counts = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for level in plan.levels:
+            futures = {
+                t.name: executor.submit(
+                    _load_table, engine, t, sources[t.name], chunk_size
+                )
+                for t in level
+            }
+            # Wait for the whole level to finish before loading dependent tables
+            row_counts.update({name: f.result() for name, f in futures.items()})
+    return row_counts
+
+
+def _depends_on(
+    table: Table, other: Table, dependencies: dict[Table, set[Table]]
+) -> bool:
+    stack, seen = [table], set()
+    while stack:
+        current = stack.pop()
+        if current is other:
+            return True
+        seen.add(current)
+        stack.extend(dependencies[current] - seen)
+    return False
+
+
+def _load_table(
+    engine: Engine, table: Table, source: TableSource, chunk_size: int
+) -> int:
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        if callable(source):
+            rows = source(conn, table)
+        else:
+            rows = 0
+            iterator = iter(source)
+            while chunk := list(islice(iterator, chunk_size)):
+                conn.execute(insert(table), chunk)
+                rows += len(chunk)
+    logger.info(
+        "Loaded %d rows into %s in %.1fs", rows, table.name, time.perf_counter() - start
+    )
+    return rows
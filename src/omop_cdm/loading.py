@@ -0,0 +1,200 @@
+"""Default loader strategies for all relationships of a CDM model."""
+
+import weakref
+from dataclasses import dataclass
+from typing import Any, Union
+
+from sqlalchemy import event
+from sqlalchemy.orm import (
+    DeclarativeBase,
+    Load,
+    Mapper,
+    ORMExecuteState,
+    RelationshipProperty,
+    Session,
+    registry,
+)
+from sqlalchemy.orm.interfaces import MANYTOONE
+
+ANALYTICS = "analytics"
+API = "api"
+ETL = "etl"
+
+# Execution option to disable the loading profile for a statement
+LOADING_PROFILE_OPTION = "omop_cdm_loading_profile"
+
+# Loader option (a method of Load) per strategy name, the lazy argument
+# of relationship
+_LOADERS: dict[str, tuple[str, dict[str, Any]]] = {
+    "select": ("lazyload", {}),
+    "joined": ("joinedload", {}),
+    "selectin": ("selectinload", {}),
+    "subquery": ("subqueryload", {}),
+    "immediate": ("immediateload", {}),
+    "noload": ("noload", {}),
+    "raise": ("raiseload", {}),
+    "raise_on_sql": ("raiseload", {"sql_only": True}),
+}
+# Strategies that don't load the related objects
+_NOT_LOADING = {"noload", "raise", "raise_on_sql"}
+
+
+@dataclass(frozen=True)
+class LoadingProfile:
+    """
+    Loader strategies (the lazy argument of relationship) per kind of relationship.
+
+    concepts are the many-to-one relationships to the concept table (e.g.
+    condition_concept), references are all other many-to-one relationships
+    (e.g. person, visit_occurrence, provider) and collections are the
+    one-to-many relationships (e.g. Person.measurements).
+    """
+
+    concepts: str
+    references: str
+    collections: str
+
+    def __post_init__(self):
+        for strategy in (self.concepts, self.references, self.collections):
+            if strategy not in _LOADERS:
+                raise ValueError(
+                    f"Unknown loader strategy {strategy}, "
+                    f"choose from {', '.join(_LOADERS)}"
+                )
+
+
+LOADING_PROFILES = {
+    # Bulk reads: concepts of all loaded records are retrieved with one
+    # SELECT ... IN per relationship, everything else has to be loaded
+    # explicitly.
+    ANALYTICS: LoadingProfile("selectin", "raise_on_sql", "raise_on_sql"),
+    # Small result sets: concepts are joined in the same query.
+    API: LoadingProfile("joined", "raise_on_sql", "raise_on_sql"),
+    # Writing data: nothing is loaded implicitly.
+    ETL: LoadingProfile("raise_on_sql", "raise_on_sql", "raise_on_sql"),
+}
+
+# Applied profile and loader options per mapper, by registry of a Base
+_profiles: weakref.WeakKeyDictionary[registry, LoadingProfile]
+_profiles = weakref.WeakKeyDictionary()
+_options: weakref.WeakKeyDictionary[Mapper, list[Load]]
+_options = weakref.WeakKeyDictionary()
+
+
+def apply_loading_profile(
+    base: type[DeclarativeBase], profile: Union[str, LoadingProfile, None]
+) -> None:
+    """
+    Set the default loader strategy of all relationships of a Base.
+
+    The profile is the name of one of the LOADING_PROFILES ("analytics",
+    "api" or "etl"), a custom LoadingProfile, or None to remove the
+    profile. With the raise and raise_on_sql strategies, accessing a
+    relationship that has not been loaded raises an InvalidRequestError
+    instead of emitting a lazy SELECT, so N+1 query patterns are found
+    during development.
+
+    The profile is applied as loader options to every ORM query of a
+    Session on the mapped classes of the Base (including the queries
+    that load relationships), so it can be applied at any time, and
+    doesn't affect other Bases. Options of a query for the relationships
+    that have the strategy of the references take precedence, e.g.
+    select(Person).options(selectinload(Person.measurements)). An option
+    for a concept relationship with another strategy than the profile
+    conflicts with it, so disable the profile for such a query with
+    execution_options(omop_cdm_loading_profile=False).
+    """
+    if isinstance(profile, str):
+        if profile not in LOADING_PROFILES:
+            raise ValueError(
+                f"Unknown loading profile {profile}, "
+                f"choose from {', '.join(LOADING_PROFILES)}"
+            )
+        profile = LOADING_PROFILES[profile]
+    if not event.contains(Session, "do_orm_execute", _add_profile_options):
+        event.listen(Session, "do_orm_execute", _add_profile_options)
+    if profile is None:
+        _profiles.pop(base.registry, None)
+    else:
+        _profiles[base.registry] = profile
+    for mapper in base.registry.mappers:
+        _options.pop(mapper, None)
+
+
+def loading_strategies(base: type[DeclarativeBase]) -> dict[str, str]:
+    """
+    Return the loader strategy of each relationship, by name.
+
+    These are the strategies of the loading profile of the Base, or the
+    lazy argument of each relationship if no profile is applied.
+    """
+    base.registry.configure()
+    profile = _profiles.get(base.registry)
+    return {
+        str(relationship): relationship.lazy
+        if profile is None
+        else _strategy(relationship, profile)
+        for mapper in base.registry.mappers
+        for relationship in mapper.relationships
+    }
+
+
+def _add_profile_options(state: ORMExecuteState) -> None:
+    if not state.is_select or state.is_column_load:
+        return
+    if state.execution_options.get(LOADING_PROFILE_OPTION) is False:
+        return
+    options = []
+    for mapper in state.all_mappers:
+        profile = _profiles.get(mapper.registry)
+        if profile is None:
+            continue
+        mapper_options = _options.get(mapper)
+        if mapper_options is None:
+            mapper_options = _profile_options(Load(mapper), mapper, profile)
+            _options[mapper] = mapper_options
+        options.extend(mapper_options)
+    if options:
+        state.statement = state.statement.options(*options)
+
+
+def _profile_options(
+    path: Load,
+    mapper: Mapper,
+    profile: LoadingProfile,
+    parents: frozenset[Mapper] = frozenset(),
+) -> list[Load]:
+    """
+    Return the loader options of the relationships of a mapper on a path.
+
+    The strategy of the references is set with a wildcard, which
+    explicit options of a query override. Objects loaded via the other
+    relationships get the options of their path, so the options of their
+    mapper are added for that path (up to the first mapper that is
+    already on the path).
+    """
+    options = [_load(path, profile.references, "*")]
+    parents = parents | {mapper}
+    for relationship in mapper.relationships:
+        strategy = _strategy(relationship, profile)
+        if strategy == profile.references:
+            continue
+        option = _load(path, strategy, relationship.class_attribute)
+        options.append(option)
+        target = relationship.mapper
+        if strategy not in _NOT_LOADING and target not in parents:
+            options.extend(_profile_options(option, target, profile, parents))
+    return options
+
+
+def _load(path: Load, strategy: str, attribute: Any) -> Load:
+    method, kwargs = _LOADERS[strategy]
+    return getattr(path, method)(attribute, **kwargs)
+
+
+def _strategy(relationship: RelationshipProperty, profile: LoadingProfile) -> str:
+    if relationship.direction is not MANYTOONE:
+        return profile.collections
+    if relationship.mapper.local_table.name == "concept":
+        return profile.concepts
+    return profile.references
@@ -0,0 +1,304 @@
+"""Migrate the data of a CDM to a newer CDM version, e.g. 5.3.1 to 5.4."""
+
+import datetime
+import logging
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    ColumnElement,
+    Connection,
+    Engine,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    func,
+    insert,
+    literal,
+    null,
+    select,
+)
+from sqlalchemy.orm import DeclarativeBase
+
+from omop_cdm.loader import LoadFunction, load_tables
+from omop_cdm.util import get_translated_schema
+
+logger = logging.getLogger(__name__)
+
+# Columns of CDM 5.4 that were renamed since CDM 5.3.1, by table, as
+# {new name: old name}.
+CDM54_RENAMES = {
+    "visit_occurrence": {
+        "admitted_from_concept_id": "admitting_source_concept_id",
+        "admitted_from_source_value": "admitting_source_value",
+        "discharged_to_concept_id": "discharge_to_concept_id",
+        "discharged_to_source_value": "discharge_to_source_value",
+    },
+    "visit_detail": {
+        "admitted_from_concept_id": "admitting_source_concept_id",
+        "admitted_from_source_value": "admitting_source_value",
+        "discharged_to_concept_id": "discharge_to_concept_id",
+        "discharged_to_source_value": "discharge_to_source_value",
+        "parent_visit_detail_id": "visit_detail_parent_id",
+    },
+}
+
+# Values of new required columns of CDM 5.4, by table. Also used for
+# NULLs in columns that are no longer nullable, which are only in
+# cdm_source. These get placeholder values.
+CDM54_DEFAULTS = {
+    "cdm_source": {
+        # The concept of "OMOP CDM Version 5.4.0"
+        "cdm_version_concept_id": 756265,
+        "cdm_source_abbreviation": "",
+        "cdm_holder": "",
+        "source_release_date": datetime.date(1970, 1, 1),
+        "cdm_release_date": datetime.date(1970, 1, 1),
+        "vocabulary_version": "",
+    },
+}
+
+
+@dataclass(frozen=True)
+class ColumnMapping:
+    """
+    Source of a column of the target table.
+
+    The value is taken from the source column (which may have another
+    name), or is the default for new columns. If both are set, the
+    default replaces NULLs of the source column.
+    """
+
+    target: str
+    source: Optional[str] = None
+    default: Any = None
+
+
+@dataclass(frozen=True)
+class TableMigration:
+    """
+    Mapping of a source table to a table of the target CDM.
+
+    The source is None for new tables, which are left empty. Dropped
+    columns are the source columns that are not mapped to any column.
+    Narrowed columns are target columns with a smaller type than their
+    source column, e.g. VARCHAR to VARCHAR(250), which fail to copy
+    values that don't fit.
+    """
+
+    target: Table
+    source: Optional[Table]
+    columns: list[ColumnMapping]
+    dropped: list[str]
+    narrowed: list[str]
+
+
+@dataclass(frozen=True)
+class MigrationPlan:
+    """Mapping of all tables of the target CDM, sorted by table name."""
+
+    metadata: MetaData
+    tables: list[TableMigration]
+
+    def __getitem__(self, table_name: str) -> TableMigration:
+        for table in self.tables:
+            if table.target.name == table_name:
+                return table
+        raise KeyError(table_name)
+
+
+def plan_migration(
+    source_base: type[DeclarativeBase],
+    target_base: type[DeclarativeBase],
+    renames: Optional[dict[str, dict[str, str]]] = None,
+    defaults: Optional[dict[str, dict[str, Any]]] = None,
+) -> MigrationPlan:
+    """
+    Derive the column mapping of all tables by comparing the mapped classes.
+
+    Tables and columns are matched by name, except for the renamed
+    columns ({table: {new name: old name}}). The defaults provide the
+    values of new columns ({table: {column: value}}), which are NULL
+    otherwise. The default of a column that is not nullable anymore
+    replaces its NULLs. By default, the renames and defaults of CDM 5.4
+    are used.
+
+    Raises a ValueError if a renamed column does not exist, if a new
+    non-nullable column has no default (and isn't an autoincrement
+    primary key), or if a nullable column became non-nullable and has no
+    default. Columns with a narrower type are logged as a warning, and
+    listed in TableMigration.narrowed.
+    """
+    renames = CDM54_RENAMES if renames is None else renames
+    defaults = CDM54_DEFAULTS if defaults is None else defaults
+    source_tables = _mapped_tables(source_base)
+    tables = []
+    for name, target in sorted(_mapped_tables(target_base).items()):
+        source = source_tables.get(name)
+        if source is None:
+            tables.append(TableMigration(target, None, [], [], []))
+            continue
+        table_renames = renames.get(name, {})
+        table_defaults = defaults.get(name, {})
+        columns = []
+        narrowed = []
+        for column in target.columns:
+            source_name = table_renames.get(column.name, column.name)
+            if source_name not in source.columns:
+                if column.name in table_renames:
+                    raise ValueError(
+                        f"Column {name}.{source_name} renamed to {column.name} "
+                        "does not exist in the source table"
+                    )
+                source_name = None
+            default = table_defaults.get(column.name)
+            if source_name is None and default is None:
+                if column is target.autoincrement_column:
+                    # Generated by the database
+                    continue
+                if not column.nullable:
+                    raise ValueError(
+                        f"New column {name}.{column.name} is required, "
+                        "but has no default"
+                    )
+            if source_name is not None:
+                source_column = source.columns[source_name]
+                if source_column.nullable and not column.nullable and default is None:
+                    raise ValueError(
+                        f"Column {name}.{column.name} is not nullable anymore, "
+                        "but has no default to replace NULLs"
+                    )
+                if _is_narrower(column, source_column):
+                    logger.warning(
+                        "Type of %s.%s is narrowed from %s to %s",
+                        name,
+                        column.name,
+                        source_column.type,
+                        column.type,
+                    )
+                    narrowed.append(column.name)
+            columns.append(ColumnMapping(column.name, source_name, default))
+        mapped = {c.source for c in columns}
+        dropped = [c.name for c in source.columns if c.name not in mapped]
+        tables.append(TableMigration(target, source, columns, dropped, narrowed))
+    return MigrationPlan(target_base.metadata, tables)
+
+
+def migrate(
+    source: Engine,
+    target: Engine,
+    plan: MigrationPlan,
+    workers: int = 4,
+    batch_size: int = 10_000,
+    tables: Optional[list[str]] = None,
+) -> dict[str, int]:
+    """
+    Copy the data of all tables (or only the given tables) of a plan.
+
+    The schemas of the source and target tables are resolved via the
+    schema_translate_map of the engines. If both engines connect to the
+    same database, each table is copied with a single INSERT ... SELECT
+    statement, without transferring any data to the client. Otherwise,
+    the rows are streamed from the source via a server-side cursor (if
+    supported by the database) and inserted in chunks of batch_size rows.
+
+    The tables are loaded by omop_cdm.loader.load_tables: the number of
+    workers tables are copied at the same time, in order of their foreign
+    keys, each in its own transaction. The target tables must exist, and
+    their cyclic foreign keys must be absent, e.g. by creating them with
+    omop_cdm.ddl.create_all_deferred. Tables of which the source and
+    target are the same (e.g. a shared vocabulary schema) are skipped.
+
+    Returns the number of copied rows per table.
+    """
+    same_database = source.url == target.url
+    sources: dict[str, LoadFunction] = {}
+    for migration in plan.tables:
+        name = migration.target.name
+        if migration.source is None or (tables is not None and name not in tables):
+            continue
+        if not same_database:
+            sources[name] = _copy_rows(source, migration, batch_size)
+            continue
+        source_schema = get_translated_schema(source, migration.source.schema)
+        if source_schema == get_translated_schema(target, migration.target.schema):
+            logger.info("Skipping %s, the source and target are the same", name)
+            continue
+        # The copy refers to the actual source schema, so it isn't affected
+        # by the schema_translate_map of the target
+        source_table = migration.source.to_metadata(MetaData(), schema=source_schema)
+        sources[name] = _insert_select(migration, source_table)
+    return load_tables(target, plan.metadata, sources, workers, batch_size)
+
+
+def _mapped_tables(base: type[DeclarativeBase]) -> dict[str, Table]:
+    return {
+        mapper.local_table.name: mapper.local_table for mapper in base.registry.mappers
+    }
+
+
+def _is_narrower(column: Column, source_column: Column) -> bool:
+    """Return whether a column can hold fewer values than its source column."""
+    column_type, source_type = column.type, source_column.type
+    if isinstance(column_type, String) and isinstance(source_type, String):
+        if column_type.length is None:
+            return False
+        return source_type.length is None or source_type.length > column_type.length
+    if isinstance(column_type, Integer) and isinstance(source_type, Integer):
+        return isinstance(source_type, BigInteger) and not isinstance(
+            column_type, BigInteger
+        )
+    return False
+
+
+def _select(migration: TableMigration, source_table: Table) -> list[ColumnElement]:
+    """Return the expressions selecting the target columns from the source."""
+    expressions = []
+    for mapping in migration.columns:
+        column_type = migration.target.columns[mapping.target].type
+        default = literal(mapping.default, column_type)
+        if mapping.default is None:
+            default = null()
+        if mapping.source is None:
+            expression = default
+        elif mapping.default is None:
+            expression = source_table.columns[mapping.source]
+        else:
+            expression = func.coalesce(source_table.columns[mapping.source], default)
+        expressions.append(expression.label(mapping.target))
+    return expressions
+
+
+def _insert_select(migration: TableMigration, source_table: Table) -> LoadFunction:
+    def load(conn: Connection, table: Table) -> int:
+        statement = insert(table).from_select(
+            [mapping.target for mapping in migration.columns],
+            select(*_select(migration, source_table)),
+        )
+        return conn.execute(statement).rowcount
+
+    return load
+
+
+def _copy_rows(
+    source: Engine, migration: TableMigration, batch_size: int
+) -> LoadFunction:
+    def load(conn: Connection, table: Table) -> int:
+        statement = select(*_select(migration, migration.source))
+        names = [mapping.target for mapping in migration.columns]
+        rows = 0
+        with source.connect() as source_conn:
+            result = source_conn.execute(
+                statement.execution_options(yield_per=batch_size)
+            )
+            for partition in result.partitions():
+                conn.execute(
+                    insert(table), [dict(zip(names, row)) for row in partition]
+                )
+                rows += len(partition)
+        return rows
+
+    return load
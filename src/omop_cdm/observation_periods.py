@@ -0,0 +1,216 @@
+"""Build observation periods from the events in all clinical tables."""
+
+import datetime
+import re
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from sqlalchemy import (
+    Column,
+    ColumnElement,
+    Date,
+    DateTime,
+    Engine,
+    Select,
+    Subquery,
+    func,
+    literal,
+    select,
+    union_all,
+)
+from sqlalchemy.orm import DeclarativeBase
+
+from omop_cdm.intervals import (
+    TableBuilder,
+    add_days,
+    collapse_events,
+    merge_events,
+    next_id,
+    resolve_method,
+)
+from omop_cdm.util import get_table_class
+
+# Events at most this number of days apart are part of the same period
+OBSERVATION_PERIOD_GAP_DAYS = 365
+# "Period covering healthcare encounters"
+PERIOD_COVERING_ENCOUNTERS = 44814724
+
+# Tables with a person_id that don't contain clinical events
+NON_EVENT_TABLES = {
+    "person",
+    "observation_period",
+    "payer_plan_period",
+    "cost",
+    "episode",
+    "condition_era",
+    "drug_era",
+    "dose_era",
+}
+
+# Start of an event: {prefix}_start_date, {prefix}_date, or the datetime
+# variants. The end of an event is in {prefix}_end_date(time), if any.
+_START_COLUMN = re.compile(r"(?P<prefix>.+?)_(start_)?date(time)?")
+
+
+@dataclass(frozen=True)
+class EventDates:
+    """
+    The date columns of an event table.
+
+    The start (and end) of an event is the first non-null value of the
+    start (end) columns, e.g. the date column before the datetime column.
+    Events without an end column, or with null end columns, end on their
+    start date.
+    """
+
+    table_class: type[Any]
+    start: list[Column]
+    end: list[Column]
+
+
+def find_event_dates(
+    base: type[DeclarativeBase], tables: Optional[Iterable[str]] = None
+) -> list[EventDates]:
+    """
+    Find the date columns of all event tables of a Base.
+
+    Event tables are all tables with a person_id column, except for
+    NON_EVENT_TABLES (or only the given tables). The start and end
+    columns are discovered by their names, which works for any CDM
+    version, e.g. visit_start_date and visit_end_date of visit_occurrence,
+    measurement_date of measurement, or condition_start_datetime in
+    CDM 6.0 (where the datetime columns are required, and the date
+    columns optional).
+    """
+    tables = None if tables is None else set(tables)
+    event_dates = []
+    for mapper in sorted(base.registry.mappers, key=lambda m: m.local_table.name):
+        table = mapper.local_table
+        if tables is None:
+            if table.name in NON_EVENT_TABLES or "person_id" not in table.columns:
+                continue
+        elif table.name not in tables:
+            continue
+        dates = {
+            column.key: column
+            for column in table.columns
+            if isinstance(column.type, (Date, DateTime))
+        }
+        prefix = next(
+            (
+                match["prefix"]
+                for match in map(_START_COLUMN.fullmatch, dates)
+                if match and not match["prefix"].endswith("_end")
+            ),
+            None,
+        )
+        if prefix is None:
+            if tables is None:
+                continue
+            raise ValueError(f"No start date column found in {table.name}")
+        start_names = [
+            f"{prefix}_start_date",
+            f"{prefix}_start_datetime",
+            f"{prefix}_date",
+            f"{prefix}_datetime",
+        ]
+        end_names = [f"{prefix}_end_date", f"{prefix}_end_datetime"]
+        event_dates.append(
+            EventDates(
+                mapper.class_,
+                [getattr(mapper.class_, n) for n in start_names if n in dates],
+                [getattr(mapper.class_, n) for n in end_names if n in dates],
+            )
+        )
+    return event_dates
+
+
+def build_observation_periods(
+    engine: Engine,
+    base: type[DeclarativeBase],
+    gap_days: int = OBSERVATION_PERIOD_GAP_DAYS,
+    period_type_concept_id: int = PERIOD_COVERING_ENCOUNTERS,
+    method: Optional[str] = None,
+    partitions: int = 16,
+    workers: int = 4,
+    tables: Optional[Iterable[str]] = None,
+) -> int:
+    """
+    Replace all observation periods with periods spanning all events.
+
+    The events of all event tables (see find_event_dates) of a person
+    are combined into one period if they are at most gap_days apart.
+
+    The persons are split into partitions (by person_id modulo
+    partitions), which are built at the same time by the given number of
+    workers, each in its own transaction. With method SQL, a partition is
+    built by a single INSERT ... SELECT statement over the union of all
+    event tables, with method PYTHON the events are merged in Python. By
+    default, SQL is used on PostgreSQL and PYTHON otherwise. See
+    omop_cdm.eras.build_condition_eras.
+
+    Returns the number of created observation periods.
+    """
+    observation_period = get_table_class(base, "observation_period")
+    event_selects = []
+    for event_dates in find_event_dates(base, tables):
+        start = _first_of([add_days(c, 0) for c in event_dates.start])
+        end = _first_of([add_days(c, 0) for c in event_dates.end] + [start])
+        event_selects.append(
+            select(
+                event_dates.table_class.person_id,
+                start.label("start_date"),
+                end.label("end_date"),
+            ).where(start.is_not(None))
+        )
+    all_events = union_all(*event_selects).subquery()
+    events = select(*all_events.c)
+
+    def collapse(events: Subquery) -> Select:
+        periods = collapse_events(events, [], gap_days).subquery()
+        return select(
+            periods.c.person_id,
+            func.date(periods.c.start_date, type_=Date),
+            func.date(periods.c.end_date, type_=Date),
+            literal(period_type_concept_id),
+        )
+
+    def merge(events: Iterable[tuple]) -> Iterator[tuple]:
+        for (person_id,), start, end, _ in merge_events(events, gap_days):
+            yield person_id, _date(start), _date(end), period_type_concept_id
+
+    builder = TableBuilder(
+        observation_period,
+        [
+            "observation_period_id",
+            "person_id",
+            "observation_period_start_date",
+            "observation_period_end_date",
+            "period_type_concept_id",
+        ],
+        events,
+        collapse,
+        merge,
+    )
+    with engine.connect() as conn:
+        method = resolve_method(conn, method)
+        first_id = next_id(conn, observation_period, "observation_period_id")
+
+    def build_partition(partition: int) -> int:
+        with engine.begin() as conn:
+            return builder.build_partition(
+                conn, method, None, partitions, partition, first_id
+            )
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return sum(executor.map(build_partition, range(partitions)))
+
+
+def _first_of(values: list[ColumnElement]) -> ColumnElement:
+    return values[0] if len(values) == 1 else func.coalesce(*values)
+
+
+def _date(value: datetime.date) -> datetime.date:
+    return value.date() if isinstance(value, datetime.datetime) else value
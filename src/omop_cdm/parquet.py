@@ -0,0 +1,350 @@
+"""Export and import CDM tables as Parquet files."""
+
+from itertools import chain
+from pathlib import Path
+from typing import Any, Optional, Union
+
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Column,
+    Connection,
+    Date,
+    DateTime,
+    Engine,
+    Float,
+    Integer,
+    Numeric,
+    String,
+    insert,
+    select,
+)
+from sqlalchemy.orm import DeclarativeBase
+
+from omop_cdm.loader import plan_load_order
+from omop_cdm.util import connect, copy_from_stdin, copy_statement
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError as e:  # pragma: no cover
+    raise ImportError(
+        "omop_cdm.parquet requires pyarrow: pip install omop-cdm[parquet]"
+    ) from e
+
+PARTITION_COLUMN = "person_id"
+# Arrow type used for Numeric columns without a defined precision and
+# scale, which is the case for all Numeric columns in the CDM.
+DEFAULT_DECIMAL_TYPE = pa.decimal128(38, 18)
+
+
+def arrow_type(column: Column) -> pa.DataType:
+    """Return the Arrow data type matching the type of a table column."""
+    column_type = column.type
+    if isinstance(column_type, BigInteger):
+        return pa.int64()
+    if isinstance(column_type, Integer):
+        return pa.int32()
+    if isinstance(column_type, Float):
+        return pa.float64()
+    if isinstance(column_type, Numeric):
+        if column_type.precision is None:
+            return DEFAULT_DECIMAL_TYPE
+        return pa.decimal128(column_type.precision, column_type.scale or 0)
+    if isinstance(column_type, DateTime):
+        return pa.timestamp("us")
+    if isinstance(column_type, Date):
+        return pa.date32()
+    if isinstance(column_type, Boolean):
+        return pa.bool_()
+    if isinstance(column_type, String):
+        return pa.string()
+    raise TypeError(f"No Arrow type defined for {column_type!r} of column {column.key}")
+
+
+def arrow_schema(table_class: type[Any]) -> pa.Schema:
+    """Return the Arrow schema matching the columns of a mapped table class."""
+    return pa.schema(
+        [
+            pa.field(column.key, arrow_type(column), nullable=column.nullable)
+            for column in table_class.__table__.columns
+        ]
+    )
+
+
+def export_table(
+    bind: Union[Engine, Connection],
+    table_class: type[Any],
+    directory: Union[str, Path],
+    partitions: int = 16,
+    batch_size: int = 100_000,
+) -> int:
+    """
+    Export a table to Parquet files in a directory named after the table.
+
+    Tables with a person_id column are split into the given number of
+    partitions, by the person_id modulo the number of partitions. Each
+    partition is written to a subdirectory (e.g. measurement/bucket=3/).
+    Other tables are written to a single file.
+
+    Rows are read via a server-side cursor (if supported by the
+    database), in batches of batch_size rows. At most batch_size rows per
+    partition are kept in memory before being written as a row group.
+
+    Returns the number of exported rows.
+    """
+    table = table_class.__table__
+    schema = arrow_schema(table_class)
+    table_dir = Path(directory) / table.name
+    partition_index = (
+        table.columns.keys().index(PARTITION_COLUMN)
+        if PARTITION_COLUMN in table.columns
+        else None
+    )
+    if partition_index is None:
+        partitions = 1
+
+    writers: dict[int, pq.ParquetWriter] = {}
+    buffers: dict[int, list[tuple]] = {i: [] for i in range(partitions)}
+
+    def flush(bucket: int) -> None:
+        if not buffers[bucket]:
+            return
+        if bucket not in writers:
+            path = table_dir / f"{table.name}.parquet"
+            if partition_index is not None:
+                path = table_dir / f"bucket={bucket}" / "part-0.parquet"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            writers[bucket] = pq.ParquetWriter(path, schema)
+        writers[bucket].write_batch(_to_record_batch(buffers[bucket], schema))
+        buffers[bucket] = []
+
+    rows = 0
+    statement = select(*table.columns).execution_options(yield_per=batch_size)
+    try:
+        with connect(bind) as conn:
+            for partition in conn.execute(statement).partitions():
+                rows += len(partition)
+                for row in partition:
+                    bucket = (
+                        0
+                        if partition_index is None
+                        else row[partition_index] % partitions
+                    )
+                    buffers[bucket].append(row)
+                    if len(buffers[bucket]) >= batch_size:
+                        flush(bucket)
+        for bucket in buffers:
+            flush(bucket)
+        if not writers:
+            # Make sure that empty tables are exported as well
+            table_dir.mkdir(parents=True, exist_ok=True)
+            pq.write_table(schema.empty_table(), table_dir / f"{table.name}.parquet")
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return rows
+
+
+def export_cdm(
+    bind: Union[Engine, Connection],
+    base: type[DeclarativeBase],
+    directory: Union[str, Path],
+    partitions: int = 16,
+    batch_size: int = 100_000,
+    tables: Optional[list[str]] = None,
+) -> dict[str, int]:
+    """
+    Export all tables of a Base (or only the given tables) to Parquet.
+
+    See export_table. Returns the number of exported rows per table.
+    """
+    row_counts = {}
+    for mapper in sorted(base.registry.mappers, key=lambda m: m.local_table.name):
+        name = mapper.local_table.name
+        if tables is None or name in tables:
+            row_counts[name] = export_table(
+                bind, mapper.class_, directory, partitions, batch_size
+            )
+    return row_counts
+
+
+class SchemaMismatchError(ValueError):
+    """Raised when Parquet data does not match the columns of a table."""
+
+
+def validate_schema(schema: pa.Schema, table_class: type[Any]) -> None:
+    """
+    Check that an Arrow schema can be imported into a mapped table class.
+
+    All fields must be columns of the table, with a type that can be cast
+    to the Arrow type of the column (e.g. int64 to int32, but not string
+    to int32). Non-nullable columns without a server default must be
+    present. Raises a SchemaMismatchError listing all problems.
+
+    Nulls in non-nullable columns and strings exceeding the length of
+    String(n) columns can only be found in the data itself, which is done
+    by import_table.
+    """
+    columns = table_class.__table__.columns
+    errors = []
+    for field in schema:
+        if field.name not in columns:
+            errors.append(f"unknown column {field.name}")
+            continue
+        column = columns[field.name]
+        if pa.types.is_null(field.type):
+            if not column.nullable:
+                errors.append(f"column {field.name} is not nullable")
+        elif not _is_compatible(field.type, arrow_type(column)):
+            errors.append(
+                f"column {field.name} has type {field.type}, "
+                f"expected {arrow_type(column)}"
+            )
+    for column in columns:
+        if (
+            not column.nullable
+            and column.server_default is None
+            and column.key not in schema.names
+        ):
+            errors.append(f"missing required column {column.key}")
+    if errors:
+        raise SchemaMismatchError(
+            f"Cannot import into {table_class.__table__.name}: " + "; ".join(errors)
+        )
+
+
+def import_table(
+    conn: Connection,
+    table_class: type[Any],
+    path: Union[str, Path],
+    batch_size: int = 100_000,
+) -> int:
+    """
+    Import a Parquet file, or a directory of Parquet files, into a table.
+
+    The schema of the files is checked with validate_schema first. The
+    record batches are then cast to the Arrow types of the table columns
+    and checked for nulls in non-nullable columns and too long strings.
+
+    On PostgreSQL, each batch is converted to CSV by Arrow and loaded via
+    COPY, without converting the values to Python objects. Other
+    databases get an executemany INSERT per batch: the values are
+    converted to Python objects column by column, but SQLAlchemy still
+    needs a parameter dict per row, so this is a lot slower than COPY.
+    Either way, the rows are not converted to ORM instances.
+
+    The data is added in the transaction of the connection, which is not
+    committed. Returns the number of imported rows.
+    """
+    table = table_class.__table__
+    dataset = ds.dataset(path, format="parquet")
+    validate_schema(dataset.schema, table_class)
+    # Nullability is checked per batch, to get a clear error message
+    target_schema = pa.schema(
+        [
+            arrow_schema(table_class).field(name).with_nullable(True)
+            for name in dataset.schema.names
+        ]
+    )
+    copy_sql = None
+    if conn.dialect.name == "postgresql":
+        copy_sql = copy_statement(conn, table, target_schema.names, "FORMAT csv")
+
+    rows = 0
+    for batch in dataset.to_batches(batch_size=batch_size):
+        if batch.num_rows == 0:
+            continue
+        try:
+            data = pa.Table.from_batches([batch]).cast(target_schema)
+        except pa.ArrowInvalid as e:
+            raise SchemaMismatchError(f"Cannot import into {table.name}: {e}") from e
+        _check_values(data, table_class)
+        if copy_sql is not None:
+            buffer = pa.BufferOutputStream()
+            pa_csv.write_csv(data, buffer, pa_csv.WriteOptions(include_header=False))
+            copy_from_stdin(conn, copy_sql, buffer.getvalue().to_pybytes())
+        else:
+            names = data.column_names
+            columns = (column.to_pylist() for column in data.columns)
+            conn.execute(
+                insert(table), [dict(zip(names, row)) for row in zip(*columns)]
+            )
+        rows += data.num_rows
+    return rows
+
+
+def import_cdm(
+    conn: Connection,
+    base: type[DeclarativeBase],
+    directory: Union[str, Path],
+    batch_size: int = 100_000,
+    tables: Optional[list[str]] = None,
+) -> dict[str, int]:
+    """
+    Import all tables of a Base that have a directory with Parquet files.
+
+    The directory layout is the one written by export_cdm. Tables are
+    imported in foreign key dependency order, see plan_load_order. Returns the number of
+    imported rows per table.
+    """
+    classes = {mapper.local_table: mapper.class_ for mapper in base.registry.mappers}
+    row_counts = {}
+    load_order = plan_load_order(base.metadata.tables.values())
+    for table in chain.from_iterable(load_order.levels):
+        table_dir = Path(directory) / table.name
+        if table not in classes or not table_dir.is_dir():
+            continue
+        if tables is None or table.name in tables:
+            row_counts[table.name] = import_table(
+                conn, classes[table], table_dir, batch_size
+            )
+    return row_counts
+
+
+def _is_compatible(source: pa.DataType, target: pa.DataType) -> bool:
+    if pa.types.is_integer(target):
+        return pa.types.is_integer(source)
+    if pa.types.is_floating(target) or pa.types.is_decimal(target):
+        return (
+            pa.types.is_integer(source)
+            or pa.types.is_floating(source)
+            or pa.types.is_decimal(source)
+        )
+    if pa.types.is_date(target):
+        return pa.types.is_date(source)
+    if pa.types.is_timestamp(target):
+        return pa.types.is_timestamp(source) or pa.types.is_date(source)
+    if pa.types.is_string(target):
+        return pa.types.is_string(source) or pa.types.is_large_string(source)
+    return source == target
+
+
+def _check_values(data: pa.Table, table_class: type[Any]) -> None:
+    columns = table_class.__table__.columns
+    for name in data.column_names:
+        column = columns[name]
+        values = data[name]
+        if not column.nullable and values.null_count:
+            raise SchemaMismatchError(
+                f"Column {name} of {column.table.name} contains nulls"
+            )
+        length = getattr(column.type, "length", None)
+        if length is not None and pa.types.is_string(values.type):
+            longest = pc.max(pc.utf8_length(values)).as_py()
+            if longest is not None and longest > length:
+                raise SchemaMismatchError(
+                    f"Column {name} of {column.table.name} contains a value "
+                    f"of {longest} characters, the maximum is {length}"
+                )
+
+
+def _to_record_batch(rows: list[tuple], schema: pa.Schema) -> pa.RecordBatch:
+    columns = zip(*rows)
+    arrays = [
+        pa.array(values, type=field.type) for values, field in zip(columns, schema)
+    ]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
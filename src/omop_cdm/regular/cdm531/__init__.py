@@ -21,44 +21,49 @@ source_to_concept_map
 
 """
 
-from omop_cdm.regular.cdm531.tables import (
-    Base,
-    CareSite,
-    CdmSource,
-    Concept,
-    ConceptAncestor,
-    ConceptClass,
-    ConceptRelationship,
-    ConceptSynonym,
-    ConditionEra,
-    ConditionOccurrence,
-    Cost,
-    Death,
-    DeviceExposure,
-    Domain,
-    DoseEra,
-    DrugEra,
-    DrugExposure,
-    DrugStrength,
-    FactRelationship,
-    Location,
-    Measurement,
-    Metadata,
-    Note,
-    NoteNlp,
-    Observation,
-    ObservationPeriod,
-    PayerPlanPeriod,
-    Person,
-    ProcedureOccurrence,
-    Provider,
-    Relationship,
-    SourceToConceptMap,
-    Specimen,
-    VisitDetail,
-    VisitOccurrence,
-    Vocabulary,
-)
+from typing import TYPE_CHECKING
+
+from omop_cdm.lazy import lazy_attributes
+
+if TYPE_CHECKING:
+    from omop_cdm.regular.cdm531.tables import (
+        Base,
+        CareSite,
+        CdmSource,
+        Concept,
+        ConceptAncestor,
+        ConceptClass,
+        ConceptRelationship,
+        ConceptSynonym,
+        ConditionEra,
+        ConditionOccurrence,
+        Cost,
+        Death,
+        DeviceExposure,
+        Domain,
+        DoseEra,
+        DrugEra,
+        DrugExposure,
+        DrugStrength,
+        FactRelationship,
+        Location,
+        Measurement,
+        Metadata,
+        Note,
+        NoteNlp,
+        Observation,
+        ObservationPeriod,
+        PayerPlanPeriod,
+        Person,
+        ProcedureOccurrence,
+        Provider,
+        Relationship,
+        SourceToConceptMap,
+        Specimen,
+        VisitDetail,
+        VisitOccurrence,
+        Vocabulary,
+    )
 
 __all__ = [
     "Base",
@@ -98,3 +103,6 @@ __all__ = [
     "VisitOccurrence",
     "Vocabulary",
 ]
+
+# The tables are only defined when one of them is first used
+__getattr__, __dir__ = lazy_attributes(globals(), "omop_cdm.regular.cdm531.tables", __all__)
@@ -5,6 +5,7 @@ import decimal
 from typing import Optional
 
 from sqlalchemy import Date, DateTime, ForeignKey, Integer, MetaData, Numeric, String, Text
+from sqlalchemy.ext.asyncio import AsyncAttrs
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 from omop_cdm import NAMING_CONVENTION
@@ -24,7 +25,7 @@ from omop_cdm.constants import (
 )
 
 
-class Base(DeclarativeBase):
+class Base(AsyncAttrs, DeclarativeBase):
     pass
 
 
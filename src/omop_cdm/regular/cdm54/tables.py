@@ -5,6 +5,7 @@ import decimal
 from typing import Optional
 
 from sqlalchemy import BigInteger, Date, DateTime, ForeignKey, Integer, MetaData, Numeric, String, Text
+from sqlalchemy.ext.asyncio import AsyncAttrs
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 from omop_cdm import NAMING_CONVENTION
@@ -25,7 +26,7 @@ from omop_cdm.constants import (
 from omop_cdm.util import record_as_str
 
 
-class Base(DeclarativeBase):
+class Base(AsyncAttrs, DeclarativeBase):
     pass
 
 
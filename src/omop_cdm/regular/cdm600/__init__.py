@@ -17,45 +17,50 @@ source_to_concept_map
 
 """
 
-from omop_cdm.regular.cdm600.tables import (
-    Base,
-    CareSite,
-    CdmSource,
-    Concept,
-    ConceptAncestor,
-    ConceptClass,
-    ConceptRelationship,
-    ConceptSynonym,
-    ConditionEra,
-    ConditionOccurrence,
-    Cost,
-    DeviceExposure,
-    Domain,
-    DoseEra,
-    DrugEra,
-    DrugExposure,
-    DrugStrength,
-    FactRelationship,
-    Location,
-    LocationHistory,
-    Measurement,
-    Metadata,
-    Note,
-    NoteNlp,
-    Observation,
-    ObservationPeriod,
-    PayerPlanPeriod,
-    Person,
-    ProcedureOccurrence,
-    Provider,
-    Relationship,
-    SourceToConceptMap,
-    Specimen,
-    SurveyConduct,
-    VisitDetail,
-    VisitOccurrence,
-    Vocabulary,
-)
+from typing import TYPE_CHECKING
+
+from omop_cdm.lazy import lazy_attributes
+
+if TYPE_CHECKING:
+    from omop_cdm.regular.cdm600.tables import (
+        Base,
+        CareSite,
+        CdmSource,
+        Concept,
+        ConceptAncestor,
+        ConceptClass,
+        ConceptRelationship,
+        ConceptSynonym,
+        ConditionEra,
+        ConditionOccurrence,
+        Cost,
+        DeviceExposure,
+        Domain,
+        DoseEra,
+        DrugEra,
+        DrugExposure,
+        DrugStrength,
+        FactRelationship,
+        Location,
+        LocationHistory,
+        Measurement,
+        Metadata,
+        Note,
+        NoteNlp,
+        Observation,
+        ObservationPeriod,
+        PayerPlanPeriod,
+        Person,
+        ProcedureOccurrence,
+        Provider,
+        Relationship,
+        SourceToConceptMap,
+        Specimen,
+        SurveyConduct,
+        VisitDetail,
+        VisitOccurrence,
+        Vocabulary,
+    )
 
 __all__ = [
     "Base",
@@ -96,3 +101,6 @@ __all__ = [
     "VisitOccurrence",
     "Vocabulary",
 ]
+
+# The tables are only defined when one of them is first used
+__getattr__, __dir__ = lazy_attributes(globals(), "omop_cdm.regular.cdm600.tables", __all__)
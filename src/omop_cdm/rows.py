@@ -0,0 +1,68 @@
+"""Lightweight read-only row types for large table scans."""
+
+from collections.abc import Iterator
+from typing import Any, NamedTuple, Optional, Union
+
+from sqlalchemy import Column, ColumnElement, Connection, Engine, select
+from sqlalchemy.orm import DeclarativeBase
+
+from omop_cdm.util import connect
+
+_row_types: dict[type[Any], type[tuple]] = {}
+
+
+def row_type(table_class: type[Any]) -> type[tuple]:
+    """
+    Return a NamedTuple type with the columns of a mapped table class.
+
+    The fields have the same names, order and Python types as the table
+    columns, e.g. row_type(cdm54.Measurement) returns a MeasurementRow
+    type with fields measurement_id, person_id, etc. Instances are plain
+    tuples, without the overhead of ORM instances (identity map, change
+    tracking, lazy loading).
+    """
+    if table_class not in _row_types:
+        fields = [
+            (column.key, _python_type(column))
+            for column in table_class.__table__.columns
+        ]
+        _row_types[table_class] = NamedTuple(f"{table_class.__name__}Row", fields)
+    return _row_types[table_class]
+
+
+def row_types(base: type[DeclarativeBase]) -> dict[str, type[tuple]]:
+    """Return the row types of all tables of a Base, by table name."""
+    return {
+        mapper.local_table.name: row_type(mapper.class_)
+        for mapper in base.registry.mappers
+    }
+
+
+def stream_rows(
+    bind: Union[Engine, Connection],
+    table_class: type[Any],
+    *where: ColumnElement[bool],
+    batch_size: int = 10_000,
+) -> Iterator[tuple]:
+    """
+    Stream all rows of a table as row_type(table_class) instances.
+
+    Rows are fetched in batches of batch_size via a server-side cursor
+    (if supported by the database), so memory usage is bounded. Optional
+    where clauses can be provided to filter the rows, e.g.
+    stream_rows(engine, Measurement, Measurement.person_id < 1000).
+    """
+    make_row = row_type(table_class)._make
+    statement = select(*table_class.__table__.columns).where(*where)
+    with connect(bind) as conn:
+        result = conn.execute(statement.execution_options(yield_per=batch_size))
+        for partition in result.partitions():
+            yield from map(make_row, partition)
+
+
+def _python_type(column: Column) -> Any:
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return Any
+    return Optional[python_type] if column.nullable else python_type
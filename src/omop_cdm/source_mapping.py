@@ -0,0 +1,173 @@
+"""Batch mapping of source codes to standard concepts."""
+
+import datetime
+from array import array
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from typing import Optional, Union
+
+from sqlalchemy import Connection, Engine, Select, and_, select
+from sqlalchemy.orm import DeclarativeBase, aliased
+
+from omop_cdm.util import connect, get_table_class
+
+MAPS_TO = "Maps to"
+# Concept_id used for source codes without a mapping
+NO_MATCHING_CONCEPT_ID = 0
+
+# A single mapping target: (target_concept_id, target domain_id)
+Target = tuple[int, Optional[str]]
+
+
+@dataclass
+class MappingResult:
+    """
+    Mapped concepts of a batch of source codes.
+
+    The arrays are aligned: row i maps the source code at position
+    source_index[i] of the input to target_concept_ids[i]. A source code
+    that maps to multiple concepts occurs in multiple rows. Source codes
+    without a mapping occur once, with NO_MATCHING_CONCEPT_ID as target
+    and None as domain_id.
+    """
+
+    source_index: array = field(default_factory=lambda: array("q"))
+    target_concept_ids: array = field(default_factory=lambda: array("i"))
+    domain_ids: list[Optional[str]] = field(default_factory=list)
+    unmapped: int = 0
+
+    def __len__(self) -> int:
+        return len(self.source_index)
+
+
+class SourceConceptMapper:
+    """
+    Map (source_vocabulary_id, source_code) pairs to standard concepts.
+
+    All mappings are loaded once into hash tables, after which any number
+    of source codes can be mapped without querying the database. Mappings
+    from source_to_concept_map take precedence. Codes that are not in
+    there are looked up in the concept table, and followed to their
+    standard concepts via the "Maps to" relationships.
+
+    Only valid mappings are used, i.e. those without an invalid_reason,
+    and, if as_of is given, with a validity period that includes it.
+    """
+
+    def __init__(self, mappings: dict[tuple[str, str], tuple[Target, ...]]):
+        self._mappings = mappings
+
+    def __len__(self) -> int:
+        return len(self._mappings)
+
+    @classmethod
+    def from_database(
+        cls,
+        bind: Union[Engine, Connection],
+        base: type[DeclarativeBase],
+        vocabulary_ids: Optional[Iterable[str]] = None,
+        as_of: Optional[datetime.date] = None,
+    ) -> "SourceConceptMapper":
+        """
+        Load the mappings of a CDM.
+
+        The concept, concept_relationship and source_to_concept_map
+        classes are taken from the provided Base. To limit memory usage,
+        only the mappings of the given source vocabularies can be loaded.
+        """
+        vocabulary_ids = None if vocabulary_ids is None else list(vocabulary_ids)
+        mappings: dict[tuple[str, str], list[Target]] = {}
+        stcm_query, maps_to_query = _mapping_queries(base, vocabulary_ids, as_of)
+
+        with connect(bind) as conn:
+            for vocabulary_id, code, target_id, domain_id in conn.execute(stcm_query):
+                mappings.setdefault((vocabulary_id, code), []).append(
+                    (target_id, domain_id)
+                )
+            stcm_codes = set(mappings)
+            for vocabulary_id, code, target_id, domain_id in conn.execute(
+                maps_to_query
+            ):
+                key = (vocabulary_id, code)
+                if key not in stcm_codes:
+                    mappings.setdefault(key, []).append((target_id, domain_id))
+        return cls(
+            {
+                key: tuple(sorted(set(targets), key=lambda t: t[0]))
+                for key, targets in mappings.items()
+            }
+        )
+
+    def targets(
+        self, source_vocabulary_id: str, source_code: str
+    ) -> tuple[Target, ...]:
+        """Return all (concept_id, domain_id) targets of a single source code."""
+        return self._mappings.get((source_vocabulary_id, source_code), ())
+
+    def map(self, source_codes: Iterable[tuple[str, str]]) -> MappingResult:
+        """Map a batch of (source_vocabulary_id, source_code) pairs."""
+        result = MappingResult()
+        get = self._mappings.get
+        no_match = ((NO_MATCHING_CONCEPT_ID, None),)
+        for i, key in enumerate(source_codes):
+            targets = get(key)
+            if targets is None:
+                targets = no_match
+                result.unmapped += 1
+            for target_id, domain_id in targets:
+                result.source_index.append(i)
+                result.target_concept_ids.append(target_id)
+                result.domain_ids.append(domain_id)
+        return result
+
+
+def _mapping_queries(
+    base: type[DeclarativeBase],
+    vocabulary_ids: Optional[list[str]],
+    as_of: Optional[datetime.date],
+) -> tuple[Select, Select]:
+    concept = get_table_class(base, "concept")
+    concept_relationship = get_table_class(base, "concept_relationship")
+    stcm = get_table_class(base, "source_to_concept_map")
+    target = aliased(concept)
+
+    def is_valid(table):
+        conditions = [table.invalid_reason.is_(None)]
+        if as_of is not None:
+            conditions += [
+                table.valid_start_date <= as_of,
+                table.valid_end_date >= as_of,
+            ]
+        return and_(*conditions)
+
+    stcm_query = (
+        select(
+            stcm.source_vocabulary_id,
+            stcm.source_code,
+            stcm.target_concept_id,
+            target.domain_id,
+        )
+        .outerjoin(target, target.concept_id == stcm.target_concept_id)
+        .where(is_valid(stcm))
+    )
+    maps_to_query = (
+        select(
+            concept.vocabulary_id,
+            concept.concept_code,
+            concept_relationship.concept_id_2,
+            target.domain_id,
+        )
+        .join(
+            concept_relationship,
+            concept_relationship.concept_id_1 == concept.concept_id,
+        )
+        .join(target, target.concept_id == concept_relationship.concept_id_2)
+        .where(
+            concept_relationship.relationship_id == MAPS_TO,
+            is_valid(concept_relationship),
+        )
+    )
+    if vocabulary_ids is not None:
+        stcm_query = stcm_query.where(stcm.source_vocabulary_id.in_(vocabulary_ids))
+        maps_to_query = maps_to_query.where(concept.vocabulary_id.in_(vocabulary_ids))
+    return stcm_query, maps_to_query
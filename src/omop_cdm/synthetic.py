@@ -0,0 +1,491 @@
+"""Generate synthetic CDM data for load and scale testing."""
+
+import datetime
+import math
+import random
+from collections.abc import Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Callable, Optional, Union
+
+from sqlalchemy import Date, DateTime, Engine, Numeric, String, create_engine, insert
+from sqlalchemy.orm import DeclarativeBase
+
+from omop_cdm.util import get_table_class
+
+# Tables filled by the generator, in foreign key order
+PERSON_TABLES = (
+    "person",
+    "observation_period",
+    "visit_occurrence",
+    "condition_occurrence",
+    "drug_exposure",
+    "measurement",
+)
+
+NO_MATCHING_CONCEPT_ID = 0
+EHR = 32817
+MALE = 8507
+FEMALE = 8532
+INPATIENT_VISIT = 9201
+OUTPATIENT_VISIT = 9202
+EMERGENCY_ROOM_VISIT = 9203
+DRUG_DAYS_SUPPLY = 30
+# Domain, vocabulary and concept class of the concepts of generate_vocabulary
+SYNTHETIC = "Synthetic"
+
+
+@dataclass(frozen=True)
+class SyntheticConfig:
+    """
+    Volumes and value ranges of the synthetic data.
+
+    The number of visits per person, and of conditions, drugs and
+    measurements per visit, follow a Poisson distribution with the given
+    means. Persons are born between the given years, and all visits
+    happen between start_date and end_date. Events refer to random
+    concepts from the given concept_ids. With the same seed, the same
+    data is generated.
+    """
+
+    persons: int = 1_000
+    visits_per_person: float = 10.0
+    conditions_per_visit: float = 1.0
+    drugs_per_visit: float = 1.0
+    measurements_per_visit: float = 3.0
+    first_year_of_birth: int = 1930
+    last_year_of_birth: int = 2010
+    start_date: datetime.date = datetime.date(2015, 1, 1)
+    end_date: datetime.date = datetime.date(2024, 12, 31)
+    # Type 2 diabetes mellitus, essential hypertension, asthma, ...
+    condition_concept_ids: Sequence[int] = (201826, 320128, 317009, 255573, 4329847)
+    # Metformin, lisinopril, salbutamol, ...
+    drug_concept_ids: Sequence[int] = (1503297, 1308216, 1154343, 1125315, 1539403)
+    # Body weight, systolic and diastolic blood pressure, HbA1c, ...
+    measurement_concept_ids: Sequence[int] = (3025315, 3004249, 3012888, 3004410)
+    visit_concept_ids: Sequence[int] = (
+        OUTPATIENT_VISIT,
+        INPATIENT_VISIT,
+        EMERGENCY_ROOM_VISIT,
+    )
+    seed: int = 0
+
+    @property
+    def concept_ids(self) -> set[int]:
+        """All concept_ids used in the generated data."""
+        return {
+            NO_MATCHING_CONCEPT_ID,
+            EHR,
+            MALE,
+            FEMALE,
+            *self.visit_concept_ids,
+            *self.condition_concept_ids,
+            *self.drug_concept_ids,
+            *self.measurement_concept_ids,
+        }
+
+
+class _Table:
+    """Completes generated rows with the columns of a table of a CDM version."""
+
+    def __init__(self, table_class: type[Any]):
+        self.table_class = table_class
+        columns = table_class.__table__.columns
+        self.keys = set(columns.keys())
+        # (datetime column, date column), e.g. visit_start_datetime, visit_start_date
+        self.datetimes = [
+            (c.key, c.key[: -len("time")])
+            for c in columns
+            if isinstance(c.type, DateTime) and c.key.endswith("_datetime")
+        ]
+        self.defaults = {
+            c.key: _default_value(c)
+            for c in columns
+            if not c.nullable and not c.primary_key and c.server_default is None
+        }
+
+    def row(self, values: dict[str, Any]) -> dict[str, Any]:
+        row = {**self.defaults, **values}
+        for datetime_key, date_key in self.datetimes:
+            if row.get(datetime_key) is None and date_key in row:
+                date = row[date_key]
+                row[datetime_key] = datetime.datetime(date.year, date.month, date.day)
+        return {key: value for key, value in row.items() if key in self.keys}
+
+
+def _default_value(column) -> Any:
+    if isinstance(column.type, DateTime):
+        return None  # filled from the date column
+    if isinstance(column.type, Date):
+        return datetime.date(1970, 1, 1)
+    if isinstance(column.type, String):
+        return ""
+    if isinstance(column.type, Numeric):
+        return 0
+    return NO_MATCHING_CONCEPT_ID
+
+
+def generate(
+    base: type[DeclarativeBase],
+    config: SyntheticConfig,
+    partition: int = 0,
+    partitions: int = 1,
+    chunk_size: int = 1_000,
+) -> Iterator[dict[str, list[dict[str, Any]]]]:
+    """
+    Generate the rows of the persons of a partition, in chunks of persons.
+
+    Works for the mapped classes of any CDM version. Generated columns
+    that don't exist in a version are left out, other required columns
+    get a default value (e.g. concept_id 0, or the datetime of a date).
+
+    The persons (person_id 1 up to config.persons) are divided over the
+    partitions by person_id modulo partitions, like the builders of
+    omop_cdm.eras. The ids of the other tables are interleaved in the same
+    way, so partitions can be generated independently (e.g. in different
+    processes) without creating duplicate ids. The random values of a
+    person only depend on the seed and person_id, so the same persons and
+    events are generated for any number of partitions, only the ids of
+    the events differ.
+
+    Yields the rows of chunk_size persons at a time, by table name, in
+    foreign key order (see PERSON_TABLES).
+    """
+    tables = {name: _Table(get_table_class(base, name)) for name in PERSON_TABLES}
+    ids = dict.fromkeys(PERSON_TABLES[1:], 0)
+
+    def next_id(table_name: str) -> int:
+        ids[table_name] += 1
+        return (ids[table_name] - 1) * partitions + partition + 1
+
+    days = (config.end_date - config.start_date).days
+    person_ids = range(partition + 1, config.persons + 1, partitions)
+    for i in range(0, len(person_ids), chunk_size):
+        rows: dict[str, list[dict[str, Any]]] = {name: [] for name in PERSON_TABLES}
+        for person_id in person_ids[i : i + chunk_size]:
+            rng = random.Random(f"{config.seed}-{person_id}")
+            rows["person"].append(
+                tables["person"].row(
+                    {
+                        "person_id": person_id,
+                        "gender_concept_id": rng.choice((MALE, FEMALE)),
+                        "year_of_birth": rng.randint(
+                            config.first_year_of_birth, config.last_year_of_birth
+                        ),
+                        "person_source_value": f"SYN{person_id}",
+                    }
+                )
+            )
+            visit_dates = sorted(
+                config.start_date + datetime.timedelta(days=rng.randint(0, days))
+                for _ in range(_poisson(rng, config.visits_per_person))
+            )
+            last_visit_end = None
+            for visit_start in visit_dates:
+                visit_concept_id = rng.choice(config.visit_concept_ids)
+                visit_end = visit_start
+                if visit_concept_id == INPATIENT_VISIT:
+                    visit_end += datetime.timedelta(days=rng.randint(1, 10))
+                last_visit_end = max(visit_end, last_visit_end or visit_end)
+                visit_id = next_id("visit_occurrence")
+                rows["visit_occurrence"].append(
+                    tables["visit_occurrence"].row(
+                        {
+                            "visit_occurrence_id": visit_id,
+                            "person_id": person_id,
+                            "visit_concept_id": visit_concept_id,
+                            "visit_start_date": visit_start,
+                            "visit_end_date": visit_end,
+                            "visit_type_concept_id": EHR,
+                        }
+                    )
+                )
+                event = {"person_id": person_id, "visit_occurrence_id": visit_id}
+                for _ in range(_poisson(rng, config.conditions_per_visit)):
+                    rows["condition_occurrence"].append(
+                        tables["condition_occurrence"].row(
+                            {
+                                **event,
+                                "condition_occurrence_id": next_id(
+                                    "condition_occurrence"
+                                ),
+                                "condition_concept_id": rng.choice(
+                                    config.condition_concept_ids
+                                ),
+                                "condition_start_date": visit_start,
+                                "condition_type_concept_id": EHR,
+                            }
+                        )
+                    )
+                for _ in range(_poisson(rng, config.drugs_per_visit)):
+                    rows["drug_exposure"].append(
+                        tables["drug_exposure"].row(
+                            {
+                                **event,
+                                "drug_exposure_id": next_id("drug_exposure"),
+                                "drug_concept_id": rng.choice(config.drug_concept_ids),
+                                "drug_exposure_start_date": visit_start,
+                                "drug_exposure_end_date": visit_start
+                                + datetime.timedelta(days=DRUG_DAYS_SUPPLY - 1),
+                                "drug_type_concept_id": EHR,
+                                "quantity": Decimal(rng.choice((30, 60, 90))),
+                                "days_supply": DRUG_DAYS_SUPPLY,
+                            }
+                        )
+                    )
+                for _ in range(_poisson(rng, config.measurements_per_visit)):
+                    rows["measurement"].append(
+                        tables["measurement"].row(
+                            {
+                                **event,
+                                "measurement_id": next_id("measurement"),
+                                "measurement_concept_id": rng.choice(
+                                    config.measurement_concept_ids
+                                ),
+                                "measurement_date": visit_start,
+                                "measurement_type_concept_id": EHR,
+                                "value_as_number": Decimal(
+                                    rng.randint(500, 1500)
+                                ).scaleb(-1),
+                            }
+                        )
+                    )
+            if visit_dates:
+                rows["observation_period"].append(
+                    tables["observation_period"].row(
+                        {
+                            "observation_period_id": next_id("observation_period"),
+                            "person_id": person_id,
+                            "observation_period_start_date": visit_dates[0],
+                            "observation_period_end_date": last_visit_end,
+                            "period_type_concept_id": EHR,
+                        }
+                    )
+                )
+        yield rows
+
+
+def generate_vocabulary(
+    base: type[DeclarativeBase], config: SyntheticConfig
+) -> dict[str, list[dict[str, Any]]]:
+    """
+    Generate placeholder concepts for all concept_ids used by the generator.
+
+    Only meant for test databases without a vocabulary. The vocabulary
+    tables refer to each other in a cycle, so on databases that enforce
+    foreign keys, these must be created afterwards, see
+    omop_cdm.ddl.create_all_deferred.
+    """
+    vocabulary_rows = {
+        "domain": [
+            {"domain_id": SYNTHETIC, "domain_name": SYNTHETIC, "domain_concept_id": 0}
+        ],
+        "vocabulary": [
+            {
+                "vocabulary_id": SYNTHETIC,
+                "vocabulary_name": SYNTHETIC,
+                "vocabulary_reference": "",
+                "vocabulary_concept_id": 0,
+            }
+        ],
+        "concept_class": [
+            {
+                "concept_class_id": SYNTHETIC,
+                "concept_class_name": SYNTHETIC,
+                "concept_class_concept_id": 0,
+            }
+        ],
+        "concept": [
+            {
+                "concept_id": concept_id,
+                "concept_name": f"Synthetic concept {concept_id}",
+                "domain_id": SYNTHETIC,
+                "vocabulary_id": SYNTHETIC,
+                "concept_class_id": SYNTHETIC,
+                "standard_concept": "S" if concept_id else None,
+                "concept_code": str(concept_id),
+                "valid_start_date": datetime.date(1970, 1, 1),
+                "valid_end_date": datetime.date(2099, 12, 31),
+            }
+            for concept_id in sorted(config.concept_ids)
+        ],
+    }
+    return {
+        name: [_Table(get_table_class(base, name)).row(r) for r in rows]
+        for name, rows in vocabulary_rows.items()
+    }
+
+
+def write_to_database(
+    engine: Engine,
+    base: type[DeclarativeBase],
+    config: SyntheticConfig,
+    workers: int = 4,
+    partitions: Optional[int] = None,
+    chunk_size: int = 1_000,
+    vocabulary: bool = False,
+) -> dict[str, int]:
+    """
+    Generate synthetic data and insert it into the tables of a database.
+
+    The partitions (by default 4 per worker) are generated and inserted by
+    the given number of worker processes, each with its own engine (with
+    the same URL and execution options, e.g. the schema_translate_map).
+    Each chunk of persons is inserted in its own transaction, so memory
+    usage is bounded by chunk_size.
+
+    With vocabulary=True, the placeholder concepts of generate_vocabulary
+    are inserted first. Returns the number of inserted rows per table.
+    """
+    url = engine.url.render_as_string(hide_password=False)
+    options = engine.get_execution_options()
+    counts = dict.fromkeys(PERSON_TABLES, 0)
+    if vocabulary:
+        with engine.begin() as conn:
+            counts.update(_insert(conn, base, generate_vocabulary(base, config)))
+    for partition_counts in _run_partitions(
+        _write_partition_to_database,
+        (url, dict(options), base, config, chunk_size),
+        workers,
+        partitions,
+    ):
+        for name, count in partition_counts.items():
+            counts[name] += count
+    return counts
+
+
+def write_to_parquet(
+    base: type[DeclarativeBase],
+    config: SyntheticConfig,
+    directory: Union[str, Path],
+    workers: int = 4,
+    partitions: Optional[int] = None,
+    chunk_size: int = 10_000,
+    vocabulary: bool = False,
+) -> dict[str, int]:
+    """
+    Generate synthetic data and write it to Parquet files.
+
+    Every partition is written to one file per table, e.g.
+    measurement/part-3.parquet, by the given number of worker processes.
+    Each chunk of persons becomes a row group. The directory layout can
+    be imported with omop_cdm.parquet.import_cdm. Requires pyarrow.
+
+    Returns the number of written rows per table.
+    """
+    counts = dict.fromkeys(PERSON_TABLES, 0)
+    if vocabulary:
+        vocabulary_rows = [generate_vocabulary(base, config)]
+        counts.update(_write_parquet(base, directory, SYNTHETIC, vocabulary_rows))
+    for partition_counts in _run_partitions(
+        _write_partition_to_parquet,
+        (base, config, chunk_size, str(directory)),
+        workers,
+        partitions,
+    ):
+        for name, count in partition_counts.items():
+            counts[name] += count
+    return counts
+
+
+def _run_partitions(
+    func: Callable[..., dict[str, int]],
+    args: tuple,
+    workers: int,
+    partitions: Optional[int],
+) -> list[dict[str, int]]:
+    partitions = partitions or 4 * workers
+    tasks = [(*args, partition, partitions) for partition in range(partitions)]
+    if workers == 1:
+        return [func(*task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(func, *zip(*tasks)))
+
+
+def _write_partition_to_database(
+    url: str,
+    options: dict[str, Any],
+    base: type[DeclarativeBase],
+    config: SyntheticConfig,
+    chunk_size: int,
+    partition: int,
+    partitions: int,
+) -> dict[str, int]:
+    engine = create_engine(url).execution_options(**options)
+    counts = dict.fromkeys(PERSON_TABLES, 0)
+    try:
+        for rows in generate(base, config, partition, partitions, chunk_size):
+            with engine.begin() as conn:
+                for name, count in _insert(conn, base, rows).items():
+                    counts[name] += count
+    finally:
+        engine.dispose()
+    return counts
+
+
+def _insert(conn, base: type[DeclarativeBase], rows: dict[str, list[dict]]) -> dict:
+    for name, table_rows in rows.items():
+        if table_rows:
+            conn.execute(insert(get_table_class(base, name).__table__), table_rows)
+    return {name: len(table_rows) for name, table_rows in rows.items()}
+
+
+def _write_partition_to_parquet(
+    base: type[DeclarativeBase],
+    config: SyntheticConfig,
+    chunk_size: int,
+    directory: str,
+    partition: int,
+    partitions: int,
+) -> dict[str, int]:
+    chunks = generate(base, config, partition, partitions, chunk_size)
+    return _write_parquet(base, directory, f"part-{partition}", chunks)
+
+
+def _write_parquet(
+    base: type[DeclarativeBase],
+    directory: Union[str, Path],
+    file_name: str,
+    chunks: Iterator[dict[str, list[dict]]],
+) -> dict[str, int]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    from omop_cdm.parquet import arrow_schema
+
+    writers: dict[str, pq.ParquetWriter] = {}
+    counts: dict[str, int] = {}
+    try:
+        for rows in chunks:
+            for name, table_rows in rows.items():
+                counts[name] = counts.get(name, 0) + len(table_rows)
+                if not table_rows:
+                    continue
+                if name not in writers:
+                    schema = arrow_schema(get_table_class(base, name))
+                    path = Path(directory) / name / f"{file_name}.parquet"
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    writers[name] = pq.ParquetWriter(path, schema)
+                writers[name].write_table(
+                    pa.Table.from_pylist(table_rows, schema=writers[name].schema)
+                )
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return counts
+
+
+def _poisson(rng: random.Random, mean: float) -> int:
+    """Draw from a Poisson distribution (Knuth's algorithm, normal for large means)."""
+    if mean <= 0:
+        return 0
+    if mean > 30:
+        return max(0, round(rng.gauss(mean, math.sqrt(mean))))
+    limit = math.exp(-mean)
+    count, product = 0, rng.random()
+    while product > limit:
+        count += 1
+        product *= rng.random()
+    return count
@@ -0,0 +1,118 @@
+"""Load persons together with all of their clinical events."""
+
+from collections.abc import Iterable, Sequence
+from typing import Any, Optional
+
+from sqlalchemy import inspect, select
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.interfaces import MANYTOONE
+
+from omop_cdm.concept_cache import IN_CLAUSE_SIZE
+
+# Relationships of Person to the clinical event tables
+TIMELINE_RELATIONSHIPS = (
+    "observation_periods",
+    "visit_occurrences",
+    "visit_details",
+    "condition_occurrences",
+    "drug_exposures",
+    "procedure_occurrences",
+    "device_exposures",
+    "measurements",
+    "observations",
+    "death",
+    "notes",
+    "specimens",
+)
+
+
+def load_person_timelines(
+    session: Session,
+    person_ids: Iterable[int],
+    person_class: Optional[type[Any]] = None,
+    relationships: Sequence[str] = TIMELINE_RELATIONSHIPS,
+) -> list[Any]:
+    """
+    Load persons with their clinical events and all referenced concepts.
+
+    The events of the given relationships (by default all clinical event
+    tables) are loaded with selectinload. Then all concepts referred to by
+    the persons and their events (e.g. condition_concept and
+    condition_type_concept of a ConditionOccurrence) are loaded in a
+    single query (per IN_CLAUSE_SIZE concepts), and assigned to the
+    concept relationships. So accessing person.condition_occurrences, or
+    their condition_concept, doesn't query the database anymore.
+
+    The number of queries only depends on the number of relationships,
+    not on the number of persons or events. The person class defaults to
+    the Person of the regular CDM 5.4, but can be any person class that
+    has the given relationships. Returns the persons ordered by person_id.
+    """
+    if person_class is None:
+        from omop_cdm.regular.cdm54 import Person as person_class
+
+    names = [name for name in relationships if hasattr(person_class, name)]
+    statement = (
+        select(person_class)
+        .where(person_class.person_id.in_(list(person_ids)))
+        .options(*(selectinload(getattr(person_class, name)) for name in names))
+        .order_by(person_class.person_id)
+    )
+    persons = session.scalars(statement).all()
+    records = list(persons)
+    for person in persons:
+        for name in names:
+            related = getattr(person, name)
+            if isinstance(related, list):
+                records.extend(related)
+            elif related is not None:
+                records.append(related)
+    resolve_concepts(session, records)
+    return list(persons)
+
+
+def resolve_concepts(session: Session, records: Iterable[Any]) -> None:
+    """
+    Load the concepts of all concept relationships of the given records.
+
+    All concepts are retrieved with a single query (per IN_CLAUSE_SIZE
+    concepts), instead of one lazy load per record and relationship. The
+    records can be instances of any (mix of) table classes.
+    """
+    # (record, relationship key, concept_id) of each concept relationship
+    references: list[tuple[Any, str, int]] = []
+    relationships_by_class: dict[type, list[tuple[str, str]]] = {}
+    concept_class = None
+    for record in records:
+        record_class = type(record)
+        if record_class not in relationships_by_class:
+            relationships_by_class[record_class] = _concept_relationships(record_class)
+        for key, column in relationships_by_class[record_class]:
+            if concept_class is None:
+                concept_class = inspect(record_class).relationships[key].mapper.class_
+            references.append((record, key, getattr(record, column)))
+
+    concept_ids = sorted({c for _, _, c in references if c is not None})
+    concepts = {}
+    for i in range(0, len(concept_ids), IN_CLAUSE_SIZE):
+        chunk = concept_ids[i : i + IN_CLAUSE_SIZE]
+        statement = select(concept_class).where(concept_class.concept_id.in_(chunk))
+        concepts.update((c.concept_id, c) for c in session.scalars(statement))
+    for record, key, concept_id in references:
+        set_committed_value(record, key, concepts.get(concept_id))
+
+
+def _concept_relationships(table_class: type[Any]) -> list[tuple[str, str]]:
+    """Return the (relationship, FK attribute) keys of all concept relationships."""
+    mapper = inspect(table_class)
+    result = []
+    for relationship in mapper.relationships:
+        if (
+            relationship.direction is MANYTOONE
+            and relationship.mapper.local_table.name == "concept"
+            and len(relationship.local_columns) == 1
+        ):
+            (column,) = relationship.local_columns
+            result.append((relationship.key, mapper.get_property_by_column(column).key))
+    return result
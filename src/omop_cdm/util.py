@@ -1,22 +1,163 @@
 import datetime
+import io
+from contextlib import AbstractContextManager, nullcontext
+from typing import Any, BinaryIO, Optional, Union
 
+from sqlalchemy import Connection, Dialect, Engine, Table, insert, select
 from sqlalchemy.orm import DeclarativeBase
 
+# Values longer than this number of characters are truncated by
+# record_as_str, e.g. note_text. Set to None to show complete values.
+# Widths below 3 are treated as 3, the length of the "..." suffix.
+RECORD_VALUE_WIDTH: Optional[int] = 100
+
+_record_columns: dict[type, tuple[str, ...]] = {}
+
 
 def record_as_str(record: DeclarativeBase) -> str:
-    col_name_values = {
-        cname: str(getattr(record, cname))
-        for cname in record.__class__.__table__.columns.keys()  # noqa: SIM118
-    }
-    return (
-        f"{record.__class__.__name__}("
-        f"""{
-            ", ".join(
-                f"{c_name}={c_value}" for c_name, c_value in col_name_values.items()
-            )
-        })"""
-    )
+    """
+    Return the class name and all column values of a record.
+
+    Used as __repr__ of all tables. The column names of each class are
+    only looked up once. Values are truncated to RECORD_VALUE_WIDTH
+    characters.
+    """
+    record_class = record.__class__
+    keys = _record_columns.get(record_class)
+    if keys is None:
+        keys = _record_columns[record_class] = tuple(
+            record_class.__table__.columns.keys()
+        )
+    # Loaded values are read from the instance dict directly, which is
+    # much faster than the instrumented attributes. Other attributes are
+    # accessed normally, e.g. to load expired attributes.
+    loaded = record.__dict__
+    values = [
+        str(loaded[key]) if key in loaded else str(getattr(record, key)) for key in keys
+    ]
+    width = RECORD_VALUE_WIDTH
+    if width is not None:
+        width = max(width, 3)
+        for i, value in enumerate(values):
+            if len(value) > width:
+                values[i] = value[: width - 3] + "..."
+    pairs = ", ".join(map("=".join, zip(keys, values)))
+    return f"{record_class.__name__}({pairs})"
 
 
 def get_current_time_utc() -> datetime.datetime:
     return datetime.datetime.now(tz=datetime.timezone.utc)
+
+
+def get_translated_schema(
+    conn: Union[Engine, Connection], schema: Optional[str]
+) -> Optional[str]:
+    """
+    Return the runtime name of a (placeholder) schema.
+
+    The schema_translate_map execution option of the connection is
+    applied, so e.g. CDM_SCHEMA is converted into the actual schema name.
+    Schemas that are not in the map are returned as-is.
+    """
+    schema_map = conn.get_execution_options().get("schema_translate_map") or {}
+    return schema_map.get(schema, schema)
+
+
+def get_table_class(base: type[DeclarativeBase], table_name: str) -> type[Any]:
+    """
+    Return the class mapped to a table of a DeclarativeBase.
+
+    Works for the regular CDM modules as well as for dynamic tables bound
+    to a custom Base, e.g. get_table_class(cdm54.Base, "person").
+    """
+    for mapper in base.registry.mappers:
+        if mapper.local_table.name == table_name:
+            return mapper.class_
+    raise KeyError(f"No class mapped to table {table_name}")
+
+
+def configure(*bases: type[DeclarativeBase], dialect: Optional[Dialect] = None) -> None:
+    """
+    Configure the mappers of the given Bases and compile their statements.
+
+    SQLAlchemy configures all mappers on the first query, which resolves
+    the string expressions of all relationships (e.g.
+    foreign_keys="ConditionOccurrence.condition_concept_id"), and builds
+    per-mapper caches on the first SELECT and INSERT of each table. Call
+    configure before forking worker processes (e.g. with multiprocessing
+    on Linux), so the workers inherit the configured mappers instead of
+    repeating this work. Pass the dialect of the engine, e.g.
+    configure(cdm54.Base, dialect=engine.dialect), to compile the
+    statements for the database that will be used.
+    """
+    for base in bases:
+        base.registry.configure()
+        for mapper in base.registry.mappers:
+            select(mapper.class_).compile(dialect=dialect)
+            insert(mapper.class_).compile(dialect=dialect)
+
+
+def connect(bind: Union[Engine, Connection]) -> AbstractContextManager[Connection]:
+    """
+    Return a context manager providing a connection.
+
+    For an Engine, a new connection is opened (and closed afterwards).
+    An existing Connection is used as-is, and is left open.
+    """
+    return bind.connect() if isinstance(bind, Engine) else nullcontext(bind)
+
+
+def copy_statement(
+    conn: Connection, table: Table, columns: list[str], options: str
+) -> str:
+    """
+    Return a PostgreSQL COPY FROM STDIN statement for a table.
+
+    The schema of the table is resolved via the schema_translate_map of
+    the connection. The options are added as-is, e.g. "FORMAT csv".
+    """
+    preparer = conn.dialect.identifier_preparer
+    schema = get_translated_schema(conn, table.schema)
+    target = preparer.quote(table.name)
+    if schema is not None:
+        target = f"{preparer.quote_schema(schema)}.{target}"
+    column_list = ", ".join(preparer.quote(c) for c in columns)
+    return f"COPY {target} ({column_list}) FROM STDIN WITH ({options})"
+
+
+def copy_from_stdin(conn: Connection, copy_sql: str, data: Union[str, bytes]) -> None:
+    """Run a COPY FROM STDIN statement via psycopg2 or psycopg 3."""
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        if hasattr(cursor, "copy_expert"):
+            # psycopg2
+            buffer = io.BytesIO(data) if isinstance(data, bytes) else io.StringIO(data)
+            cursor.copy_expert(copy_sql, buffer)
+        else:
+            # psycopg 3
+            with cursor.copy(copy_sql) as copy:
+                copy.write(data)
+    finally:
+        cursor.close()
+
+
+def copy_to_stdout(conn: Connection, copy_sql: str, file: BinaryIO) -> int:
+    """
+    Run a COPY TO STDOUT statement via psycopg2 or psycopg 3.
+
+    The output is written to a binary file as it is received, and the
+    number of copied rows is returned.
+    """
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        if hasattr(cursor, "copy_expert"):
+            # psycopg2
+            cursor.copy_expert(copy_sql, file)
+        else:
+            # psycopg 3
+            with cursor.copy(copy_sql) as copy:
+                for data in copy:
+                    file.write(data)
+        return cursor.rowcount
+    finally:
+        cursor.close()
@@ -1,14 +1,22 @@
 from contextlib import contextmanager
+from pathlib import Path
 from typing import Callable
 
 import pytest
-from sqlalchemy import Connection, Engine, MetaData, create_engine, select
-from sqlalchemy.orm import Session
+from sqlalchemy import Connection, Engine, MetaData, create_engine, event, select
+from sqlalchemy.orm import DeclarativeBase, Session
 from sqlalchemy.sql.ddl import CreateSchema, DropSchema
 from testcontainers.postgres import PostgresContainer
 
+import src.omop_cdm.dynamic.cdm54 as dynamic_cdm54
+import src.omop_cdm.regular.cdm54 as cdm54
+from src.omop_cdm.constants import CDM_SCHEMA, VOCAB_SCHEMA
+
 POSTGRES_IMAGE = "postgres:16-alpine"
 
+# SQLite has no schemas, so all tables are created in the main database.
+SQLITE_SCHEMA_MAP = {VOCAB_SCHEMA: None, CDM_SCHEMA: None}
+
 
 @pytest.fixture(scope="session")
 def pg_db_engine() -> Engine:
@@ -17,6 +25,37 @@ def pg_db_engine() -> Engine:
         yield engine
 
 
+@pytest.fixture
+def sqlite_engine(tmp_path: Path) -> Engine:
+    """SQLite database, for tests that don't need PostgreSQL."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'cdm.sqlite'}")
+    yield engine.execution_options(schema_translate_map=SQLITE_SCHEMA_MAP)
+    engine.dispose()
+
+
+@pytest.fixture
+def sqlite_cdm54_engine(sqlite_engine: Engine) -> Engine:
+    """SQLite database containing all tables of the regular CDM 5.4."""
+    create_all_tables(sqlite_engine, cdm54.Base.metadata)
+    return sqlite_engine
+
+
+@pytest.fixture
+def dynamic_cdm54_base() -> type[DeclarativeBase]:
+    """New (not yet configured) Base with all tables of the dynamic CDM 5.4."""
+
+    class Base(DeclarativeBase):
+        pass
+
+    # The registry only keeps weak references to the classes
+    Base.classes = [
+        type(name[4:-5], (getattr(dynamic_cdm54, name), Base), {})
+        for name in dir(dynamic_cdm54)
+        if name.startswith("Base") and name.endswith("Cdm54")
+    ]
+    return Base
+
+
 def create_schemas(schemas: set[str], conn: Connection) -> None:
     for schema in schemas:
         conn.execute(CreateSchema(schema, if_not_exists=True))
@@ -41,6 +80,17 @@ def create_all_tables(engine: Engine, metadata: MetaData) -> None:
         metadata.create_all(bind=conn)
 
 
+def count_queries(engine: Engine) -> list[str]:
+    """Return a list that collects the statements executed by the engine."""
+    statements = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    return statements
+
+
 def validate_relationships(engine: Engine, table: Callable) -> None:
     """
     Query any table to make SQLAlchemy validate table relationships.
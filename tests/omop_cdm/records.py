@@ -0,0 +1,80 @@
+"""Helpers to create CDM 5.4 records for tests."""
+
+import datetime
+from typing import Optional
+
+import src.omop_cdm.regular.cdm54 as cdm54
+
+VALID_START_DATE = datetime.date(1970, 1, 1)
+VALID_END_DATE = datetime.date(2099, 12, 31)
+
+
+def concept(
+    concept_id: int,
+    vocabulary_id: str = "SNOMED",
+    domain_id: str = "Condition",
+    concept_code: str = "",
+    standard_concept: str = "S",
+    concept_class_id: str = "Clinical Finding",
+    **kwargs,
+) -> cdm54.Concept:
+    return cdm54.Concept(
+        concept_id=concept_id,
+        concept_name=f"Concept {concept_id}",
+        domain_id=domain_id,
+        vocabulary_id=vocabulary_id,
+        concept_class_id=concept_class_id,
+        standard_concept=standard_concept,
+        concept_code=concept_code or str(concept_id),
+        valid_start_date=VALID_START_DATE,
+        valid_end_date=VALID_END_DATE,
+        **kwargs,
+    )
+
+
+def person(person_id: int) -> cdm54.Person:
+    return cdm54.Person(
+        person_id=person_id,
+        gender_concept_id=8507,
+        year_of_birth=1980,
+        race_concept_id=0,
+        ethnicity_concept_id=0,
+    )
+
+
+def condition_occurrence(
+    condition_occurrence_id: int,
+    person_id: int,
+    condition_concept_id: int,
+    start_date: datetime.date,
+    end_date: Optional[datetime.date] = None,
+) -> cdm54.ConditionOccurrence:
+    return cdm54.ConditionOccurrence(
+        condition_occurrence_id=condition_occurrence_id,
+        person_id=person_id,
+        condition_concept_id=condition_concept_id,
+        condition_start_date=start_date,
+        condition_end_date=end_date,
+        condition_type_concept_id=32817,
+    )
+
+
+def drug_exposure(
+    drug_exposure_id: int,
+    person_id: int,
+    drug_concept_id: int,
+    start_date: datetime.date,
+    end_date: datetime.date,
+    quantity: Optional[int] = None,
+    days_supply: Optional[int] = None,
+) -> cdm54.DrugExposure:
+    return cdm54.DrugExposure(
+        drug_exposure_id=drug_exposure_id,
+        person_id=person_id,
+        drug_concept_id=drug_concept_id,
+        drug_exposure_start_date=start_date,
+        drug_exposure_end_date=end_date,
+        drug_type_concept_id=32817,
+        quantity=quantity,
+        days_supply=days_supply,
+    )
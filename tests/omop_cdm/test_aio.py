@@ -0,0 +1,88 @@
+import asyncio
+import datetime
+
+import pytest
+from sqlalchemy import Engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session, selectinload
+
+import src.omop_cdm.regular.cdm54 as cdm54
+from src.omop_cdm.aio import (
+    get_concept_by_code,
+    get_concepts,
+    get_person_by_source_value,
+)
+from tests.conftest import SQLITE_SCHEMA_MAP
+from tests.omop_cdm.records import concept, condition_occurrence, person
+
+pytest.importorskip("aiosqlite")
+pytest.importorskip("greenlet")
+
+
+@pytest.fixture
+def engine(sqlite_cdm54_engine: Engine) -> Engine:
+    with Session(sqlite_cdm54_engine) as session:
+        session.add_all([concept(i) for i in (0, 8507, 32817)])
+        session.add(concept(100, concept_code="38341003"))
+        p = person(1)
+        p.person_source_value = "0009456b"
+        session.add(p)
+        session.add(condition_occurrence(1, 1, 100, datetime.date(2024, 1, 1)))
+        session.commit()
+    return sqlite_cdm54_engine
+
+
+def run(engine: Engine, query):
+    async def main():
+        url = engine.url.set(drivername="sqlite+aiosqlite")
+        async_engine = create_async_engine(url).execution_options(
+            schema_translate_map=SQLITE_SCHEMA_MAP
+        )
+        try:
+            async with AsyncSession(async_engine) as session:
+                return await query(session)
+        finally:
+            await async_engine.dispose()
+
+    return asyncio.run(main())
+
+
+def test_get_person_by_source_value(engine: Engine):
+    async def query(session: AsyncSession):
+        p = await get_person_by_source_value(
+            session,
+            "0009456b",
+            selectinload(cdm54.Person.condition_occurrences),
+            person_class=cdm54.Person,
+        )
+        missing = await get_person_by_source_value(
+            session, "unknown", person_class=cdm54.Person
+        )
+        (condition,) = p.condition_occurrences
+        gender_concept = await p.awaitable_attrs.gender_concept
+        return p.person_id, condition.condition_occurrence_id, gender_concept, missing
+
+    person_id, condition_id, gender_concept, missing = run(engine, query)
+    assert (person_id, condition_id, gender_concept.concept_id) == (1, 1, 8507)
+    assert missing is None
+
+
+def test_get_concept_by_code(engine: Engine):
+    async def query(session: AsyncSession):
+        return (
+            await get_concept_by_code(session, "SNOMED", "38341003", cdm54.Concept),
+            await get_concept_by_code(session, "ICD10", "38341003", cdm54.Concept),
+        )
+
+    found, missing = run(engine, query)
+    assert found.concept_id == 100
+    assert missing is None
+
+
+def test_get_concepts(engine: Engine):
+    async def query(session: AsyncSession):
+        return await get_concepts(session, [100, 8507, 100, 5], cdm54.Concept)
+
+    concepts = run(engine, query)
+    assert sorted(concepts) == [100, 8507]
+    assert concepts[100].concept_code == "38341003"
@@ -0,0 +1,72 @@
+from pathlib import Path
+
+import pytest
+from sqlalchemy import Engine
+from sqlalchemy.orm import Session
+
+import src.omop_cdm.regular.cdm54 as cdm54
+from src.omop_cdm.ancestor_index import ConceptAncestorIndex
+
+# 1 -> 2 -> 3, 1 -> 4
+ROWS = [
+    (1, 1, 0, 0),
+    (1, 2, 1, 1),
+    (1, 3, 2, 2),
+    (1, 4, 1, 1),
+    (2, 2, 0, 0),
+    (2, 3, 1, 1),
+    (3, 3, 0, 0),
+    (4, 4, 0, 0),
+]
+
+
+@pytest.fixture
+def index() -> ConceptAncestorIndex:
+    return ConceptAncestorIndex.from_rows(ROWS)
+
+
+def check_index(index: ConceptAncestorIndex):
+    assert len(index) == len(ROWS)
+    assert index.descendants([1]) == {1, 2, 3, 4}
+    assert index.descendants([2, 4]) == {2, 3, 4}
+    assert index.descendants([1], max_levels=1) == {1, 2, 4}
+    assert index.descendants([99]) == set()
+    assert index.ancestors([3]) == {1, 2, 3}
+    assert index.ancestors([3], max_levels=1) == {2, 3}
+    assert index.separation(1, 3) == (2, 2)
+    assert index.separation(3, 1) is None
+
+
+def test_descendants_and_ancestors_are_found(index: ConceptAncestorIndex):
+    check_index(index)
+
+
+def test_index_is_saved_and_memory_mapped(index: ConceptAncestorIndex, tmp_path: Path):
+    path = tmp_path / "concept_ancestor.idx"
+    index.save(path)
+    with ConceptAncestorIndex.load(path) as loaded:
+        check_index(loaded)
+
+
+def test_invalid_file_is_rejected(tmp_path: Path):
+    path = tmp_path / "invalid.idx"
+    path.write_bytes(b"\0" * 64)
+    with pytest.raises(ValueError, match="not a concept ancestor index"):
+        ConceptAncestorIndex.load(path)
+
+
+def test_index_is_built_from_database(sqlite_cdm54_engine: Engine):
+    with Session(sqlite_cdm54_engine) as session:
+        session.add_all(
+            cdm54.ConceptAncestor(
+                ancestor_concept_id=a,
+                descendant_concept_id=d,
+                min_levels_of_separation=mn,
+                max_levels_of_separation=mx,
+            )
+            for a, d, mn, mx in ROWS
+        )
+        session.commit()
+    check_index(
+        ConceptAncestorIndex.from_database(sqlite_cdm54_engine, cdm54.ConceptAncestor)
+    )
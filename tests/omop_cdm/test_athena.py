@@ -0,0 +1,73 @@
+import datetime
+from pathlib import Path
+
+import pytest
+from sqlalchemy import Engine, select
+from sqlalchemy.orm import Session
+
+import src.omop_cdm.regular.cdm54 as cdm54
+from src.omop_cdm.athena import (
+    _convert_line,
+    find_vocabulary_table,
+    load_athena_vocabulary,
+)
+from src.omop_cdm.constants import CDM_SCHEMA, VOCAB_SCHEMA
+from src.omop_cdm.ddl import create_all_deferred
+from tests.conftest import temp_schemas
+
+SCHEMA_MAP = {VOCAB_SCHEMA: "athena_vocab", CDM_SCHEMA: "athena_cdm"}
+
+CONCEPT_CSV = (
+    "concept_id\tconcept_name\tdomain_id\tvocabulary_id\tconcept_class_id\t"
+    "standard_concept\tconcept_code\tvalid_start_date\tvalid_end_date\tinvalid_reason\n"
+    '8507\tMALE "M"\tGender\tGender\tGender\tS\tM\t19700101\t20991231\t\n'
+    "8532\tFEMALE\\F\tGender\tGender\tGender\tS\tF\t19700101\t20991231\t\n"
+)
+VOCABULARY_CSV = (
+    "vocabulary_id\tvocabulary_name\tvocabulary_reference\tvocabulary_version\t"
+    "vocabulary_concept_id\n"
+    "Gender\tOMOP Gender\tOMOP generated\t\t44819108\n"
+)
+
+
+@pytest.fixture
+def athena_dir(tmp_path: Path) -> Path:
+    (tmp_path / "CONCEPT.csv").write_text(CONCEPT_CSV, encoding="utf-8")
+    (tmp_path / "VOCABULARY.csv").write_text(VOCABULARY_CSV, encoding="utf-8")
+    return tmp_path
+
+
+def test_athena_line_is_converted_to_copy_format():
+    line = "1\tname\\x\t20200131\t\n"
+    assert _convert_line(line, [2]) == "1\tname\\\\x\t2020-01-31\t\n"
+
+
+def test_athena_file_is_matched_to_table():
+    table = find_vocabulary_table(cdm54.Base.metadata, Path("CONCEPT_ANCESTOR.csv"))
+    assert table is cdm54.ConceptAncestor.__table__
+    with pytest.raises(ValueError, match="No vocabulary table"):
+        find_vocabulary_table(cdm54.Base.metadata, Path("PERSON.csv"))
+
+
+def test_athena_files_are_loaded(pg_db_engine: Engine, athena_dir: Path):
+    engine = pg_db_engine.execution_options(schema_translate_map=SCHEMA_MAP)
+    progress = []
+    with temp_schemas(engine=engine, schemas=set(SCHEMA_MAP.values())):
+        with engine.begin() as conn:
+            create_all_deferred(conn, cdm54.Base.metadata)
+            row_counts = load_athena_vocabulary(
+                conn,
+                cdm54.Base.metadata,
+                athena_dir,
+                chunk_size=1,
+                progress=progress.append,
+            )
+        assert row_counts == {"concept": 2, "vocabulary": 1}
+        assert [p.rows for p in progress if p.table == "concept"] == [1, 2]
+        with Session(engine) as session:
+            concepts = session.scalars(
+                select(cdm54.Concept).order_by(cdm54.Concept.concept_id)
+            ).all()
+            assert [c.concept_name for c in concepts] == ['MALE "M"', "FEMALE\\F"]
+            assert concepts[0].valid_start_date == datetime.date(1970, 1, 1)
+            assert concepts[0].invalid_reason is None
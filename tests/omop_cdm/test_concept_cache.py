@@ -0,0 +1,101 @@
+import pytest
+from sqlalchemy import Engine, event
+from sqlalchemy.orm import Session
+
+import src.omop_cdm.regular.cdm54 as cdm54
+from src.omop_cdm.concept_cache import ConceptCache
+from tests.omop_cdm.records import concept
+
+
+@pytest.fixture
+def concept_engine(sqlite_cdm54_engine: Engine) -> Engine:
+    with Session(sqlite_cdm54_engine) as session:
+        session.add_all([concept(i) for i in range(1, 6)])
+        session.add_all(
+            [
+                concept(i, vocabulary_id="LOINC", domain_id="Measurement")
+                for i in range(6, 9)
+            ]
+        )
+        session.commit()
+    return sqlite_cdm54_engine
+
+
+@pytest.fixture
+def statements(concept_engine: Engine) -> list[str]:
+    executed = []
+
+    @event.listens_for(concept_engine, "before_cursor_execute")
+    def log_statement(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    return executed
+
+
+def test_concept_is_cached(concept_engine: Engine, statements: list[str]):
+    cache = ConceptCache(concept_engine, cdm54.Concept)
+    assert cache.get(1).concept_name == "Concept 1"
+    assert cache.get(1).concept_name == "Concept 1"
+    assert cache.get(100) is None
+    assert len(statements) == 2
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_concept_is_cached_by_code(concept_engine: Engine, statements: list[str]):
+    cache = ConceptCache(concept_engine, cdm54.Concept)
+    assert cache.get_by_code("LOINC", "7").concept_id == 7
+    assert cache.get(7).concept_code == "7"
+    assert cache.get_by_code("LOINC", "7").concept_id == 7
+    assert len(statements) == 1
+
+
+def test_nonexistent_concept_is_cached(concept_engine: Engine, statements: list[str]):
+    cache = ConceptCache(concept_engine, cdm54.Concept)
+    assert cache.get(100) is None
+    assert cache.get_many([1, 100]).keys() == {1}
+    assert cache.get_by_code("LOINC", "100") is None
+    assert cache.get_by_code("LOINC", "100") is None
+    assert len(statements) == 3
+    assert (cache.hits, cache.misses) == (2, 3)
+    assert 100 not in cache
+    assert len(cache) == 3
+
+
+def test_nonexistent_concept_is_evicted(concept_engine: Engine, statements: list[str]):
+    cache = ConceptCache(concept_engine, cdm54.Concept, max_size=2)
+    cache.get(100)
+    cache.get_many([1, 2])
+    assert cache.get(100) is None
+    assert len(statements) == 3
+    assert 1 not in cache
+    assert len(cache) == 2
+
+
+def test_missing_concepts_are_fetched_in_one_query(
+    concept_engine: Engine, statements: list[str]
+):
+    cache = ConceptCache(concept_engine, cdm54.Concept)
+    cache.get(1)
+    concepts = cache.get_many([1, 2, 3, 100])
+    assert sorted(concepts) == [1, 2, 3]
+    assert len(statements) == 2
+    assert (cache.hits, cache.misses) == (1, 4)
+
+
+def test_least_recently_used_concept_is_evicted(concept_engine: Engine):
+    cache = ConceptCache(concept_engine, cdm54.Concept, max_size=2)
+    cache.get_many([1, 2])
+    cache.get(1)
+    cache.get(3)
+    assert 1 in cache
+    assert 2 not in cache
+    assert len(cache) == 2
+
+
+def test_cache_is_warmed_per_vocabulary(concept_engine: Engine, statements: list[str]):
+    cache = ConceptCache(concept_engine, cdm54.Concept)
+    assert cache.warm(vocabulary_ids=["LOINC"]) == 3
+    assert cache.warm(domain_ids=["Condition"]) == 5
+    assert sorted(cache.get_many(range(1, 9))) == list(range(1, 9))
+    assert len(statements) == 2
+    assert cache.hit_ratio == 1.0
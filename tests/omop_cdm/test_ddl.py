@@ -0,0 +1,113 @@
+import pytest
+from sqlalchemy import Engine, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.schema import CreateTable
+
+import src.omop_cdm.regular.cdm54 as cdm54
+from src.omop_cdm.ddl import (
+    SHARE,
+    DeferredSchema,
+    ValidateConstraint,
+    _plan_parallel_build,
+    create_all_deferred,
+)
+from tests.omop_cdm.dynamic.cdm_definitions import cdm54 as dynamic_cdm54
+from tests.omop_cdm.table_sets import CDM54_NON_VOCAB, CUSTOM, VOCAB
+
+
+@pytest.mark.parametrize(
+    ("metadata", "tables"),
+    [
+        (cdm54.Base.metadata, VOCAB | CDM54_NON_VOCAB),
+        (dynamic_cdm54.Base.metadata, VOCAB | CDM54_NON_VOCAB | CUSTOM),
+    ],
+)
+def test_indexes_are_built_after_table_creation(
+    sqlite_engine: Engine, metadata, tables
+):
+    with sqlite_engine.begin() as conn:
+        deferred = create_all_deferred(conn, metadata)
+    assert set(inspect(sqlite_engine).get_table_names()) == tables
+    assert inspect(sqlite_engine).get_indexes("measurement") == []
+
+    with sqlite_engine.begin() as conn:
+        deferred.build(conn)
+    index_names = {
+        ix["name"] for ix in inspect(sqlite_engine).get_indexes("measurement")
+    }
+    assert "ix_measurement_person_id" in index_names
+
+
+def test_foreign_keys_are_not_created_with_tables(sqlite_engine: Engine):
+    with sqlite_engine.begin() as conn:
+        create_all_deferred(conn, cdm54.Base.metadata)
+    assert inspect(sqlite_engine).get_foreign_keys("condition_occurrence") == []
+
+
+def test_deferred_statements_use_naming_convention():
+    deferred = DeferredSchema(
+        cdm54.Base.metadata, [cdm54.ConditionOccurrence.__table__]
+    )
+    statements = [
+        str(s.compile(dialect=postgresql.dialect()))
+        for s in deferred.statements(postgresql.dialect())
+    ]
+    assert "CREATE INDEX ix_condition_occurrence_person_id" in "\n".join(statements)
+    assert any(
+        "ADD CONSTRAINT fk_condition_occurrence_person_id_person FOREIGN KEY(person_id)"
+        in s
+        for s in statements
+    )
+    assert len(statements) == len(deferred.indexes) + len(deferred.foreign_keys)
+
+
+def test_foreign_keys_are_skipped_without_alter_support():
+    deferred = DeferredSchema(
+        cdm54.Base.metadata, [cdm54.ConditionOccurrence.__table__]
+    )
+    assert len(deferred.statements(sqlite.dialect())) == len(deferred.indexes)
+
+
+def test_deferred_statements_leave_create_table_intact():
+    deferred = DeferredSchema(cdm54.Base.metadata)
+    deferred.statements(postgresql.dialect())
+    _plan_parallel_build(deferred, postgresql.dialect())
+    _plan_parallel_build(deferred, sqlite.dialect())
+    # Creating the constraints separately must not mark them as such
+    sql = str(
+        CreateTable(cdm54.ConditionOccurrence.__table__).compile(
+            dialect=postgresql.dialect()
+        )
+    )
+    assert "FOREIGN KEY(person_id) REFERENCES cdm_schema.person" in sql
+
+
+def test_indexes_are_built_in_parallel(sqlite_engine: Engine):
+    with sqlite_engine.begin() as conn:
+        deferred = create_all_deferred(conn, cdm54.Base.metadata)
+    timings = deferred.build_parallel(sqlite_engine, workers=3)
+    assert len(timings) == len(deferred.indexes)
+    assert all(t.seconds >= 0 for t in timings)
+    index_names = {ix["name"] for ix in inspect(sqlite_engine).get_indexes("concept")}
+    assert "ix_concept_vocabulary_id" in index_names
+
+
+def test_postgres_foreign_keys_are_validated_concurrently():
+    deferred = DeferredSchema(cdm54.Base.metadata)
+    serial, tasks = _plan_parallel_build(deferred, postgresql.dialect())
+    assert len(serial) == len(deferred.foreign_keys)
+    validate_tasks = [t for t in tasks if isinstance(t.statement, ValidateConstraint)]
+    assert len(validate_tasks) == len(deferred.foreign_keys)
+    sql = str(serial[0].compile(dialect=postgresql.dialect()))
+    assert sql.endswith("NOT VALID")
+
+    by_table = {}
+    for task in validate_tasks:
+        by_table.setdefault(task.statement.element.table.name, []).append(task)
+    # FKs of different tables referring to concept don't block each other
+    assert not by_table["person"][0].conflicts_with(by_table["measurement"][0])
+    # FKs of the same table are validated one at a time
+    assert by_table["person"][0].conflicts_with(by_table["person"][1])
+    # Index creation and FK validation on the same table conflict
+    index_task = next(t for t in tasks if t.locks == {"cdm_schema.person": SHARE})
+    assert index_task.conflicts_with(by_table["person"][0])
@@ -0,0 +1,127 @@
+import csv
+import datetime
+import gzip
+import io
+from pathlib import Path
+
+import pytest
+from sqlalchemy import Engine
+from sqlalchemy.orm import Session
+
+import src.omop_cdm.regular.cdm54 as cdm54
+from src.omop_cdm.constants import CDM_SCHEMA, VOCAB_SCHEMA
+from src.omop_cdm.ddl import create_all_deferred
+from src.omop_cdm.delimited import (
+    OHDSI_CSV,
+    DelimitedFormat,
+    _to_char_pattern,
+    export_cdm,
+    export_table,
+)
+from tests.conftest import temp_schemas
+from tests.omop_cdm.records import concept, condition_occurrence
+
+SCHEMA_MAP = {VOCAB_SCHEMA: "delimited_vocab", CDM_SCHEMA: "delimited_cdm"}
+
+
+def add_records(engine: Engine) -> None:
+    with Session(engine) as session:
+        session.add_all([concept(0), concept(8507, concept_code='M\t"M"')])
+        session.add(
+            cdm54.Person(
+                person_id=1,
+                gender_concept_id=8507,
+                year_of_birth=1980,
+                birth_datetime=datetime.datetime(1980, 5, 17, 8, 30),
+                race_concept_id=0,
+                ethnicity_concept_id=0,
+                person_source_value="",
+            )
+        )
+        session.add(condition_occurrence(1, 1, 0, datetime.date(2024, 1, 31)))
+        session.commit()
+
+
+def read_tsv(path: Path) -> list[dict[str, str]]:
+    with gzip.open(path, "rt", encoding="utf-8", newline="") as f:
+        return list(csv.DictReader(f, delimiter="\t"))
+
+
+@pytest.fixture
+def cdm_engine(sqlite_cdm54_engine: Engine) -> Engine:
+    add_records(sqlite_cdm54_engine)
+    return sqlite_cdm54_engine
+
+
+def test_table_is_exported(cdm_engine: Engine, tmp_path: Path):
+    assert export_table(cdm_engine, cdm54.Person, tmp_path) == 1
+    (person,) = read_tsv(tmp_path / "person.tsv.gz")
+    assert person["person_id"] == "1"
+    assert person["birth_datetime"] == "1980-05-17 08:30:00"
+    assert person["month_of_birth"] == ""
+    assert list(person)[:3] == ["person_id", "gender_concept_id", "year_of_birth"]
+
+
+def test_values_are_quoted(cdm_engine: Engine, tmp_path: Path):
+    export_table(cdm_engine, cdm54.Concept, tmp_path)
+    concepts = read_tsv(tmp_path / "concept.tsv.gz")
+    assert [c["concept_code"] for c in concepts] == ["0", 'M\t"M"']
+    assert concepts[0]["valid_start_date"] == "1970-01-01"
+
+
+def test_empty_strings_are_not_null(cdm_engine: Engine, tmp_path: Path):
+    export_table(cdm_engine, cdm54.Person, tmp_path, compression=None)
+    header, line = (tmp_path / "person.tsv").read_text().splitlines()
+    person = dict(zip(header.split("\t"), line.split("\t")))
+    assert person["person_source_value"] == '""'
+    assert person["gender_source_value"] == ""
+
+
+def test_cdm_is_exported(cdm_engine: Engine, tmp_path: Path):
+    row_counts = export_cdm(
+        cdm_engine, cdm54.Base, tmp_path, tables=["person", "condition_occurrence"]
+    )
+    assert row_counts == {"condition_occurrence": 1, "person": 1}
+    (condition,) = read_tsv(tmp_path / "condition_occurrence.tsv.gz")
+    assert condition["condition_start_date"] == "2024-01-31"
+
+
+def test_empty_table_is_exported(cdm_engine: Engine, tmp_path: Path):
+    file_format = DelimitedFormat(delimiter=",", date_format="%Y%m%d")
+    assert export_table(cdm_engine, cdm54.Death, tmp_path, file_format, None) == 0
+    header = (tmp_path / "death.csv").read_text().splitlines()
+    assert header == [",".join(cdm54.Death.__table__.columns.keys())]
+
+
+def test_zstd_compression(cdm_engine: Engine, tmp_path: Path):
+    zstandard = pytest.importorskip("zstandard")
+    export_table(cdm_engine, cdm54.Concept, tmp_path, OHDSI_CSV, "zstd")
+    with (tmp_path / "concept.csv.zst").open("rb") as f:
+        data = zstandard.ZstdDecompressor().stream_reader(f).read()
+    rows = list(csv.reader(io.StringIO(data.decode())))
+    assert [row[0] for row in rows] == ["concept_id", "0", "8507"]
+
+
+def test_date_formats():
+    assert _to_char_pattern("%Y%m%d") == "YYYYMMDD"
+    assert _to_char_pattern("%d/%m/%Y %H:%M") == 'DD"/"MM"/"YYYY" "HH24":"MI'
+    with pytest.raises(ValueError, match="Unsupported date format directive %b"):
+        DelimitedFormat(date_format="%d %b %Y")
+
+
+def test_cdm_is_exported_from_postgres(pg_db_engine: Engine, tmp_path: Path):
+    engine = pg_db_engine.execution_options(schema_translate_map=SCHEMA_MAP)
+    with temp_schemas(engine=engine, schemas=set(SCHEMA_MAP.values())):
+        with engine.begin() as conn:
+            create_all_deferred(conn, cdm54.Base.metadata)
+        add_records(engine)
+        row_counts = export_cdm(engine, cdm54.Base, tmp_path, workers=2)
+        assert row_counts["concept"] == 2
+        assert row_counts["person"] == 1
+        (person,) = read_tsv(tmp_path / "person.tsv.gz")
+        assert person["birth_datetime"] == "1980-05-17 08:30:00"
+        assert person["month_of_birth"] == ""
+        with gzip.open(tmp_path / "person.tsv.gz", "rt") as f:
+            assert '\t""\t' in f.read()
+        concepts = read_tsv(tmp_path / "concept.tsv.gz")
+        assert sorted(c["concept_code"] for c in concepts) == ["0", 'M\t"M"']
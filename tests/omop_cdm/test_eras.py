@@ -0,0 +1,300 @@
+import datetime
+
+import pytest
+from sqlalchemy import Engine, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+
+import src.omop_cdm.regular.cdm54 as cdm54
+from src.omop_cdm.constants import CDM_SCHEMA, VOCAB_SCHEMA
+from src.omop_cdm.ddl import create_all_deferred
+from src.omop_cdm.eras import (
+    PYTHON,
+    SQL,
+    _fingerprints,
+    add_days,
+    build_condition_eras,
+    build_dose_eras,
+    build_drug_eras,
+    changed_person_ids,
+    update_eras,
+)
+from tests.conftest import temp_schemas
+from tests.omop_cdm.records import (
+    VALID_END_DATE,
+    VALID_START_DATE,
+    concept,
+    condition_occurrence,
+    drug_exposure,
+)
+
+SCHEMA_MAP = {VOCAB_SCHEMA: "eras_vocab", CDM_SCHEMA: "eras_cdm"}
+
+
+def day(month: int, day: int) -> datetime.date:
+    return datetime.date(2024, month, day)
+
+
+def at_midnight(date: datetime.date) -> datetime.datetime:
+    return datetime.datetime.combine(date, datetime.time())
+
+
+def add_condition_occurrences(engine: Engine) -> None:
+    with Session(engine) as session:
+        session.add_all(
+            [
+                # Person 1: two eras of concept 100, one of concept 200
+                condition_occurrence(1, 1, 100, day(1, 1), day(1, 10)),
+                condition_occurrence(2, 1, 100, day(2, 5)),
+                condition_occurrence(3, 1, 100, day(1, 3), day(1, 5)),
+                condition_occurrence(4, 1, 100, day(5, 1), day(5, 2)),
+                condition_occurrence(5, 1, 200, day(1, 1)),
+                # Person 2: no mapped concept
+                condition_occurrence(6, 2, 0, day(1, 1)),
+                # Person 3: one era, overlapping occurrences
+                condition_occurrence(7, 3, 100, day(3, 1), day(3, 31)),
+                condition_occurrence(8, 3, 100, day(3, 10), day(3, 12)),
+            ]
+        )
+        session.commit()
+
+
+@pytest.fixture
+def condition_engine(sqlite_cdm54_engine: Engine) -> Engine:
+    add_condition_occurrences(sqlite_cdm54_engine)
+    return sqlite_cdm54_engine
+
+
+@pytest.fixture
+def drug_engine(sqlite_cdm54_engine: Engine) -> Engine:
+    ingredient, drug, mg, ml = 1000, 1001, 8576, 8587
+    with Session(sqlite_cdm54_engine) as session:
+        session.add_all(
+            [
+                concept(ingredient, domain_id="Drug", concept_class_id="Ingredient"),
+                concept(drug, domain_id="Drug", concept_class_id="Clinical Drug"),
+                ancestor(ingredient, ingredient),
+                ancestor(ingredient, drug),
+                strength(drug, ingredient, amount_value=500, amount_unit_concept_id=mg),
+                strength(
+                    ingredient,
+                    ingredient,
+                    numerator_value=100,
+                    numerator_unit_concept_id=ml,
+                ),
+                # Person 1: overlapping exposures, and one within 30 days
+                drug_exposure(1, 1, drug, day(1, 1), day(1, 10), 10, 10),
+                drug_exposure(2, 1, drug, day(1, 5), day(1, 14), 20, 10),
+                drug_exposure(3, 1, ingredient, day(2, 1), day(2, 6), 5, 5),
+                drug_exposure(4, 1, drug, day(6, 1), day(6, 2), 2, 1),
+                # Person 2: no mapped concept
+                drug_exposure(5, 2, 0, day(1, 1), day(1, 2)),
+            ]
+        )
+        session.commit()
+    return sqlite_cdm54_engine
+
+
+def ancestor(ancestor_id: int, descendant_id: int) -> cdm54.ConceptAncestor:
+    levels = 0 if ancestor_id == descendant_id else 1
+    return cdm54.ConceptAncestor(
+        ancestor_concept_id=ancestor_id,
+        descendant_concept_id=descendant_id,
+        min_levels_of_separation=levels,
+        max_levels_of_separation=levels,
+    )
+
+
+def strength(drug_id: int, ingredient_id: int, **kwargs) -> cdm54.DrugStrength:
+    return cdm54.DrugStrength(
+        drug_concept_id=drug_id,
+        ingredient_concept_id=ingredient_id,
+        valid_start_date=VALID_START_DATE,
+        valid_end_date=VALID_END_DATE,
+        **kwargs,
+    )
+
+
+def rows(engine: Engine, era_class: type, *columns: str) -> list[tuple]:
+    id_column = era_class.__table__.primary_key.columns[0]
+    statement = select(*(getattr(era_class, c) for c in columns)).order_by(id_column)
+    with engine.connect() as conn:
+        return [tuple(row) for row in conn.execute(statement)]
+
+
+def eras(engine: Engine) -> list[tuple]:
+    return rows(
+        engine,
+        cdm54.ConditionEra,
+        "person_id",
+        "condition_concept_id",
+        "condition_era_start_date",
+        "condition_era_end_date",
+        "condition_occurrence_count",
+    )
+
+
+@pytest.mark.parametrize("method", [SQL, PYTHON])
+def test_condition_eras_are_built(condition_engine: Engine, method: str):
+    with condition_engine.begin() as conn:
+        assert build_condition_eras(conn, cdm54.Base, method=method) == 4
+    assert eras(condition_engine) == [
+        (1, 100, at_midnight(day(1, 1)), at_midnight(day(2, 6)), 3),
+        (1, 100, at_midnight(day(5, 1)), at_midnight(day(5, 2)), 1),
+        (1, 200, at_midnight(day(1, 1)), at_midnight(day(1, 2)), 1),
+        (3, 100, at_midnight(day(3, 1)), at_midnight(day(3, 31)), 2),
+    ]
+
+
+@pytest.mark.parametrize("method", [SQL, PYTHON])
+def test_gap_is_configurable(condition_engine: Engine, method: str):
+    with condition_engine.begin() as conn:
+        build_condition_eras(conn, cdm54.Base, gap_days=0, method=method)
+    person_1_eras = [e for e in eras(condition_engine) if e[:2] == (1, 100)]
+    assert len(person_1_eras) == 3
+
+
+def test_eras_are_replaced_for_given_persons(condition_engine: Engine):
+    with condition_engine.begin() as conn:
+        build_condition_eras(conn, cdm54.Base)
+        assert build_condition_eras(conn, cdm54.Base, person_ids=[3]) == 1
+    assert eras(condition_engine)[-1][0] == 3
+    assert len(eras(condition_engine)) == 4
+
+
+@pytest.mark.parametrize("method", [SQL, PYTHON])
+def test_drug_eras_are_built_per_ingredient(drug_engine: Engine, method: str):
+    with drug_engine.begin() as conn:
+        assert build_drug_eras(conn, cdm54.Base, method=method, partitions=2) == 2
+    assert rows(
+        drug_engine,
+        cdm54.DrugEra,
+        "person_id",
+        "drug_concept_id",
+        "drug_era_start_date",
+        "drug_era_end_date",
+        "drug_exposure_count",
+        "gap_days",
+    ) == [
+        (1, 1000, at_midnight(day(1, 1)), at_midnight(day(2, 6)), 3, 18),
+        (1, 1000, at_midnight(day(6, 1)), at_midnight(day(6, 2)), 1, 0),
+    ]
+
+
+@pytest.mark.parametrize("method", [SQL, PYTHON])
+def test_dose_eras_are_built_per_dose(drug_engine: Engine, method: str):
+    with drug_engine.begin() as conn:
+        assert build_dose_eras(conn, cdm54.Base, method=method) == 4
+    dose_eras = rows(
+        drug_engine,
+        cdm54.DoseEra,
+        "unit_concept_id",
+        "dose_value",
+        "dose_era_start_date",
+        "dose_era_end_date",
+    )
+    assert sorted(dose_eras) == [
+        (8576, 500, at_midnight(day(1, 1)), at_midnight(day(1, 10))),
+        (8576, 1000, at_midnight(day(1, 5)), at_midnight(day(1, 14))),
+        (8576, 1000, at_midnight(day(6, 1)), at_midnight(day(6, 2))),
+        (8587, 100, at_midnight(day(2, 1)), at_midnight(day(2, 6))),
+    ]
+
+
+def test_eras_are_updated_for_changed_persons(condition_engine: Engine):
+    assert update_eras(condition_engine, cdm54.Base, "condition_era") == 3
+    assert len(eras(condition_engine)) == 4
+    with condition_engine.connect() as conn:
+        assert changed_person_ids(conn, cdm54.Base, "condition_era") == []
+
+    with Session(condition_engine) as session:
+        # Person 1 gets a new occurrence, joining both eras of concept 100
+        session.add(condition_occurrence(9, 1, 100, day(3, 1), day(4, 10)))
+        # Person 2 gets a mapped concept
+        session.get(cdm54.ConditionOccurrence, 6).condition_concept_id = 300
+        # Person 3 no longer has any occurrences
+        for occurrence_id in (7, 8):
+            session.delete(session.get(cdm54.ConditionOccurrence, occurrence_id))
+        session.commit()
+    with condition_engine.connect() as conn:
+        assert changed_person_ids(conn, cdm54.Base, "condition_era") == [1, 2, 3]
+
+    assert update_eras(condition_engine, cdm54.Base, "condition_era", 2) == 3
+    assert sorted(eras(condition_engine)) == [
+        (1, 100, at_midnight(day(1, 1)), at_midnight(day(5, 2)), 5),
+        (1, 200, at_midnight(day(1, 1)), at_midnight(day(1, 2)), 1),
+        (2, 300, at_midnight(day(1, 1)), at_midnight(day(1, 2)), 1),
+    ]
+    assert update_eras(condition_engine, cdm54.Base, "condition_era") == 0
+
+
+def test_eras_are_updated_for_given_persons(condition_engine: Engine):
+    update_eras(condition_engine, cdm54.Base, "condition_era")
+    with Session(condition_engine) as session:
+        session.add(condition_occurrence(9, 2, 200, day(1, 1)))
+        session.get(cdm54.ConditionOccurrence, 7).condition_concept_id = 200
+        session.commit()
+    # Only the given persons are rebuilt, without looking for other changes
+    assert (
+        update_eras(condition_engine, cdm54.Base, "condition_era", person_ids=[2]) == 1
+    )
+    assert (2, 200) in [era[:2] for era in eras(condition_engine)]
+    with condition_engine.connect() as conn:
+        assert changed_person_ids(conn, cdm54.Base, "condition_era") == [3]
+
+
+def test_postgres_fingerprints_hash_all_events():
+    sql = str(
+        _fingerprints(postgresql.dialect(), cdm54.Base, "condition_era").compile(
+            dialect=postgresql.dialect()
+        )
+    )
+    assert "md5(string_agg(concat_ws(" in sql
+    assert "ORDER BY cdm_schema.condition_occurrence.condition_occurrence_id" in sql
+
+
+def test_add_days_compiles_for_postgres():
+    sql = str(
+        add_days(cdm54.ConditionEra.condition_era_end_date, -30).compile(
+            dialect=postgresql.dialect()
+        )
+    )
+    assert "AS TIMESTAMP) + make_interval(days => %(add_days_1)s" in sql
+
+
+def test_condition_eras_are_built_in_postgres(pg_db_engine: Engine):
+    engine = pg_db_engine.execution_options(schema_translate_map=SCHEMA_MAP)
+    with temp_schemas(engine=engine, schemas=set(SCHEMA_MAP.values())):
+        with engine.begin() as conn:
+            create_all_deferred(conn, cdm54.Base.metadata)
+        add_condition_occurrences(engine)
+        with engine.begin() as conn:
+            assert build_condition_eras(conn, cdm54.Base) == 4
+        assert eras(engine)[0] == (
+            1,
+            100,
+            at_midnight(day(1, 1)),
+            at_midnight(day(2, 6)),
+            3,
+        )
+
+
+def test_changes_that_cancel_out_are_detected_in_postgres(pg_db_engine: Engine):
+    engine = pg_db_engine.execution_options(schema_translate_map=SCHEMA_MAP)
+    with temp_schemas(engine=engine, schemas=set(SCHEMA_MAP.values())):
+        with engine.begin() as conn:
+            create_all_deferred(conn, cdm54.Base.metadata)
+        add_condition_occurrences(engine)
+        assert update_eras(engine, cdm54.Base, "condition_era") == 3
+        with Session(engine) as session:
+            # Person 1: the concepts of two occurrences are swapped
+            session.get(cdm54.ConditionOccurrence, 4).condition_concept_id = 200
+            session.get(cdm54.ConditionOccurrence, 5).condition_concept_id = 100
+            # Person 3: one start date moves a day later, the other a day earlier
+            occurrence = session.get(cdm54.ConditionOccurrence, 7)
+            occurrence.condition_start_date = day(3, 2)
+            occurrence = session.get(cdm54.ConditionOccurrence, 8)
+            occurrence.condition_start_date = day(3, 9)
+            session.commit()
+        with engine.connect() as conn:
+            assert changed_person_ids(conn, cdm54.Base, "condition_era") == [1, 3]
@@ -0,0 +1,113 @@
+import datetime
+
+import pytest
+from sqlalchemy import Engine, insert, select, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+import src.omop_cdm.regular.cdm54 as cdm54
+from src.omop_cdm.instrumentation import OTHER, Histogram, QueryMetrics, instrument
+from tests.omop_cdm.records import concept, condition_occurrence
+
+
+@pytest.fixture
+def metrics(sqlite_cdm54_engine: Engine) -> QueryMetrics:
+    metrics = instrument(sqlite_cdm54_engine, cdm54.Base)
+    yield metrics
+    metrics.detach(sqlite_cdm54_engine)
+
+
+def test_histogram():
+    histogram = Histogram([1, 10])
+    for value in (0, 1, 5, 50):
+        histogram.observe(value)
+    assert histogram.cumulative() == [("1", 2), ("10", 3), ("+Inf", 4)]
+    assert (histogram.count, histogram.sum) == (4, 56)
+
+
+def test_statements_per_table(sqlite_cdm54_engine: Engine, metrics: QueryMetrics):
+    with Session(sqlite_cdm54_engine) as session:
+        session.add_all([concept(0), concept(8507)])
+        session.commit()
+        persons = [
+            {
+                "person_id": person_id,
+                "gender_concept_id": 8507,
+                "year_of_birth": 1980,
+                "race_concept_id": 0,
+                "ethnicity_concept_id": 0,
+            }
+            for person_id in (1, 2)
+        ]
+        session.execute(insert(cdm54.Person), persons)
+        session.add(condition_occurrence(1, 1, 0, datetime.date(2024, 1, 1)))
+        session.commit()
+        session.scalars(
+            select(cdm54.Person).join(cdm54.Person.condition_occurrences)
+        ).all()
+        session.execute(text("SELECT count(*) FROM person")).scalar()
+        session.execute(text("SELECT 1")).scalar()
+        session.execute(text("PRAGMA foreign_keys")).scalar()
+
+    result = metrics.as_dict()
+    assert result["person"]["insert"]["statements"] == 1
+    assert result["person"]["insert"]["rows"]["count"] == 1
+    assert result["person"]["insert"]["rows"]["sum"] == 2
+    # The ORM join and the textual query
+    assert result["person"]["select"]["statements"] == 2
+    assert result["condition_occurrence"]["select"]["statements"] == 1
+    assert result["condition_occurrence"]["insert"]["statements"] == 1
+    assert result[OTHER]["select"]["statements"] == 1
+    assert result[OTHER][OTHER]["statements"] == 1
+    latency = result["person"]["select"]["latency"]
+    assert latency["buckets"]["+Inf"] == 2
+    assert latency["sum"] > 0
+
+
+def test_detach(sqlite_cdm54_engine: Engine, metrics: QueryMetrics):
+    metrics.detach(sqlite_cdm54_engine)
+    metrics.attach(sqlite_cdm54_engine)
+    with sqlite_cdm54_engine.connect() as conn:
+        conn.execute(select(cdm54.Concept)).all()
+        metrics.detach(sqlite_cdm54_engine)
+        conn.execute(select(cdm54.Concept)).all()
+    assert metrics.as_dict()["concept"]["select"]["statements"] == 1
+    metrics.attach(sqlite_cdm54_engine)
+
+
+def test_failed_statement(sqlite_cdm54_engine: Engine, metrics: QueryMetrics):
+    with sqlite_cdm54_engine.connect() as conn:
+        with pytest.raises(OperationalError, match="no such table"):
+            conn.execute(text("SELECT * FROM missing_table"))
+        conn.execute(select(cdm54.Concept)).all()
+        assert not conn.info["omop_cdm_statement_start"]
+    assert metrics.as_dict()["concept"]["select"]["statements"] == 1
+
+
+def test_to_prometheus():
+    metrics = QueryMetrics(latency_buckets=[0.1, 1.0], row_buckets=[10])
+    metrics.observe(["person"], "select", 0.5, 20)
+    metrics.observe(["person"], "select", 0.05)
+    labels = 'table="person",operation="select"'
+    duration = "omop_cdm_statement_duration_seconds"
+    rows = "omop_cdm_statement_rows"
+    assert metrics.to_prometheus().splitlines() == [
+        "# HELP omop_cdm_statements_total SQL statements per CDM table.",
+        "# TYPE omop_cdm_statements_total counter",
+        f"omop_cdm_statements_total{{{labels}}} 2",
+        f"# HELP {duration} Latency of SQL statements per CDM table.",
+        f"# TYPE {duration} histogram",
+        f'{duration}_bucket{{{labels},le="0.1"}} 1',
+        f'{duration}_bucket{{{labels},le="1.0"}} 2',
+        f'{duration}_bucket{{{labels},le="+Inf"}} 2',
+        f"{duration}_sum{{{labels}}} 0.55",
+        f"{duration}_count{{{labels}}} 2",
+        f"# HELP {rows} Rows of SQL statements per CDM table.",
+        f"# TYPE {rows} histogram",
+        f'{rows}_bucket{{{labels},le="10"}} 0',
+        f'{rows}_bucket{{{labels},le="+Inf"}} 1',
+        f"{rows}_sum{{{labels}}} 20",
+        f"{rows}_count{{{labels}}} 1",
+    ]
+    metrics.reset()
+    assert metrics.as_dict() == {}
@@ -0,0 +1,54 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import src.omop_cdm.regular.cdm54 as cdm54
+
+SRC_DIR = Path(__file__).parents[2] / "src"
+
+
+def run_python(code: str) -> subprocess.CompletedProcess:
+    env = {**os.environ, "PYTHONPATH": str(SRC_DIR)}
+    return subprocess.run(
+        [sys.executable, "-c", code],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def test_tables_are_imported_on_first_use():
+    code = (
+        "import sys\n"
+        "import omop_cdm.regular.cdm54 as cdm54\n"
+        "print('omop_cdm.regular.cdm54.tables' in sys.modules)\n"
+        "print(cdm54.Person.__tablename__)\n"
+        "print('omop_cdm.regular.cdm54.tables' in sys.modules)\n"
+    )
+    assert run_python(code).stdout.split() == ["False", "person", "True"]
+
+
+@pytest.mark.parametrize("module", ["omop_cdm.constants", "omop_cdm.regular.cdm54"])
+def test_import_does_not_import_sqlalchemy(module: str):
+    code = (
+        f"import sys, {module}\n"
+        "print(any(m.startswith('sqlalchemy') for m in sys.modules))"
+    )
+    assert run_python(code).stdout.strip() == "False"
+
+
+def test_lazy_attributes():
+    assert "Person" in dir(cdm54)
+    assert "Person" in cdm54.__all__
+    with pytest.raises(AttributeError, match="has no attribute 'Patient'"):
+        _ = cdm54.Patient
+
+
+def test_version():
+    import src.omop_cdm
+
+    assert src.omop_cdm.__version__.count(".") == 2
@@ -0,0 +1,110 @@
+import datetime
+
+import pytest
+from sqlalchemy import Engine, event, func, inspect, select
+
+import src.omop_cdm.regular.cdm54 as cdm54
+from src.omop_cdm.ddl import create_all_deferred
+from src.omop_cdm.loader import load_tables, plan_load_order
+
+START = datetime.date(1970, 1, 1)
+END = datetime.date(2099, 12, 31)
+
+
+@pytest.fixture
+def fk_enforcing_engine(sqlite_engine: Engine) -> Engine:
+    @event.listens_for(sqlite_engine, "connect")
+    def enable_foreign_keys(dbapi_connection, connection_record):
+        dbapi_connection.execute("PRAGMA foreign_keys = ON")
+
+    return sqlite_engine
+
+
+def test_load_order_follows_foreign_keys():
+    plan = plan_load_order(cdm54.Base.metadata.tables.values())
+    level_of = {t.name: i for i, level in enumerate(plan.levels) for t in level}
+    assert level_of["concept"] < level_of["person"] < level_of["visit_occurrence"]
+    assert level_of["visit_occurrence"] < level_of["visit_detail"]
+    assert level_of["visit_detail"] < level_of["measurement"]
+    assert level_of["measurement"] == level_of["condition_occurrence"]
+
+    deferred = {
+        (fk.table.name, fk.referred_table.name) for fk in plan.deferred_foreign_keys
+    }
+    assert ("relationship", "relationship") in deferred
+    assert ("visit_occurrence", "visit_occurrence") in deferred
+    # Only one side of each concept <-> domain/vocabulary cycle is deferred
+    assert len({("concept", "domain"), ("domain", "concept")} & deferred) == 1
+
+
+def test_tables_are_loaded_in_dependency_order(fk_enforcing_engine: Engine):
+    engine = fk_enforcing_engine
+    metadata = cdm54.Base.metadata
+    plan = plan_load_order(metadata.tables.values())
+    with engine.begin() as conn:
+        create_all_deferred(conn, metadata, foreign_keys=plan.deferred_foreign_keys)
+    assert inspect(engine).get_foreign_keys("person")
+
+    concept = {
+        "concept_id": 8507,
+        "concept_name": "MALE",
+        "domain_id": "Gender",
+        "vocabulary_id": "Gender",
+        "concept_class_id": "Gender",
+        "concept_code": "M",
+        "valid_start_date": START,
+        "valid_end_date": END,
+    }
+    person = {
+        "person_id": 1,
+        "gender_concept_id": 8507,
+        "year_of_birth": 1990,
+        "race_concept_id": 8507,
+        "ethnicity_concept_id": 8507,
+    }
+    row_counts = load_tables(
+        engine,
+        metadata,
+        sources={
+            "person": iter([person]),
+            "concept": [concept],
+            "domain": [
+                {
+                    "domain_id": "Gender",
+                    "domain_name": "Gender",
+                    "domain_concept_id": 8507,
+                }
+            ],
+            "vocabulary": [
+                {
+                    "vocabulary_id": "Gender",
+                    "vocabulary_name": "Gender",
+                    "vocabulary_concept_id": 8507,
+                }
+            ],
+            "concept_class": lambda conn, table: (
+                conn.execute(
+                    table.insert().values(
+                        concept_class_id="Gender",
+                        concept_class_name="Gender",
+                        concept_class_concept_id=8507,
+                    )
+                ).rowcount
+            ),
+        },
+        workers=2,
+    )
+    assert row_counts == {
+        "concept_class": 1,
+        "domain": 1,
+        "vocabulary": 1,
+        "concept": 1,
+        "person": 1,
+    }
+    with engine.connect() as conn:
+        assert conn.scalar(select(func.count()).select_from(cdm54.Person)) == 1
+
+
+def test_unknown_table_is_rejected(sqlite_engine: Engine):
+    with pytest.raises(ValueError, match="Unknown tables"):
+        load_tables(sqlite_engine, cdm54.Base.metadata, sources={"persons": []})
@@ -0,0 +1,124 @@
+import datetime
+
+import pytest
+from sqlalchemy import Engine, select
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.orm import DeclarativeBase, Session, selectinload
+
+import src.omop_cdm.regular.cdm54 as cdm54
+from src.omop_cdm.loading import API, apply_loading_profile, loading_strategies
+from tests.conftest import count_queries
+from tests.omop_cdm.records import concept, condition_occurrence, person
+
+
+@pytest.fixture
+def engine(sqlite_cdm54_engine: Engine) -> Engine:
+    with Session(sqlite_cdm54_engine) as session:
+        session.add_all([concept(i) for i in (0, 8507, 100, 32817)])
+        session.add(person(1))
+        session.add(condition_occurrence(1, 1, 100, datetime.date(2024, 1, 1)))
+        session.commit()
+    return sqlite_cdm54_engine
+
+
+def classes(base: type[DeclarativeBase]) -> dict[str, type]:
+    return {mapper.class_.__name__: mapper.class_ for mapper in base.registry.mappers}
+
+
+def test_loading_strategies(dynamic_cdm54_base):
+    apply_loading_profile(dynamic_cdm54_base, API)
+    strategies = loading_strategies(dynamic_cdm54_base)
+    assert strategies["ConditionOccurrence.condition_concept"] == "joined"
+    assert strategies["ConditionOccurrence.person"] == "raise_on_sql"
+    assert strategies["Person.measurements"] == "raise_on_sql"
+    assert strategies["Vocabulary.vocabulary_concept"] == "joined"
+    assert strategies["Concept.domain"] == "raise_on_sql"
+
+
+def test_api_profile(dynamic_cdm54_base, engine: Engine):
+    apply_loading_profile(dynamic_cdm54_base, "api")
+    Person, ConditionOccurrence = (
+        classes(dynamic_cdm54_base)["Person"],
+        classes(dynamic_cdm54_base)["ConditionOccurrence"],
+    )
+    statements = count_queries(engine)
+    with Session(engine) as session:
+        condition = session.get(ConditionOccurrence, 1)
+        assert condition.condition_concept.concept_id == 100
+        assert len(statements) == 1
+        # The profile also applies to the joined concept
+        with pytest.raises(InvalidRequestError):
+            _ = condition.condition_concept.domain
+        with pytest.raises(InvalidRequestError):
+            _ = condition.person
+        p = session.get(Person, 1)
+        # Many-to-one references in the identity map don't need SQL
+        assert condition.person is p
+        with pytest.raises(InvalidRequestError):
+            _ = p.condition_occurrences
+
+
+def test_analytics_profile(dynamic_cdm54_base, engine: Engine):
+    apply_loading_profile(dynamic_cdm54_base, "analytics")
+    ConditionOccurrence = classes(dynamic_cdm54_base)["ConditionOccurrence"]
+    statements = count_queries(engine)
+    with Session(engine) as session:
+        (condition,) = session.scalars(select(ConditionOccurrence))
+        queries = len(statements)
+        assert condition.condition_type_concept.concept_id == 32817
+        assert len(statements) == queries
+        # The profile also applies to the query loading the concepts
+        with pytest.raises(InvalidRequestError):
+            _ = condition.condition_type_concept.domain
+
+
+def test_explicit_options_take_precedence(dynamic_cdm54_base, engine: Engine):
+    apply_loading_profile(dynamic_cdm54_base, "etl")
+    Person = classes(dynamic_cdm54_base)["Person"]
+    with Session(engine) as session:
+        statement = select(Person).options(selectinload(Person.condition_occurrences))
+        (p,) = session.scalars(statement)
+        assert [c.condition_occurrence_id for c in p.condition_occurrences] == [1]
+        with pytest.raises(InvalidRequestError):
+            _ = p.gender_concept
+
+
+def test_profile_of_configured_base(dynamic_cdm54_base, engine: Engine):
+    dynamic_cdm54_base.registry.configure()
+    apply_loading_profile(dynamic_cdm54_base, "etl")
+    Person = classes(dynamic_cdm54_base)["Person"]
+    with Session(engine) as session:
+        p = session.get(Person, 1)
+        with pytest.raises(InvalidRequestError):
+            _ = p.gender_concept
+
+    apply_loading_profile(dynamic_cdm54_base, None)
+    assert loading_strategies(dynamic_cdm54_base)["Person.gender_concept"] == "select"
+    with Session(engine) as session:
+        assert session.get(Person, 1).gender_concept.concept_id == 8507
+
+
+def test_profile_can_be_disabled_per_query(dynamic_cdm54_base, engine: Engine):
+    apply_loading_profile(dynamic_cdm54_base, "api")
+    ConditionOccurrence = classes(dynamic_cdm54_base)["ConditionOccurrence"]
+    statement = (
+        select(ConditionOccurrence)
+        .options(selectinload(ConditionOccurrence.condition_concept))
+        .execution_options(omop_cdm_loading_profile=False)
+    )
+    with Session(engine) as session:
+        (condition,) = session.scalars(statement)
+        assert condition.condition_concept.concept_id == 100
+        # Lazy loading, as without a profile
+        assert condition.person.person_id == 1
+
+
+def test_other_bases_are_not_affected(dynamic_cdm54_base):
+    apply_loading_profile(dynamic_cdm54_base, "etl")
+    strategies = loading_strategies(cdm54.Base)
+    assert strategies["ConditionOccurrence.condition_concept"] == "select"
+
+
+def test_unknown_profile(dynamic_cdm54_base):
+    with pytest.raises(ValueError, match="Unknown loading profile"):
+        apply_loading_profile(dynamic_cdm54_base, "reporting")
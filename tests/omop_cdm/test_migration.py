@@ -0,0 +1,168 @@
+import datetime
+from pathlib import Path
+
+import pytest
+from sqlalchemy import Engine, create_engine, event, insert, select
+
+import src.omop_cdm.regular.cdm54 as cdm54
+import src.omop_cdm.regular.cdm531 as cdm531
+from src.omop_cdm.constants import CDM_SCHEMA, VOCAB_SCHEMA
+from src.omop_cdm.migration import (
+    CDM54_DEFAULTS,
+    ColumnMapping,
+    migrate,
+    plan_migration,
+)
+from tests.conftest import SQLITE_SCHEMA_MAP, create_all_tables
+
+DAY = datetime.date(2024, 1, 1)
+
+
+@pytest.fixture
+def cdm531_engine(tmp_path: Path) -> Engine:
+    engine = create_engine(f"sqlite:///{tmp_path / 'cdm531.sqlite'}")
+    engine = engine.execution_options(schema_translate_map=SQLITE_SCHEMA_MAP)
+    create_all_tables(engine, cdm531.Base.metadata)
+    add_cdm531_records(engine)
+    yield engine
+    engine.dispose()
+
+
+def add_cdm531_records(engine: Engine) -> None:
+    with engine.begin() as conn:
+        conn.execute(
+            insert(cdm531.Person.__table__),
+            [
+                {
+                    "person_id": person_id,
+                    "gender_concept_id": 8507,
+                    "year_of_birth": 1980,
+                    "race_concept_id": 0,
+                    "ethnicity_concept_id": 0,
+                }
+                for person_id in (1, 2)
+            ],
+        )
+        conn.execute(
+            insert(cdm531.VisitOccurrence.__table__),
+            {
+                "visit_occurrence_id": 1,
+                "person_id": 1,
+                "visit_concept_id": 9201,
+                "visit_start_date": DAY,
+                "visit_end_date": DAY,
+                "visit_type_concept_id": 32817,
+                "admitting_source_concept_id": 8863,
+                "discharge_to_source_value": "home",
+            },
+        )
+        conn.execute(
+            insert(cdm531.CdmSource.__table__),
+            {
+                "cdm_source_name": "Test",
+                "cdm_source_abbreviation": "T",
+                "cdm_holder": None,
+                "source_release_date": DAY,
+                "cdm_release_date": DAY,
+                "cdm_version": "5.3.1",
+                "vocabulary_version": "v5.0",
+            },
+        )
+
+
+def assert_migrated(engine: Engine) -> None:
+    with engine.connect() as conn:
+        assert conn.execute(select(cdm54.Person.person_id)).scalars().all() == [1, 2]
+        visit = conn.execute(select(cdm54.VisitOccurrence.__table__)).one()
+        assert visit.admitted_from_concept_id == 8863
+        assert visit.discharged_to_source_value == "home"
+        assert visit.discharged_to_concept_id is None
+        cdm_source = conn.execute(select(cdm54.CdmSource.__table__)).one()
+        assert cdm_source.cdm_version_concept_id == 756265
+        assert cdm_source.cdm_source_abbreviation == "T"
+        # NULLs of columns that are not nullable anymore are replaced
+        assert cdm_source.cdm_holder == ""
+
+
+def test_plan():
+    plan = plan_migration(cdm531.Base, cdm54.Base)
+    visit_occurrence = plan["visit_occurrence"]
+    assert (
+        ColumnMapping("admitted_from_concept_id", "admitting_source_concept_id")
+        in visit_occurrence.columns
+    )
+    assert visit_occurrence.dropped == []
+    assert plan["episode"].source is None
+    assert plan["episode_event"].source is None
+    measurement = plan["measurement"]
+    assert ColumnMapping("measurement_event_id") in measurement.columns
+    assert ColumnMapping("measurement_id", "measurement_id") in measurement.columns
+    cdm_source = plan["cdm_source"]
+    assert ColumnMapping("cdm_version_concept_id", None, 756265) in cdm_source.columns
+    # Generated by the database
+    metadata_columns = [c.target for c in plan["metadata"].columns]
+    assert "metadata_id" not in metadata_columns
+    assert plan["metadata"].narrowed == ["value_as_string"]
+    # VARCHAR(50) to VARCHAR(255)
+    assert plan["device_exposure"].narrowed == []
+
+
+def test_plan_errors():
+    defaults = {"cdm_source": dict(CDM54_DEFAULTS["cdm_source"])}
+    del defaults["cdm_source"]["cdm_version_concept_id"]
+    with pytest.raises(ValueError, match=r"cdm_source\.cdm_version_concept_id is req"):
+        plan_migration(cdm531.Base, cdm54.Base, defaults=defaults)
+    del defaults["cdm_source"]["cdm_holder"]
+    with pytest.raises(ValueError, match=r"cdm_source\.cdm_holder is not nullable"):
+        plan_migration(cdm531.Base, cdm54.Base, defaults=defaults)
+    renames = {"person": {"gender_concept_id": "sex_concept_id"}}
+    with pytest.raises(ValueError, match=r"person\.sex_concept_id renamed"):
+        plan_migration(cdm531.Base, cdm54.Base, renames=renames)
+
+
+def test_migrate_between_databases(cdm531_engine: Engine, sqlite_engine: Engine):
+    create_all_tables(sqlite_engine, cdm54.Base.metadata)
+    plan = plan_migration(cdm531.Base, cdm54.Base)
+    row_counts = migrate(cdm531_engine, sqlite_engine, plan, batch_size=1)
+    assert row_counts["person"] == 2
+    assert row_counts["visit_occurrence"] == 1
+    assert row_counts["measurement"] == 0
+    assert "episode" not in row_counts
+    assert_migrated(sqlite_engine)
+
+
+def test_migrate_within_database(tmp_path: Path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'cdm54.sqlite'}")
+
+    # The CDM 5.3.1 tables are in an attached database, as SQLite has no schemas
+    @event.listens_for(engine, "connect")
+    def attach(dbapi_connection, connection_record):
+        path = tmp_path / "cdm531.sqlite"
+        dbapi_connection.execute(f"ATTACH DATABASE '{path}' AS cdm531")
+
+    source = engine.execution_options(
+        schema_translate_map={VOCAB_SCHEMA: "cdm531", CDM_SCHEMA: "cdm531"}
+    )
+    target = engine.execution_options(schema_translate_map=SQLITE_SCHEMA_MAP)
+    create_all_tables(source, cdm531.Base.metadata)
+    create_all_tables(target, cdm54.Base.metadata)
+    add_cdm531_records(source)
+
+    statements = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def log_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    plan = plan_migration(cdm531.Base, cdm54.Base)
+    row_counts = migrate(source, target, plan, tables=["person", "visit_occurrence"])
+    assert row_counts == {"person": 2, "visit_occurrence": 1}
+    assert any(
+        s.startswith("INSERT INTO") and "SELECT cdm531.person.person_id" in s
+        for s in statements
+    )
+    assert not any(s.startswith("SELECT") for s in statements)
+
+    migrate(source, target, plan, tables=["cdm_source"])
+    assert_migrated(target)
+    engine.dispose()
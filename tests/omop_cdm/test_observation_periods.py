@@ -0,0 +1,87 @@
+import datetime
+
+import pytest
+from sqlalchemy import Engine, select
+from sqlalchemy.orm import Session
+
+import src.omop_cdm.regular.cdm54 as cdm54
+import src.omop_cdm.regular.cdm600 as cdm600
+from src.omop_cdm.eras import PYTHON, SQL
+from src.omop_cdm.observation_periods import (
+    build_observation_periods,
+    find_event_dates,
+)
+from tests.omop_cdm.records import condition_occurrence, drug_exposure
+
+
+@pytest.fixture
+def event_engine(sqlite_cdm54_engine: Engine) -> Engine:
+    with Session(sqlite_cdm54_engine) as session:
+        session.add_all(
+            [
+                cdm54.VisitOccurrence(
+                    visit_occurrence_id=1,
+                    person_id=1,
+                    visit_concept_id=9201,
+                    visit_start_date=datetime.date(2024, 1, 1),
+                    visit_end_date=datetime.date(2024, 1, 3),
+                    visit_type_concept_id=32817,
+                ),
+                cdm54.Measurement(
+                    measurement_id=1,
+                    person_id=1,
+                    measurement_concept_id=3004249,
+                    measurement_date=datetime.date(2024, 3, 1),
+                    measurement_type_concept_id=32817,
+                ),
+                condition_occurrence(1, 1, 100, datetime.date(2025, 6, 1)),
+                drug_exposure(
+                    1, 2, 1000, datetime.date(2024, 2, 1), datetime.date(2024, 2, 29)
+                ),
+            ]
+        )
+        session.commit()
+    return sqlite_cdm54_engine
+
+
+def test_event_dates_are_found_for_any_cdm_version():
+    by_table = {e.table_class.__tablename__: e for e in find_event_dates(cdm54.Base)}
+    assert "observation_period" not in by_table
+    assert "condition_era" not in by_table
+    assert by_table["measurement"].start == [
+        cdm54.Measurement.measurement_date,
+        cdm54.Measurement.measurement_datetime,
+    ]
+    assert by_table["measurement"].end == []
+    assert by_table["procedure_occurrence"].end[0] is (
+        cdm54.ProcedureOccurrence.procedure_end_date
+    )
+    assert "verbatim_end_date" not in [c.key for c in by_table["drug_exposure"].end]
+
+    (survey,) = find_event_dates(cdm600.Base, ["survey_conduct"])
+    assert [c.key for c in survey.end] == ["survey_end_date", "survey_end_datetime"]
+
+
+@pytest.mark.parametrize("method", [SQL, PYTHON])
+def test_observation_periods_span_all_events(event_engine: Engine, method: str):
+    created = build_observation_periods(
+        event_engine, cdm54.Base, gap_days=100, method=method, partitions=3, workers=2
+    )
+    assert created == 3
+    op = cdm54.ObservationPeriod
+    with event_engine.connect() as conn:
+        periods = conn.execute(
+            select(
+                op.person_id,
+                op.observation_period_start_date,
+                op.observation_period_end_date,
+                op.period_type_concept_id,
+            ).order_by(op.person_id, op.observation_period_start_date)
+        ).all()
+        ids = conn.scalars(select(op.observation_period_id)).all()
+    assert [tuple(p) for p in periods] == [
+        (1, datetime.date(2024, 1, 1), datetime.date(2024, 3, 1), 44814724),
+        (1, datetime.date(2025, 6, 1), datetime.date(2025, 6, 1), 44814724),
+        (2, datetime.date(2024, 2, 1), datetime.date(2024, 2, 29), 44814724),
+    ]
+    assert len(set(ids)) == 3
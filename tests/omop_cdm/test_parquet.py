@@ -0,0 +1,169 @@
+import datetime
+import decimal
+from pathlib import Path
+
+import pytest
+from sqlalchemy import Engine, func, select
+from sqlalchemy.orm import Session
+
+import src.omop_cdm.regular.cdm54 as cdm54
+from src.omop_cdm.constants import CDM_SCHEMA, VOCAB_SCHEMA
+from src.omop_cdm.ddl import create_all_deferred
+from tests.conftest import temp_schemas
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+from src.omop_cdm.parquet import (  # noqa: E402
+    SchemaMismatchError,
+    arrow_schema,
+    export_cdm,
+    export_table,
+    import_cdm,
+    import_table,
+    validate_schema,
+)
+
+SCHEMA_MAP = {VOCAB_SCHEMA: "parquet_vocab", CDM_SCHEMA: "parquet_cdm"}
+
+
+def measurement(measurement_id: int, person_id: int) -> cdm54.Measurement:
+    return cdm54.Measurement(
+        measurement_id=measurement_id,
+        person_id=person_id,
+        measurement_concept_id=3004249,
+        measurement_date=datetime.date(2024, 1, measurement_id),
+        measurement_type_concept_id=32817,
+        value_as_number=decimal.Decimal("120.5"),
+    )
+
+
+@pytest.fixture
+def measurement_engine(sqlite_cdm54_engine: Engine) -> Engine:
+    with Session(sqlite_cdm54_engine) as session:
+        session.add_all(measurement(i, person_id=i % 3) for i in range(1, 11))
+        session.commit()
+    return sqlite_cdm54_engine
+
+
+def test_arrow_schema_matches_columns():
+    schema = arrow_schema(cdm54.Measurement)
+    assert schema.names == cdm54.Measurement.__table__.columns.keys()
+    assert schema.field("measurement_id").type == pa.int32()
+    assert not schema.field("measurement_id").nullable
+    assert schema.field("measurement_date").type == pa.date32()
+    assert schema.field("measurement_datetime").type == pa.timestamp("us")
+    assert schema.field("value_as_number").nullable
+    assert pa.types.is_decimal(schema.field("value_as_number").type)
+    assert schema.field("value_source_value").type == pa.string()
+
+
+def test_table_is_partitioned_by_person(measurement_engine: Engine, tmp_path: Path):
+    rows = export_table(
+        measurement_engine, cdm54.Measurement, tmp_path, partitions=3, batch_size=2
+    )
+    assert rows == 10
+    bucket_dirs = sorted(p.name for p in (tmp_path / "measurement").iterdir())
+    assert bucket_dirs == ["bucket=0", "bucket=1", "bucket=2"]
+
+    bucket_1 = pq.read_table(tmp_path / "measurement" / "bucket=1")
+    assert set(bucket_1["person_id"].to_pylist()) == {1}
+    assert bucket_1["value_as_number"][0].as_py() == decimal.Decimal("120.5")
+    assert pq.read_table(tmp_path / "measurement").num_rows == 10
+
+
+def test_empty_tables_are_exported(measurement_engine: Engine, tmp_path: Path):
+    row_counts = export_cdm(
+        measurement_engine, cdm54.Base, tmp_path, tables=["measurement", "concept"]
+    )
+    assert row_counts == {"concept": 0, "measurement": 10}
+    concept = pq.read_table(tmp_path / "concept" / "concept.parquet")
+    assert concept.num_rows == 0
+    assert concept.schema.names == cdm54.Concept.__table__.columns.keys()
+
+
+def test_exported_tables_can_be_imported(measurement_engine: Engine, tmp_path: Path):
+    export_cdm(measurement_engine, cdm54.Base, tmp_path, partitions=3)
+    with measurement_engine.begin() as conn:
+        conn.execute(cdm54.Measurement.__table__.delete())
+        row_counts = import_cdm(
+            conn, cdm54.Base, tmp_path, tables=["measurement", "concept"]
+        )
+    assert row_counts == {"concept": 0, "measurement": 10}
+    with Session(measurement_engine) as session:
+        measurement_7 = session.get(cdm54.Measurement, 7)
+        assert measurement_7.person_id == 1
+        assert measurement_7.measurement_date == datetime.date(2024, 1, 7)
+        assert measurement_7.value_as_number == decimal.Decimal("120.5")
+
+
+def test_required_and_unknown_columns_are_reported():
+    schema = pa.schema(
+        [
+            pa.field("concept_id", pa.int64()),
+            pa.field("concept_name", pa.int32()),
+            pa.field("colour", pa.string()),
+        ]
+    )
+    with pytest.raises(SchemaMismatchError) as e:
+        validate_schema(schema, cdm54.Concept)
+    message = str(e.value)
+    assert "unknown column colour" in message
+    assert "column concept_name has type int32" in message
+    assert "missing required column domain_id" in message
+    assert "concept_id" not in message
+
+
+def test_too_long_strings_are_rejected(sqlite_cdm54_engine: Engine, tmp_path: Path):
+    data = pa.table(
+        {
+            "vocabulary_id": ["SNOMED", "X" * 21],
+            "vocabulary_name": ["SNOMED", "Too long"],
+            "vocabulary_concept_id": [44819097, 0],
+        }
+    )
+    pq.write_table(data, tmp_path / "vocabulary.parquet")
+    with (
+        sqlite_cdm54_engine.begin() as conn,
+        pytest.raises(SchemaMismatchError, match=r"vocabulary_id .* 21 characters"),
+    ):
+        import_table(conn, cdm54.Vocabulary, tmp_path / "vocabulary.parquet")
+
+
+def test_nulls_in_required_columns_are_rejected(
+    sqlite_cdm54_engine: Engine, tmp_path: Path
+):
+    data = pa.table(
+        {
+            "vocabulary_id": ["SNOMED", None],
+            "vocabulary_name": ["SNOMED", "Unknown"],
+            "vocabulary_concept_id": [44819097, 0],
+        }
+    )
+    pq.write_table(data, tmp_path / "vocabulary.parquet")
+    with sqlite_cdm54_engine.connect() as conn:
+        with pytest.raises(SchemaMismatchError, match="contains nulls"):
+            import_table(conn, cdm54.Vocabulary, tmp_path / "vocabulary.parquet")
+        count = conn.scalar(select(func.count()).select_from(cdm54.Vocabulary))
+    assert count == 0
+
+
+def test_tables_are_imported_into_postgres(
+    measurement_engine: Engine, pg_db_engine: Engine, tmp_path: Path
+):
+    with Session(measurement_engine) as session:
+        session.get(cdm54.Measurement, 7).value_source_value = 'a,"b"\nc'
+        session.commit()
+    export_table(measurement_engine, cdm54.Measurement, tmp_path, partitions=3)
+    engine = pg_db_engine.execution_options(schema_translate_map=SCHEMA_MAP)
+    with temp_schemas(engine=engine, schemas=set(SCHEMA_MAP.values())):
+        with engine.begin() as conn:
+            create_all_deferred(conn, cdm54.Base.metadata)
+            rows = import_table(conn, cdm54.Measurement, tmp_path / "measurement")
+        assert rows == 10
+        with Session(engine) as session:
+            measurement_7 = session.get(cdm54.Measurement, 7)
+            assert measurement_7.measurement_date == datetime.date(2024, 1, 7)
+            assert measurement_7.value_as_number == decimal.Decimal("120.5")
+            assert measurement_7.value_source_value == 'a,"b"\nc'
+            assert session.get(cdm54.Measurement, 1).value_source_value is None
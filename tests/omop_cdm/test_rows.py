@@ -0,0 +1,46 @@
+import datetime
+import decimal
+from typing import Optional
+
+from sqlalchemy import Engine
+from sqlalchemy.orm import Session
+
+import src.omop_cdm.regular.cdm54 as cdm54
+from src.omop_cdm.rows import row_type, row_types, stream_rows
+
+
+def test_row_type_matches_table_columns():
+    measurement_row = row_type(cdm54.Measurement)
+    assert measurement_row.__name__ == "MeasurementRow"
+    assert measurement_row._fields == tuple(cdm54.Measurement.__table__.columns.keys())
+    annotations = measurement_row.__annotations__
+    assert annotations["measurement_id"] is int
+    assert annotations["measurement_date"] is datetime.date
+    assert annotations["value_as_number"] == Optional[decimal.Decimal]
+    assert row_type(cdm54.Measurement) is measurement_row
+
+
+def test_row_types_are_generated_for_all_tables():
+    types = row_types(cdm54.Base)
+    assert set(types) == {t.name for t in cdm54.Base.metadata.tables.values()}
+
+
+def test_rows_are_streamed(sqlite_cdm54_engine: Engine):
+    with Session(sqlite_cdm54_engine) as session:
+        session.add_all(
+            cdm54.ObservationPeriod(
+                observation_period_id=i,
+                person_id=i,
+                observation_period_start_date=datetime.date(2020, 1, i),
+                observation_period_end_date=datetime.date(2021, 1, i),
+                period_type_concept_id=32817,
+            )
+            for i in range(1, 6)
+        )
+        session.commit()
+
+    op = cdm54.ObservationPeriod
+    rows = list(stream_rows(sqlite_cdm54_engine, op, op.person_id > 2, batch_size=2))
+    assert [r.person_id for r in rows] == [3, 4, 5]
+    assert isinstance(rows[0], row_type(op))
+    assert rows[0].observation_period_start_date == datetime.date(2020, 1, 3)
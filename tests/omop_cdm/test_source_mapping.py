@@ -0,0 +1,98 @@
+import datetime
+
+import pytest
+from sqlalchemy import Engine
+from sqlalchemy.orm import Session
+
+import src.omop_cdm.regular.cdm54 as cdm54
+from src.omop_cdm.source_mapping import SourceConceptMapper
+from tests.omop_cdm.records import VALID_END_DATE, VALID_START_DATE, concept
+
+
+def maps_to(
+    concept_id_1: int, concept_id_2: int, **kwargs
+) -> cdm54.ConceptRelationship:
+    return cdm54.ConceptRelationship(
+        concept_id_1=concept_id_1,
+        concept_id_2=concept_id_2,
+        relationship_id="Maps to",
+        valid_start_date=kwargs.pop("valid_start_date", VALID_START_DATE),
+        valid_end_date=kwargs.pop("valid_end_date", VALID_END_DATE),
+        **kwargs,
+    )
+
+
+@pytest.fixture
+def mapping_engine(sqlite_cdm54_engine: Engine) -> Engine:
+    with Session(sqlite_cdm54_engine) as session:
+        session.add_all(
+            [
+                concept(1, domain_id="Condition"),
+                concept(2, domain_id="Observation"),
+                concept(3, domain_id="Condition"),
+                concept(
+                    10, vocabulary_id="ICD10", concept_code="E11", standard_concept=None
+                ),
+                concept(
+                    11, vocabulary_id="ICD10", concept_code="Z00", standard_concept=None
+                ),
+                concept(
+                    12, vocabulary_id="ICD10", concept_code="X99", standard_concept=None
+                ),
+                maps_to(10, 1),
+                maps_to(11, 1),
+                maps_to(11, 2),
+                maps_to(12, 3, invalid_reason="D"),
+                cdm54.SourceToConceptMap(
+                    source_code="local-1",
+                    source_concept_id=0,
+                    source_vocabulary_id="Local",
+                    target_concept_id=3,
+                    target_vocabulary_id="SNOMED",
+                    valid_start_date=VALID_START_DATE,
+                    valid_end_date=datetime.date(2020, 1, 1),
+                ),
+                cdm54.SourceToConceptMap(
+                    source_code="E11",
+                    source_concept_id=0,
+                    source_vocabulary_id="ICD10",
+                    target_concept_id=3,
+                    target_vocabulary_id="SNOMED",
+                    valid_start_date=VALID_START_DATE,
+                    valid_end_date=VALID_END_DATE,
+                ),
+            ]
+        )
+        session.commit()
+    return sqlite_cdm54_engine
+
+
+def test_source_codes_are_mapped(mapping_engine: Engine):
+    mapper = SourceConceptMapper.from_database(mapping_engine, cdm54.Base)
+    result = mapper.map(
+        [("ICD10", "Z00"), ("ICD10", "X99"), ("Local", "local-1"), ("ICD10", "E11")]
+    )
+    assert list(result.source_index) == [0, 0, 1, 2, 3]
+    assert list(result.target_concept_ids) == [1, 2, 0, 3, 3]
+    assert result.domain_ids == [
+        "Condition",
+        "Observation",
+        None,
+        "Condition",
+        "Condition",
+    ]
+    assert result.unmapped == 1
+
+
+def test_mappings_outside_validity_period_are_ignored(mapping_engine: Engine):
+    as_of = datetime.date(2024, 1, 1)
+    mapper = SourceConceptMapper.from_database(mapping_engine, cdm54.Base, as_of=as_of)
+    assert mapper.targets("Local", "local-1") == ()
+    assert mapper.targets("ICD10", "Z00") == ((1, "Condition"), (2, "Observation"))
+
+
+def test_mappings_are_limited_to_vocabularies(mapping_engine: Engine):
+    mapper = SourceConceptMapper.from_database(
+        mapping_engine, cdm54.Base, vocabulary_ids=["Local"]
+    )
+    assert len(mapper) == 1
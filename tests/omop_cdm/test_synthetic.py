@@ -0,0 +1,117 @@
+import datetime
+from collections import Counter
+
+import pytest
+from sqlalchemy import Engine, func, select
+
+import src.omop_cdm.regular.cdm54 as cdm54
+import src.omop_cdm.regular.cdm531 as cdm531
+import src.omop_cdm.regular.cdm600 as cdm600
+from src.omop_cdm.parquet import import_cdm
+from src.omop_cdm.synthetic import (
+    PERSON_TABLES,
+    SyntheticConfig,
+    generate,
+    write_to_database,
+    write_to_parquet,
+)
+
+CONFIG = SyntheticConfig(persons=50, seed=42)
+
+
+def generate_all(base, config: SyntheticConfig, partitions: int) -> dict[str, list]:
+    rows = {name: [] for name in PERSON_TABLES}
+    for partition in range(partitions):
+        for chunk in generate(base, config, partition, partitions, chunk_size=7):
+            for name, table_rows in chunk.items():
+                rows[name].extend(table_rows)
+    return rows
+
+
+def test_generated_rows_are_consistent():
+    rows = generate_all(cdm54.Base, CONFIG, partitions=3)
+    person_ids = {r["person_id"] for r in rows["person"]}
+    assert person_ids == set(range(1, 51))
+    visits = {r["visit_occurrence_id"]: r for r in rows["visit_occurrence"]}
+    assert len(visits) == len(rows["visit_occurrence"])
+    for name in ("condition_occurrence", "drug_exposure", "measurement"):
+        ids = [r[f"{name}_id"] for r in rows[name]]
+        assert len(set(ids)) == len(ids)
+        for row in rows[name]:
+            visit = visits[row["visit_occurrence_id"]]
+            assert row["person_id"] == visit["person_id"] in person_ids
+    for period in rows["observation_period"]:
+        person_visits = [
+            v for v in visits.values() if v["person_id"] == period["person_id"]
+        ]
+        assert period["observation_period_start_date"] == min(
+            v["visit_start_date"] for v in person_visits
+        )
+        assert period["observation_period_end_date"] == max(
+            v["visit_end_date"] for v in person_visits
+        )
+    # Roughly the configured volumes
+    assert 300 < len(visits) < 700
+    assert 1.0 < len(rows["measurement"]) / len(visits) < 5.0
+
+
+def test_generation_is_deterministic():
+    assert generate_all(cdm54.Base, CONFIG, 2) == generate_all(cdm54.Base, CONFIG, 2)
+
+
+def test_generation_does_not_depend_on_partitions():
+    def without_ids(rows: dict[str, list]) -> dict[str, list]:
+        # Only the ids of the events are interleaved per partition
+        ids = {f"{name}_id" for name in PERSON_TABLES[1:]} | {"visit_occurrence_id"}
+        return {
+            name: sorted(
+                sorted((k, v) for k, v in row.items() if k not in ids)
+                for row in table_rows
+            )
+            for name, table_rows in rows.items()
+        }
+
+    rows = generate_all(cdm54.Base, CONFIG, 1)
+    assert without_ids(rows) == without_ids(generate_all(cdm54.Base, CONFIG, 3))
+
+
+@pytest.mark.parametrize("base", [cdm531.Base, cdm600.Base])
+def test_other_cdm_versions(base):
+    (chunk,) = generate(base, SyntheticConfig(persons=5))
+    visit = chunk["visit_occurrence"][0]
+    columns = base.metadata.tables["cdm_schema.visit_occurrence"].columns
+    assert set(visit) <= set(columns.keys())
+    required = {c.key for c in columns if not c.nullable}
+    assert required <= set(visit)
+    assert visit["visit_start_datetime"] == datetime.datetime.combine(
+        visit["visit_start_date"], datetime.time()
+    )
+
+
+def test_write_to_database(sqlite_cdm54_engine: Engine):
+    counts = write_to_database(
+        sqlite_cdm54_engine,
+        cdm54.Base,
+        CONFIG,
+        workers=1,
+        partitions=3,
+        vocabulary=True,
+    )
+    assert counts["person"] == 50
+    assert counts["concept"] == len(CONFIG.concept_ids)
+    with sqlite_cdm54_engine.connect() as conn:
+        for name in (*PERSON_TABLES, "concept"):
+            table = cdm54.Base.metadata.tables[
+                f"{'vocabulary_schema' if name == 'concept' else 'cdm_schema'}.{name}"
+            ]
+            assert conn.scalar(select(func.count()).select_from(table)) == counts[name]
+
+
+def test_write_to_parquet(tmp_path, sqlite_cdm54_engine: Engine):
+    counts = write_to_parquet(
+        cdm54.Base, CONFIG, tmp_path, workers=2, partitions=4, vocabulary=True
+    )
+    assert len(list((tmp_path / "measurement").glob("part-*.parquet"))) == 4
+    with sqlite_cdm54_engine.begin() as conn:
+        imported = import_cdm(conn, cdm54.Base, tmp_path)
+    assert Counter(imported) == Counter({k: v for k, v in counts.items() if v})
@@ -0,0 +1,62 @@
+import datetime
+
+import pytest
+from sqlalchemy import Engine
+from sqlalchemy.orm import Session
+
+import src.omop_cdm.regular.cdm54 as cdm54
+from src.omop_cdm.timelines import load_person_timelines
+from tests.conftest import count_queries
+from tests.omop_cdm.records import (
+    concept,
+    condition_occurrence,
+    drug_exposure,
+    person,
+)
+
+
+@pytest.fixture
+def timeline_engine(sqlite_cdm54_engine: Engine) -> Engine:
+    start = datetime.date(2024, 1, 1)
+    with Session(sqlite_cdm54_engine) as session:
+        session.add_all([concept(i) for i in (0, 8507, 32817, 100, 200, 1000)])
+        for person_id in range(1, 6):
+            session.add(person(person_id))
+            for i in range(3):
+                event_id = person_id * 10 + i
+                session.add(condition_occurrence(event_id, person_id, 100, start))
+                session.add(drug_exposure(event_id, person_id, 1000, start, start))
+        session.commit()
+    return sqlite_cdm54_engine
+
+
+def read_timelines(persons: list[cdm54.Person]) -> list[tuple]:
+    return [
+        (
+            p.person_id,
+            p.gender_concept.concept_name,
+            [c.condition_concept.concept_id for c in p.condition_occurrences],
+            [d.drug_type_concept.concept_id for d in p.drug_exposures],
+            [d.route_concept for d in p.drug_exposures],
+        )
+        for p in persons
+    ]
+
+
+@pytest.mark.parametrize("n_persons", [1, 5])
+def test_number_of_queries_is_fixed(timeline_engine: Engine, n_persons: int):
+    statements = count_queries(timeline_engine)
+    with Session(timeline_engine) as session:
+        persons = load_person_timelines(session, range(1, n_persons + 1))
+        n_queries = len(statements)
+        timelines = read_timelines(persons)
+    assert len(statements) == n_queries
+    # Persons, one per relationship, and concepts
+    assert n_queries == 1 + 12 + 1
+    assert timelines[-1] == (
+        n_persons,
+        "Concept 8507",
+        [100, 100, 100],
+        [32817, 32817, 32817],
+        [None, None, None],
+    )
@@ -1,7 +1,10 @@
 from datetime import date, datetime
 
-from omop_cdm.regular.cdm54 import ObservationPeriod
-from omop_cdm.util import get_current_time_utc, record_as_str
+from sqlalchemy.dialects import postgresql
+
+import omop_cdm.util
+from omop_cdm.regular.cdm54 import Note, ObservationPeriod
+from omop_cdm.util import configure, get_current_time_utc, record_as_str
 
 
 def test_record_is_converted_to_expected_string():
@@ -20,6 +23,30 @@ def test_record_is_converted_to_expected_string():
     assert str(op_record) == expected_string
 
 
+def test_long_values_are_truncated(monkeypatch):
+    note = Note(note_id=1, note_title="Discharge letter", note_text="x" * 1000)
+    text = record_as_str(note)
+    assert "note_title=Discharge letter," in text
+    assert f"note_text={'x' * 97}...," in text
+
+    monkeypatch.setattr(omop_cdm.util, "RECORD_VALUE_WIDTH", 10)
+    assert "note_title=Dischar...," in record_as_str(note)
+
+    monkeypatch.setattr(omop_cdm.util, "RECORD_VALUE_WIDTH", 1)
+    assert "note_title=...," in record_as_str(note)
+    assert "note_id=1," in record_as_str(note)
+
+    monkeypatch.setattr(omop_cdm.util, "RECORD_VALUE_WIDTH", None)
+    assert f"note_text={'x' * 1000}," in record_as_str(note)
+
+
 def test_get_utc_time():
     utc_time = get_current_time_utc()
     assert isinstance(utc_time, datetime)
+
+
+def test_configure(dynamic_cdm54_base):
+    mappers = dynamic_cdm54_base.registry.mappers
+    assert not any(mapper.configured for mapper in mappers)
+    configure(dynamic_cdm54_base, dialect=postgresql.dialect())
+    assert all(mapper.configured for mapper in mappers)